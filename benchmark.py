@@ -0,0 +1,243 @@
+"""
+benchmark.py
+Benchmarks for the VeryNews pipeline against the claims in benchmarks/claims.json.
+
+    python benchmark.py pipeline [--mode synthetic|replay|record] [--fixtures benchmarks/fixtures.json]
+                                 [--concurrency 1,4,16] [--llm-latency 0.8] [--http-latency 0.1] [--json out.json]
+    python benchmark.py fused [--claims benchmarks/claims.json] [--repeat 1]
+
+`pipeline` runs every claim end to end without network access (see replay.py): `synthetic` answers
+every model and HTTP call with generated fixtures, `replay` serves calls recorded earlier with
+`record`. It reports end-to-end and per-stage latency, throughput at each concurrency level, the
+memory high-water mark and tokens per claim. Injected latencies stand in for model and network time.
+
+`fused` compares the standard three-call extraction (translate -> 5W1H -> queries) with the fused
+single-call mode: time-to-first-search per claim, and how closely the fused answers agree with the
+three-call answers (token Jaccard of the translation, the six 5W1H fields and the query set).
+The LLM response cache is disabled so every run reaches the model.
+"""
+import os
+import re
+import json
+import time
+import argparse
+import resource
+import statistics
+import tracemalloc
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+from dotenv import load_dotenv
+load_dotenv()
+
+import replay
+from llm import llm
+from evidence_index import EvidenceIndex
+from claim_dedup import ClaimStore, claims as claim_index
+from utils import run_sync
+from ratelimit import LIMITERS, RATE_LIMITS
+from verynews_news_agent import (
+    news_translate_to_en, agent_5w1h, agent_search_queries, agent_fused_extraction, verynews_news_judge_async,
+    verynews_news_judge_many
+)
+
+DEFAULT_CLAIMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "claims.json")
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "fixtures.json")
+FACT_FIELDS = ("who", "what", "when", "where", "why", "how")
+# Buckets that never make a request wait, for the offline modes
+UNLIMITED_RATES = {name: {"rate": 1e9, "burst": 1e9} for name in RATE_LIMITS}
+
+def load_claims(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def jaccard(a: str, b: str) -> float:
+    ta, tb = set(re.findall(r"\w+", a.lower())), set(re.findall(r"\w+", b.lower()))
+    if not ta and not tb:
+        return 1.0
+    return len(ta & tb) / len(ta | tb)
+
+async def three_call_extraction(news_content: str, current_time: str):
+    news_en = await news_translate_to_en(news_content)
+    facts = await agent_5w1h(news_en, current_time)
+    queries = await agent_search_queries(news_en, facts, current_time)
+    return news_en, facts, queries
+
+async def timed(extraction, news_content: str, current_time: str):
+    start = time.perf_counter()
+    result = await extraction(news_content, current_time)
+    return time.perf_counter() - start, result
+
+def agreement(reference, candidate) -> dict:
+    ref_en, ref_facts, ref_queries = reference
+    en, facts, queries = candidate
+    fields = [jaccard(str(ref_facts.get(k, "")), str(facts.get(k, ""))) for k in FACT_FIELDS]
+    return {
+        "translation": jaccard(ref_en, en),
+        "facts": sum(fields) / len(fields),
+        "queries": jaccard(" ".join(ref_queries), " ".join(queries)),
+    }
+
+def bench_fused(claims: list, repeat: int = 1):
+    llm.cache = None
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    standard_times, fused_times, scores = [], [], []
+    for index, claim in enumerate(claims):
+        for _ in range(repeat):
+            standard_time, reference = run_sync(timed(three_call_extraction, claim, current_time))
+            fused_time, candidate = run_sync(timed(agent_fused_extraction, claim, current_time))
+            standard_times.append(standard_time)
+            fused_times.append(fused_time)
+            score = agreement(reference, candidate)
+            scores.append(score)
+            print(f"claim {index}: three-call {standard_time:.2f}s, fused {fused_time:.2f}s, "
+                  + ", ".join(f"{k} {v:.2f}" for k, v in score.items()))
+
+    print("=" * 80)
+    print(f"Time to first search (median): three-call {statistics.median(standard_times):.2f}s, "
+          f"fused {statistics.median(fused_times):.2f}s")
+    print(f"Time to first search (max): three-call {max(standard_times):.2f}s, fused {max(fused_times):.2f}s")
+    for key in ("translation", "facts", "queries"):
+        print(f"Agreement with three-call mode, {key}: {statistics.mean(s[key] for s in scores):.2f}")
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def _tokens(trace: dict, kind: str) -> int:
+    prefix = f"verynews_llm_{kind}_tokens_total"
+    return int(sum(v for k, v in trace["totals"].items() if k.startswith(prefix)))
+
+async def _judge_with_report(news_content: str, config: dict, context):
+    result = await verynews_news_judge_async(news_content, config, context)
+    await result.render_report()
+    return result
+
+async def _judge_batch(claims: list, concurrency: int, config: dict, context) -> int:
+    failures = 0
+    async for result in verynews_news_judge_many(claims, concurrency, config, context):
+        failures += "error" in result
+    return failures
+
+def bench_pipeline(claims: list, mode: str, fixtures_path: str, concurrency_levels: list, llm_latency: replay.Latency,
+                   http_latency: replay.Latency, repeat: int = 1, config: dict = None, trace_memory: bool = False,
+                   search_mode: str = "web") -> dict:
+    """Run the corpus offline: once claim by claim for latency and tokens, then as a batch at each
+    concurrency level for throughput. `trace_memory` adds a tracemalloc peak, at a large CPU cost.
+    In "local_first" search mode all runs share one in-memory evidence index. Claim deduplication is off
+    unless `config["dedup"]` is set, in which case it uses an in-memory claim store. Runs are not stored.
+    Offline modes replace the process-wide rate limits with unlimited buckets for the duration."""
+    config = {"dedup": False, "run_store": False, **(config or {})}
+    evidence_index = EvidenceIndex(":memory:") if search_mode == "local_first" else None
+    claim_index.store = ClaimStore(":memory:") if config["dedup"] else None
+    fixtures = replay.Fixtures.load(fixtures_path) if mode == "replay" else replay.Fixtures()
+    if mode == "synthetic":
+        # Synthetic search answers come from the Custom Search code path
+        for name in ("GOOGLE_API_KEY", "GOOGLE_CX"):
+            os.environ[name] = os.environ.get(name) or "synthetic"
+    replay.install(fixtures, mode, llm_latency)
+    # Offline upstreams have no quotas, so the real rate limits would only measure the limiter
+    limits = LIMITERS.overridden(UNLIMITED_RATES) if mode in ("synthetic", "replay") else nullcontext()
+    with limits:
+        if trace_memory:
+            tracemalloc.start()
+
+        latencies, stage_latencies, prompt_tokens, completion_tokens = [], defaultdict(list), [], []
+        for claim in claims:
+            context = replay.search_context(fixtures, mode, http_latency, search_mode, evidence_index)
+            start = time.perf_counter()
+            result = run_sync(_judge_with_report(claim, config, context))
+            latencies.append(time.perf_counter() - start)
+            run_sync(context.close())
+            for stage, timing in result["timings"].items():
+                stage_latencies[stage].append(timing["duration"])
+            prompt_tokens.append(_tokens(result["trace"], "prompt"))
+            completion_tokens.append(_tokens(result["trace"], "completion"))
+
+        throughput = {}
+        for concurrency in concurrency_levels:
+            batch = claims * repeat
+            context = replay.search_context(fixtures, mode, http_latency, search_mode, evidence_index)
+            start = time.perf_counter()
+            failures = run_sync(_judge_batch(batch, concurrency, config, context))
+            elapsed = time.perf_counter() - start
+            run_sync(context.close())
+            throughput[concurrency] = {"claims": len(batch), "seconds": round(elapsed, 3),
+                                       "claims_per_second": round(len(batch) / elapsed, 3), "failures": failures}
+
+        traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        tracemalloc.stop()
+        if mode == "record":
+            fixtures.save(fixtures_path)
+            print(f"Recorded {len(fixtures.llm)} model answers and {len(fixtures.http)} HTTP responses to {fixtures_path}")
+
+    return {
+        "mode": mode,
+        "search_mode": search_mode,
+        "claims": len(claims),
+        "end_to_end": {"p50": round(percentile(latencies, 0.5), 3), "p95": round(percentile(latencies, 0.95), 3),
+                       "max": round(max(latencies), 3)},
+        "stages": {stage: {"p50": round(percentile(v, 0.5), 3), "p95": round(percentile(v, 0.95), 3)}
+                   for stage, v in stage_latencies.items()},
+        "throughput": throughput,
+        "memory": {"traced_peak_mb": round(traced_peak / 2**20, 1) if traced_peak is not None else None,
+                   # ru_maxrss is in kilobytes on Linux
+                   "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)},
+        "tokens_per_claim": {"prompt": round(statistics.mean(prompt_tokens)), "completion": round(statistics.mean(completion_tokens))},
+    }
+
+def print_pipeline_report(report: dict):
+    print("=" * 80)
+    print(f"Mode: {report['mode']}, search {report['search_mode']}, {report['claims']} claims")
+    e2e = report["end_to_end"]
+    print(f"End-to-end latency: p50 {e2e['p50']:.2f}s, p95 {e2e['p95']:.2f}s, max {e2e['max']:.2f}s")
+    print("Stage latency (p50 / p95):")
+    for stage, values in report["stages"].items():
+        print(f"  {stage:<14} {values['p50']:.3f}s / {values['p95']:.3f}s")
+    for concurrency, values in report["throughput"].items():
+        print(f"Throughput at {concurrency} concurrent: {values['claims_per_second']:.2f} claims/s "
+              f"({values['claims']} claims in {values['seconds']:.2f}s, {values['failures']} failed)")
+    memory = report["memory"]
+    traced = f"traced peak {memory['traced_peak_mb']} MB, " if memory["traced_peak_mb"] is not None else ""
+    print(f"Memory: {traced}max RSS {memory['max_rss_mb']} MB")
+    tokens = report["tokens_per_claim"]
+    print(f"Tokens per claim: {tokens['prompt']} prompt, {tokens['completion']} completion")
+
+def main():
+    parser = argparse.ArgumentParser(description="VeryNews pipeline benchmarks")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    fused = subcommands.add_parser("fused", help="three-call vs fused extraction: time-to-first-search and agreement")
+    fused.add_argument("--claims", default=DEFAULT_CLAIMS)
+    fused.add_argument("--repeat", type=int, default=1)
+    pipeline = subcommands.add_parser("pipeline", help="offline end-to-end latency, throughput, memory and tokens")
+    pipeline.add_argument("--claims", default=DEFAULT_CLAIMS)
+    pipeline.add_argument("--mode", choices=replay.MODES, default="synthetic")
+    pipeline.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    pipeline.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels for the throughput runs")
+    pipeline.add_argument("--repeat", type=int, default=2, help="copies of the corpus per throughput run")
+    pipeline.add_argument("--llm-latency", type=float, default=0.8, help="injected seconds per model call")
+    pipeline.add_argument("--llm-latency-per-1k", type=float, default=2.0, help="injected seconds per 1k generated tokens")
+    pipeline.add_argument("--http-latency", type=float, default=0.1, help="injected seconds per HTTP request")
+    pipeline.add_argument("--jitter", type=float, default=0.2, help="extra random seconds per call, up to this value")
+    pipeline.add_argument("--pipeline-mode", choices=("standard", "fused"), default="standard")
+    pipeline.add_argument("--search-mode", choices=("web", "local_first"), default="web")
+    pipeline.add_argument("--dedup", action="store_true", help="reuse verdicts for near-duplicate claims")
+    pipeline.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak (slow)")
+    pipeline.add_argument("--json", help="also write the report to this JSON file")
+    args = parser.parse_args()
+    if args.command == "fused":
+        bench_fused(load_claims(args.claims), args.repeat)
+    elif args.command == "pipeline":
+        live = args.mode == "record"
+        report = bench_pipeline(
+            load_claims(args.claims), args.mode, args.fixtures, [int(n) for n in args.concurrency.split(",")],
+            replay.Latency(0 if live else args.llm_latency, 0 if live else args.jitter, 0 if live else args.llm_latency_per_1k),
+            replay.Latency(0 if live else args.http_latency, 0 if live else args.jitter),
+            args.repeat, {"mode": args.pipeline_mode, "dedup": args.dedup}, args.trace_memory, args.search_mode)
+        print_pipeline_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+cache.py
+Persistent caches shared between runs and processes. All caches live in one SQLite database opened in WAL mode, so several worker processes can read and write it concurrently.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Empty VERYNEWS_CACHE_PATH disables the persistent caches
+CACHE_PATH = os.environ.get("VERYNEWS_CACHE_PATH", ".verynews_cache.sqlite3")
+PAGE_CACHE_TTL = float(os.environ.get("VERYNEWS_PAGE_CACHE_TTL", 24 * 3600))
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("VERYNEWS_PAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+SEARCH_CACHE_TTL = float(os.environ.get("VERYNEWS_SEARCH_CACHE_TTL", 6 * 3600))
+# Pages a search context keeps in memory
+PAGE_MEMO_SIZE = int(os.environ.get("VERYNEWS_PAGE_MEMO_SIZE", "1024"))
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("VERYNEWS_EXTRACTION_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "ref_src", "cmpid", "smid", "ocid"}
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL used as cache key: lower-case host without www., no default port,
+    fragment or tracking parameters, sorted query and no trailing slash. http and https map to the same key."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS)
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "by", "with", "from", "about", "as",
+    "is", "are", "was", "were", "be", "been", "did", "does", "do", "has", "have", "had", "that", "this",
+    "it", "its", "into", "over", "after", "before", "than", "any", "whether", "if",
+}
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a search query: lower-case words without punctuation, in their original order,
+    followed by the sorted set of site: filters. Word order is kept because it carries meaning ("Did
+    Israel attack Iran" is not "Did Iran attack Israel"); phrase quotes and a leading "-" (exclude) are
+    kept because they change what Google returns."""
+    tokens = query.lower().split()
+    sites = sorted({t for t in tokens if t.startswith("site:")})
+    words = []
+    for token in tokens:
+        if token.startswith("site:"):
+            continue
+        word = re.sub(r'[^\w\-"]+', "", token).rstrip("-")
+        if word.strip('"-'):
+            words.append(word)
+    return " ".join(words) + ("|" + " ".join(sites) if sites else "")
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8", errors="replace")
+    return hashlib.sha256(data).hexdigest()
+
+class SQLiteStore:
+    SCHEMA = ""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _execute(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent writers queue on busy_timeout
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+@dataclass
+class CachedPage:
+    url: str
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    fresh: bool
+
+class PageMemo:
+    """In-memory LRU of page text in front of the page cache, for one search context. Entries expire
+    after the page cache TTL, counted from when the page was fetched, so a long-lived context still
+    revalidates pages; at most `max_entries` pages are kept."""
+    def __init__(self, max_entries: int = PAGE_MEMO_SIZE, ttl: float = PAGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, url: str) -> Optional[str]:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        text, fetched_at = entry
+        if time.time() - fetched_at >= self.ttl:
+            del self._entries[url]
+            return None
+        self._entries.move_to_end(url)
+        return text
+
+    def put(self, url: str, text: str, fetched_at: Optional[float] = None):
+        self._entries[url] = (text, fetched_at or time.time())
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class PageCache(SQLiteStore):
+    """Extracted page text keyed by normalized URL. Text is stored once per content hash, so mirrors of
+    the same article share storage. Entries older than `ttl` are returned as stale so the caller can
+    revalidate them with ETag/Last-Modified; the least recently used pages are evicted above `max_bytes`."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS page_contents (hash TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS pages (
+        url_key TEXT PRIMARY KEY, url TEXT NOT NULL, content_hash TEXT NOT NULL,
+        etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = PAGE_CACHE_TTL, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        key = normalize_url(url)
+        rows = self._execute(
+            "SELECT p.url, c.text, p.etag, p.last_modified, p.fetched_at FROM pages p "
+            "JOIN page_contents c ON c.hash = p.content_hash WHERE p.url_key = ?", (key,))
+        if not rows:
+            return None
+        now = time.time()
+        self._execute("UPDATE pages SET accessed_at = ? WHERE url_key = ?", (now, key))
+        url, text, etag, last_modified, fetched_at = rows[0]
+        return CachedPage(url, text, etag, last_modified, fetched_at, now - fetched_at < self.ttl)
+
+    def put(self, url: str, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        digest = content_hash(text)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO page_contents (hash, text, size) VALUES (?, ?, ?)",
+                         (digest, text, len(text.encode("utf-8", errors="replace"))))
+            conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (normalize_url(url), url, digest, etag, last_modified, now, now))
+        self.evict()
+
+    def touch(self, url: str):
+        """Mark a stale entry as fresh again after a 304 Not Modified revalidation."""
+        now = time.time()
+        self._execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url_key = ?", (now, now, normalize_url(url)))
+
+    def evict(self):
+        total = self._execute("SELECT COALESCE(SUM(size), 0) FROM page_contents")[0][0]
+        if total <= self.max_bytes:
+            return
+        # Free down to 90% of the budget so eviction does not run on every insert
+        excess = total - int(self.max_bytes * 0.9)
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT p.url_key, c.size FROM pages p JOIN page_contents c ON c.hash = p.content_hash "
+                "ORDER BY p.accessed_at").fetchall()
+            victims = []
+            for url_key, size in rows:
+                if excess <= 0:
+                    break
+                victims.append((url_key,))
+                excess -= size
+            conn.executemany("DELETE FROM pages WHERE url_key = ?", victims)
+            conn.execute("DELETE FROM page_contents WHERE hash NOT IN (SELECT content_hash FROM pages)")
+
+class SearchCache(SQLiteStore):
+    """Search result lists keyed by normalized query, search backend and result count. Results older than
+    `ttl` seconds are treated as misses. Hit and miss counts are kept per process, see `stats()`."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS search_results (key TEXT PRIMARY KEY, query TEXT NOT NULL, results TEXT NOT NULL, created_at REAL NOT NULL);
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = SEARCH_CACHE_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query: str, backend: str, max_results: int) -> str:
+        return f"{backend}:{max_results}:{normalize_query(query)}"
+
+    def get(self, query: str, backend: str, max_results: int) -> Optional[List[dict]]:
+        rows = self._execute("SELECT results, created_at FROM search_results WHERE key = ?", (self._key(query, backend, max_results),))
+        if rows and time.time() - rows[0][1] < self.ttl:
+            self.hits += 1
+            return json.loads(rows[0][0])
+        self.misses += 1
+        return None
+
+    def put(self, query: str, backend: str, max_results: int, results: List[dict]):
+        self._execute("INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?)",
+                      (self._key(query, backend, max_results), query, json.dumps(results, ensure_ascii=False), time.time()))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0}
+
+class ExtractionCache(SQLiteStore):
+    """Text extracted from downloaded documents (PDFs, large HTML pages), keyed by a hash of the raw bytes
+    and the extraction budget, so the same report served from several URLs is only extracted once."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS extractions (key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS extractions_accessed_at ON extractions (accessed_at);
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> Optional[str]:
+        rows = self._execute("SELECT text FROM extractions WHERE key = ?", (key,))
+        if not rows:
+            return None
+        self._execute("UPDATE extractions SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return rows[0][0]
+
+    def put(self, key: str, text: str):
+        self._execute("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?)",
+                      (key, text, len(text.encode("utf-8", errors="replace")), time.time()))
+        total = self._execute("SELECT COALESCE(SUM(size), 0) FROM extractions")[0][0]
+        if total > self.max_bytes:
+            with self._transaction() as conn:
+                excess = total - int(self.max_bytes * 0.9)
+                victims = []
+                for victim, size in conn.execute("SELECT key, size FROM extractions ORDER BY accessed_at"):
+                    if excess <= 0:
+                        break
+                    victims.append((victim,))
+                    excess -= size
+                conn.executemany("DELETE FROM extractions WHERE key = ?", victims)
+
+class ResponseCache(SQLiteStore):
+    """On-disk LLM response cache. Freshness is decided at read time from `max_age`, so changing a
+    stage's TTL applies to answers that are already stored. Beyond `max_entries` answers the oldest
+    are evicted, which also clears out the expired ones."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_responses (key TEXT PRIMARY KEY, stage TEXT NOT NULL, text TEXT NOT NULL, created_at REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS llm_responses_created_at ON llm_responses (created_at);
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = 20000):
+        super().__init__(path)
+        self.max_entries = max_entries
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[str]:
+        rows = self._execute("SELECT text, created_at FROM llm_responses WHERE key = ?", (key,))
+        if rows and (max_age is None or time.time() - rows[0][1] < max_age):
+            return rows[0][0]
+        return None
+
+    def put(self, key: str, text: str, stage: str = ""):
+        self._execute("INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?)", (key, stage, text, time.time()))
+        count = self._execute("SELECT COUNT(*) FROM llm_responses")[0][0]
+        if count > self.max_entries:
+            # Evict down to 90% so a full cache is not trimmed on every put
+            self._execute("DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses ORDER BY created_at LIMIT ?)",
+                          (count - int(self.max_entries * 0.9),))
+
+_page_cache = None
+_search_cache = None
+_extraction_cache = None
+
+def default_page_cache() -> Optional[PageCache]:
+    global _page_cache
+    if _page_cache is None and CACHE_PATH:
+        _page_cache = PageCache(CACHE_PATH)
+    return _page_cache
+
+def default_search_cache() -> Optional[SearchCache]:
+    global _search_cache
+    if _search_cache is None and CACHE_PATH:
+        _search_cache = SearchCache(CACHE_PATH)
+    return _search_cache
+
+def default_extraction_cache() -> Optional[ExtractionCache]:
+    global _extraction_cache
+    if _extraction_cache is None and CACHE_PATH:
+        _extraction_cache = ExtractionCache(CACHE_PATH)
+    return _extraction_cache
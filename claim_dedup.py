@@ -0,0 +1,170 @@
+"""
+claim_dedup.py
+Claim-level deduplication. Reworded copies of one claim are recognised by a MinHash fingerprint of the
+translated text and the 5W1H facts, looked up through LSH bands among the claims judged within a
+freshness window, and reuse the stored verdict instead of running the pipeline again. Copies arriving
+while the first one is still being judged wait for its result.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import CACHE_PATH, SQLiteStore
+from evidence import tokenize
+from fingerprint import minhash, similarity, lsh_bands
+from metrics import inc
+
+# Opt-in: a false match hands one claim another claim's verdict
+CLAIM_DEDUP = os.environ.get("VERYNEWS_CLAIM_DEDUP", "0") == "1"
+CLAIM_DEDUP_THRESHOLD = float(os.environ.get("VERYNEWS_CLAIM_DEDUP_THRESHOLD", "0.8"))
+# Seconds a verdict can be reused for a duplicate claim
+CLAIM_DEDUP_TTL = float(os.environ.get("VERYNEWS_CLAIM_DEDUP_TTL", 6 * 3600))
+NUM_BANDS = 16
+FACT_FIELDS = ("who", "what", "when", "where")
+# Facts that must match exactly: a bag of words cannot tell "A attacked B" from "B attacked A"
+GUARD_FIELDS = ("who", "where")
+NEGATIONS = {"not", "no", "never", "none", "nobody", "nothing", "deny", "denies", "denied", "false", "fake", "hoax",
+             "isn't", "aren't", "wasn't", "weren't", "didn't", "doesn't", "don't", "won't", "can't", "cannot"}
+# State values that are not stored with a verdict: the raw search results are large and only feed the
+# evidence stage, whose output is kept
+UNSTORED_STATE = ("search_context", "search_results")
+
+@dataclass
+class ClaimFingerprint:
+    signature: Tuple[int, ...]
+    # Claims only match when they mention the same numbers, agree on negation and have the same who and
+    # where, so "5 killed" never reuses the verdict for "50 killed", "X happened" the verdict for "X did
+    # not happen", nor "A shot down B's jet" the verdict for "B shot down A's jet"
+    guard: str
+
+@dataclass
+class Duplicate:
+    """An earlier claim close enough to reuse: its stored state (or, while it is still running, its task)."""
+    claim_id: str
+    similarity: float
+    created_at: float
+    state: Optional[Dict[str, Any]] = None
+    running: Optional[asyncio.Future] = None
+
+    def info(self) -> Dict[str, Any]:
+        return {"claim_id": self.claim_id, "similarity": round(self.similarity, 3), "age": round(time.time() - self.created_at, 1)}
+
+def fingerprint(news_en: str, facts: Dict[str, Any]) -> ClaimFingerprint:
+    """Fingerprint of a translated claim: its words and word pairs (without URLs, mentions and stopwords)
+    plus the who/what/when/where facts, guarded by its numbers, negation and who/where facts."""
+    text = re.sub(r"https?://\S+|@\w+", " ", news_en or "")
+    words = tokenize(text)
+    features = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+    for name in FACT_FIELDS:
+        features |= {f"{name}:{token}" for token in tokenize(str((facts or {}).get(name, "")))}
+    numbers = sorted(set(re.findall(r"\d+(?:[.,]\d+)?", text)))
+    negated = sum(word in NEGATIONS for word in words) % 2
+    roles = [" ".join(tokenize(str((facts or {}).get(name, "")))) for name in GUARD_FIELDS]
+    return ClaimFingerprint(minhash(features), "|".join([",".join(numbers), str(negated), *roles]))
+
+class ClaimStore(SQLiteStore):
+    """Judged claims with their fingerprint, LSH band keys and final state."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS claims (id TEXT PRIMARY KEY, guard TEXT NOT NULL, signature TEXT NOT NULL, state TEXT NOT NULL, created_at REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS claims_created_at ON claims (created_at);
+    CREATE TABLE IF NOT EXISTS claim_bands (band TEXT NOT NULL, claim_id TEXT NOT NULL);
+    CREATE INDEX IF NOT EXISTS claim_bands_band ON claim_bands (band);
+    """
+
+    def find(self, fp: ClaimFingerprint, max_age: float, threshold: float) -> Optional[Duplicate]:
+        bands = lsh_bands(fp.signature, NUM_BANDS)
+        if not bands:
+            return None
+        rows = self._execute(
+            f"SELECT DISTINCT c.id, c.signature, c.state, c.created_at FROM claim_bands b JOIN claims c ON c.id = b.claim_id "
+            f"WHERE b.band IN ({','.join('?' * len(bands))}) AND c.guard = ? AND c.created_at >= ?",
+            (*bands, fp.guard, time.time() - max_age))
+        best = None
+        for claim_id, signature, state, created_at in rows:
+            score = similarity(fp.signature, tuple(json.loads(signature)))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (claim_id, score, created_at, state)
+        if best is None:
+            return None
+        claim_id, score, created_at, state = best
+        return Duplicate(claim_id, score, created_at, state=json.loads(state))
+
+    def put(self, claim_id: str, fp: ClaimFingerprint, state: Dict[str, Any], max_age: float = CLAIM_DEDUP_TTL):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO claims VALUES (?, ?, ?, ?, ?)",
+                         (claim_id, fp.guard, json.dumps(fp.signature), json.dumps(state, ensure_ascii=False, default=str), now))
+            conn.executemany("INSERT INTO claim_bands VALUES (?, ?)", [(band, claim_id) for band in lsh_bands(fp.signature, NUM_BANDS)])
+            # Claims past the freshness window can no longer be reused
+            expired = conn.execute("SELECT id FROM claims WHERE created_at < ?", (now - max_age,)).fetchall()
+            conn.executemany("DELETE FROM claim_bands WHERE claim_id = ?", expired)
+            conn.executemany("DELETE FROM claims WHERE id = ?", expired)
+
+@dataclass
+class _Running:
+    claim_id: str
+    fingerprint: ClaimFingerprint
+    future: asyncio.Future
+    created_at: float = field(default_factory=time.time)
+
+def stored_state(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in values.items() if k not in UNSTORED_STATE}
+
+class ClaimIndex:
+    """Finds earlier near-duplicates of a claim: among the claims currently being judged on this event
+    loop, then in the store. `store` may be None to only coalesce concurrent duplicates."""
+    def __init__(self, store: Optional[ClaimStore] = None, threshold: float = CLAIM_DEDUP_THRESHOLD, ttl: float = CLAIM_DEDUP_TTL):
+        self.store = store
+        self.threshold = threshold
+        self.ttl = ttl
+        # Futures are bound to one loop, so keep the running claims per loop
+        self._running = weakref.WeakKeyDictionary()
+
+    def _running_claims(self) -> List[_Running]:
+        return self._running.setdefault(asyncio.get_running_loop(), [])
+
+    def running(self, fp: ClaimFingerprint) -> Optional[Duplicate]:
+        best = None
+        for entry in self._running_claims():
+            if entry.fingerprint.guard != fp.guard:
+                continue
+            score = similarity(fp.signature, entry.fingerprint.signature)
+            if score >= self.threshold and (best is None or score > best.similarity):
+                best = Duplicate(entry.claim_id, score, entry.created_at, running=entry.future)
+        return best
+
+    def begin(self, fp: ClaimFingerprint) -> _Running:
+        """Register a claim that is about to be judged, so duplicates arriving meanwhile wait for it."""
+        entry = _Running(uuid.uuid4().hex, fp, asyncio.get_running_loop().create_future())
+        self._running_claims().append(entry)
+        return entry
+
+    async def find(self, fp: ClaimFingerprint) -> Optional[Duplicate]:
+        if self.store is None:
+            return None
+        return await asyncio.to_thread(self.store.find, fp, self.ttl, self.threshold)
+
+    async def finish(self, entry: _Running, state: Optional[Dict[str, Any]] = None, store: bool = True):
+        """Publish the final state of a claim (None if judging it failed) to its waiting duplicates and the store."""
+        self._running_claims().remove(entry)
+        if state is not None and store and self.store is not None:
+            await asyncio.to_thread(self.store.put, entry.claim_id, entry.fingerprint, state, self.ttl)
+        if not entry.future.done():
+            entry.future.set_result(state)
+
+    @staticmethod
+    def hit(duplicate: Duplicate):
+        inc("verynews_claim_dedup_total", result="running" if duplicate.running is not None else "stored")
+        print(f"Claim matches {duplicate.claim_id} (similarity {duplicate.similarity:.2f}), reusing its verdict")
+
+def default_claim_store() -> Optional[ClaimStore]:
+    return ClaimStore(CACHE_PATH) if CACHE_PATH else None
+
+# Shared index for all runs in this process
+claims = ClaimIndex(default_claim_store())
@@ -0,0 +1,67 @@
+"""
+events.py
+Typed progress events for a pipeline run. Code anywhere in the run calls emit(); the events reach the
+sink installed for the current run (a context variable, so concurrent runs never see each other's
+events) and are dropped when nobody listens.
+"""
+import json
+import time
+import asyncio
+import contextvars
+from dataclasses import dataclass, field, asdict
+from typing import Any, ClassVar, Dict, List, Optional
+
+@dataclass
+class Event:
+    type: ClassVar[str] = "event"
+    time: float = field(default_factory=time.time, kw_only=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.type, **asdict(self)}
+
+    def to_sse(self) -> str:
+        """Server-Sent Events frame: the event type as `event:`, the event as JSON `data:`."""
+        return f"event: {self.type}\ndata: {json.dumps(self.to_dict(), ensure_ascii=False, default=str)}\n\n"
+
+@dataclass
+class StageCompleted(Event):
+    """A pipeline stage finished; `outputs` maps each value it produced (e.g. "facts", "judge") to its value."""
+    type: ClassVar[str] = "stage"
+    stage: str
+    outputs: Dict[str, Any]
+    duration: float
+
+@dataclass
+class SearchResults(Event):
+    """Result list of one search query, emitted before the full pages are fetched."""
+    type: ClassVar[str] = "search"
+    query: str
+    sources: List[Dict[str, Any]]
+
+@dataclass
+class ReportChunk(Event):
+    type: ClassVar[str] = "report"
+    text: str
+
+@dataclass
+class RunCompleted(Event):
+    type: ClassVar[str] = "done"
+    judge_json: Dict[str, Any]
+    early_exit: bool
+    timings: Dict[str, Dict[str, float]]
+
+@dataclass
+class RunFailed(Event):
+    type: ClassVar[str] = "error"
+    error: str
+
+_sink: contextvars.ContextVar[Optional[asyncio.Queue]] = contextvars.ContextVar("verynews_event_sink", default=None)
+
+def listen(queue: asyncio.Queue):
+    """Send the events of the current context (and the tasks it starts from now on) to `queue`."""
+    return _sink.set(queue)
+
+def emit(event: Event):
+    queue = _sink.get()
+    if queue is not None:
+        queue.put_nowait(event)
@@ -0,0 +1,170 @@
+"""
+evidence.py
+Token-budgeted evidence packing for the evidence aggregation prompt. Fetched source text is split into passages, ranked against the 5W1H facts with BM25, and only the best passages that fit the global token budget are packed.
+"""
+import os
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from cache import STOPWORDS, normalize_url
+from fingerprint import shingles, minhash, similarity
+
+EVIDENCE_TOKEN_BUDGET = int(os.environ.get("VERYNEWS_EVIDENCE_TOKEN_BUDGET", "12000"))
+PASSAGE_TOKENS = int(os.environ.get("VERYNEWS_PASSAGE_TOKENS", "200"))
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("VERYNEWS_NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# Texts shorter than this (snippets, failed fetches) are only deduplicated by URL
+MIN_FINGERPRINT_CHARS = 500
+# Markers the 5W1H agent adds to values it could not extract; they carry no search signal
+FACT_MARKERS = {"explicit", "inferred", "defaulted", "unknown", "cannot", "determined", "current", "research", "time", "within", "past", "month"}
+
+def estimate_tokens(text: str) -> int:
+    # Same 4 characters per token estimate as deduplicate_and_format_sources
+    return len(text) // 4 + 1
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+(?:[-'][a-z0-9]+)*", text.lower()) if t not in STOPWORDS]
+
+def split_passages(text: str, max_chars: int) -> List[str]:
+    """Split text on paragraph breaks, merge short neighbours and cut long paragraphs at sentence ends,
+    so every passage is at most about `max_chars` characters."""
+    passages = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces, piece = [], ""
+            for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+                if piece and len(piece) + len(sentence) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece} {sentence}".strip()
+                while len(piece) > max_chars:
+                    pieces.append(piece[:max_chars])
+                    piece = piece[max_chars:]
+            if piece:
+                pieces.append(piece)
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+class BM25:
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = sum(self.lengths) / len(documents) if documents else 0.0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        terms = set(query)
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+def facts_query(facts: dict, news_content: str = "") -> List[str]:
+    """Query terms for ranking passages: the 5W1H values without extraction markers, plus the news text itself."""
+    values = " ".join(str(value) for value in (facts or {}).values())
+    return [t for t in tokenize(values) if t not in FACT_MARKERS] + tokenize(news_content)
+
+def _usable_content(text) -> str:
+    # Failed fetches leave short "[HTTP error: 403]"-style placeholders instead of page text
+    if not text or (text.startswith("[") and text.rstrip().endswith("]") and len(text) < 300):
+        return ""
+    return text
+
+def unique_sources(search_response: List[dict], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[dict]:
+    """Sources from all search responses with duplicates collapsed: first by canonical URL (tracking
+    parameters, fragments and www. ignored), then by MinHash similarity of the fetched text, so syndicated
+    wire copies republished on several sites count once. The representative is the copy with the most
+    text; the other URLs are listed in its `mirrors`."""
+    by_url = {}
+    for response in search_response:
+        for source in response['results']:
+            by_url.setdefault(normalize_url(source['url']), source)
+
+    groups = []
+    for source in by_url.values():
+        text = _usable_content(source.get('raw_content'))
+        signature = minhash(shingles(text)) if len(text) >= MIN_FINGERPRINT_CHARS else ()
+        for group in groups:
+            if signature and similarity(signature, group[0]) >= threshold:
+                group[1].append(source)
+                break
+        else:
+            groups.append((signature, [source]))
+
+    sources = []
+    for _, copies in groups:
+        representative = max(copies, key=lambda s: len(_usable_content(s.get('raw_content'))))
+        mirrors = [s['url'] for s in copies if s is not representative]
+        sources.append({**representative, "mirrors": mirrors} if mirrors else representative)
+    return sources
+
+def pack_evidence(search_response: List[dict], facts: dict, news_content: str = "",
+                  token_budget: int = EVIDENCE_TOKEN_BUDGET, passage_tokens: int = PASSAGE_TOKENS) -> str:
+    """Format search results for PROMPT_EVIDENCE_AGGREGATION within `token_budget` tokens. Passages from
+    every source compete on BM25 score against the facts; each source that contributes a passage is
+    listed once with its title, URL, mirror URLs and search snippet, followed by its passages in document order."""
+    sources = unique_sources(search_response)
+
+    passages: List[Tuple[int, int, str]] = []
+    for source_index, source in enumerate(sources):
+        text = _usable_content(source.get('raw_content')) or source.get('content') or ''
+        for position, passage in enumerate(split_passages(text, passage_tokens * 4)):
+            passages.append((source_index, position, passage))
+    if not passages:
+        return "Content from sources:\n(no source content could be retrieved)"
+
+    scores = BM25([tokenize(passage) for _, _, passage in passages]).scores(facts_query(facts, news_content))
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+
+    selected: Dict[int, List[Tuple[int, str]]] = {}
+    order = []
+    used = estimate_tokens("Content from sources:\n")
+    for i in ranked:
+        source_index, position, passage = passages[i]
+        cost = estimate_tokens(passage) + 2
+        if source_index not in selected:
+            source = sources[source_index]
+            cost += estimate_tokens(f"{source['title']}{source['url']}{source.get('content', '')}") + 30
+        if used + cost > token_budget:
+            continue
+        used += cost
+        if source_index not in selected:
+            selected[source_index] = []
+            order.append(source_index)
+        selected[source_index].append((position, passage))
+
+    parts = ["Content from sources:"]
+    for source_index in order:
+        source = sources[source_index]
+        parts.append("=" * 80)
+        parts.append(f"Source: {source['title']}")
+        parts.append(f"URL: {source['url']}")
+        parts.append(f"Search snippet: {source.get('content', '')}")
+        if source.get('mirrors'):
+            parts.append(f"Also published at: {', '.join(source['mirrors'])}")
+        parts.append("Most relevant passages:")
+        parts.extend(passage for _, passage in sorted(selected[source_index]))
+    parts.append("=" * 80)
+    return "\n".join(parts)
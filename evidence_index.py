@@ -0,0 +1,146 @@
+"""
+evidence_index.py
+Persistent full-text index of the articles fetched from the trusted sites. Every page the search layer
+downloads and extracts is added to a SQLite FTS5 table, so the "local_first" search mode can answer
+recurring topics from articles already on disk, ranked with BM25, and only go to the web when the index
+does not hold enough matching articles.
+"""
+import os
+import re
+import time
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from cache import CACHE_PATH, SQLiteStore, content_hash, normalize_url
+from evidence import tokenize
+
+EVIDENCE_INDEX_PATH = os.environ.get("VERYNEWS_EVIDENCE_INDEX_PATH", CACHE_PATH)
+EVIDENCE_INDEX_MAX_ARTICLES = int(os.environ.get("VERYNEWS_EVIDENCE_INDEX_MAX_ARTICLES", "50000"))
+# Articles indexed longer ago than this are not used to answer searches
+EVIDENCE_INDEX_MAX_AGE = float(os.environ.get("VERYNEWS_EVIDENCE_INDEX_MAX_AGE", 30 * 24 * 3600))
+# A local hit must contain at least this share of the query's terms to count towards recall
+LOCAL_MIN_COVERAGE = float(os.environ.get("VERYNEWS_LOCAL_MIN_COVERAGE", "0.6"))
+# Shorter texts are snippets or fetch errors ("[HTTP error: 404]"), not articles
+MIN_ARTICLE_CHARS = 300
+MAX_ARTICLE_CHARS = 50_000
+
+def trusted_site(url: str, sites: Sequence[str]) -> Optional[str]:
+    """The entry of `sites` that `url` belongs to (a domain, its subdomains, or a domain/path prefix), or
+    None. With no trusted sites configured every URL is accepted and its host is returned."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if not sites:
+        return host or None
+    for site in sites:
+        site = site.lower().strip()
+        site_host, _, site_path = site.partition("/")
+        site_host = site_host.removeprefix("www.")
+        if host == site_host or host.endswith("." + site_host):
+            if not site_path or parts.path.lstrip("/").startswith(site_path):
+                return site
+    return None
+
+def _match_expression(terms: List[str]) -> str:
+    return " OR ".join(f'"{term}"' for term in terms)
+
+def _covers(term: str, text_terms: set) -> bool:
+    # Loose stemming: "missiles"/"missile" and "shooting"/"shoot" count as the same term
+    stem = term[:max(4, len(term) - 3)]
+    return term in text_terms or any(t.startswith(stem) for t in text_terms)
+
+class EvidenceIndex(SQLiteStore):
+    """Article text by normalized URL, full-text indexed with FTS5. Titles weigh more than body text in
+    the BM25 ranking. Re-adding an unchanged article only refreshes its timestamp; the oldest articles are
+    dropped above `max_articles`."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS evidence_articles (
+        id INTEGER PRIMARY KEY, url_key TEXT UNIQUE NOT NULL, url TEXT NOT NULL, site TEXT, title TEXT,
+        snippet TEXT, content_hash TEXT NOT NULL, indexed_at REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS evidence_articles_indexed_at ON evidence_articles (indexed_at);
+    CREATE VIRTUAL TABLE IF NOT EXISTS evidence_fts USING fts5(title, text, tokenize='porter unicode61 remove_diacritics 2');
+    """
+
+    def __init__(self, path: str = EVIDENCE_INDEX_PATH, max_articles: int = EVIDENCE_INDEX_MAX_ARTICLES):
+        super().__init__(path)
+        self.max_articles = max_articles
+
+    def add(self, url: str, text: str, title: str = "", snippet: str = "", site: Optional[str] = None) -> bool:
+        """Index one extracted article; False if the text is not an article."""
+        text = (text or "").strip()
+        if len(text) < MIN_ARTICLE_CHARS or (text.startswith("[") and text.endswith("]")):
+            return False
+        text = text[:MAX_ARTICLE_CHARS]
+        key = normalize_url(url)
+        digest = content_hash(text)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT id, content_hash FROM evidence_articles WHERE url_key = ?", (key,)).fetchone()
+            if row and row[1] == digest:
+                conn.execute("UPDATE evidence_articles SET indexed_at = ? WHERE id = ?", (now, row[0]))
+                return True
+            if row:
+                conn.execute("DELETE FROM evidence_fts WHERE rowid = ?", (row[0],))
+                conn.execute("UPDATE evidence_articles SET url = ?, site = ?, title = ?, snippet = ?, content_hash = ?, indexed_at = ? "
+                             "WHERE id = ?", (url, site, title, snippet, digest, now, row[0]))
+                article_id = row[0]
+            else:
+                article_id = conn.execute(
+                    "INSERT INTO evidence_articles (url_key, url, site, title, snippet, content_hash, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", (key, url, site, title, snippet, digest, now)).lastrowid
+            conn.execute("INSERT INTO evidence_fts (rowid, title, text) VALUES (?, ?, ?)", (article_id, title, text))
+        self.evict()
+        return True
+
+    def search(self, query: str, limit: int = 5, max_age: Optional[float] = EVIDENCE_INDEX_MAX_AGE,
+               min_coverage: float = LOCAL_MIN_COVERAGE, max_chars: Optional[int] = None) -> List[Dict]:
+        """Best matching articles for a search query (site: filters are ignored), as search results
+        ({title, url, content, score, raw_content}). Only articles containing at least `min_coverage` of
+        the query terms are returned."""
+        terms = list(dict.fromkeys(tokenize(re.sub(r"\bsite:\S+", " ", query))))
+        if not terms:
+            return []
+        since = time.time() - max_age if max_age else 0
+        rows = self._execute(
+            "SELECT a.url, a.title, a.snippet, f.text, bm25(evidence_fts, 4.0, 1.0) AS rank "
+            "FROM evidence_fts f JOIN evidence_articles a ON a.id = f.rowid "
+            "WHERE evidence_fts MATCH ? AND a.indexed_at >= ? ORDER BY rank LIMIT ?",
+            (_match_expression(terms), since, limit * 4))
+        results = []
+        for url, title, snippet, text, rank in rows:
+            text_terms = set(tokenize(f"{title} {text}"))
+            coverage = sum(_covers(term, text_terms) for term in terms) / len(terms)
+            if coverage < min_coverage:
+                continue
+            results.append({
+                "title": title or url,
+                "url": url,
+                "content": snippet or text[:300],
+                # bm25() is lower for better matches
+                "score": round(-rank, 4),
+                "raw_content": text[:max_chars] if max_chars else text,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def evict(self):
+        count = self._execute("SELECT COUNT(*) FROM evidence_articles")[0][0]
+        if count <= self.max_articles:
+            return
+        # Drop down to 90% of the limit so eviction does not run on every insert
+        excess = count - int(self.max_articles * 0.9)
+        with self._transaction() as conn:
+            victims = conn.execute("SELECT id FROM evidence_articles ORDER BY indexed_at LIMIT ?", (excess,)).fetchall()
+            conn.executemany("DELETE FROM evidence_fts WHERE rowid = ?", victims)
+            conn.executemany("DELETE FROM evidence_articles WHERE id = ?", victims)
+
+    def stats(self) -> Dict[str, int]:
+        return {"articles": self._execute("SELECT COUNT(*) FROM evidence_articles")[0][0]}
+
+_evidence_index = None
+
+def default_evidence_index() -> Optional[EvidenceIndex]:
+    global _evidence_index
+    if _evidence_index is None and EVIDENCE_INDEX_PATH:
+        _evidence_index = EvidenceIndex(EVIDENCE_INDEX_PATH)
+    return _evidence_index
@@ -0,0 +1,285 @@
+"""
+extract.py
+Article text extraction for fetched sources. HTML is parsed incrementally from the response stream, skipping script/style/navigation boilerplate, and reading stops once enough article text for the configured budget has been collected.
+"""
+import os
+import io
+import signal
+import multiprocessing
+import re
+import codecs
+import asyncio
+import weakref
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+from cache import ExtractionCache, content_hash
+from http_client import HttpResponse
+from metrics import span, cache_lookup
+
+# "stream" (incremental, budget-bounded) or "full" (whole-document BeautifulSoup parse)
+EXTRACTION_MODE = os.environ.get("VERYNEWS_EXTRACTION", "stream")
+EXTRACTION_WORKERS = int(os.environ.get("VERYNEWS_EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+EXTRACTION_TIMEOUT = float(os.environ.get("VERYNEWS_EXTRACTION_TIMEOUT", "20"))
+PDF_MAX_PAGES = int(os.environ.get("VERYNEWS_PDF_MAX_PAGES", "5"))
+PDF_MAX_BYTES = int(os.environ.get("VERYNEWS_PDF_MAX_BYTES", 10 * 1024 * 1024))
+# Full-mode HTML pages above this size are parsed in the process pool instead of on the event loop
+HEAVY_HTML_BYTES = int(os.environ.get("VERYNEWS_HEAVY_HTML_BYTES", 512 * 1024))
+
+# Elements whose content is never article text
+BOILERPLATE_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "nav", "footer",
+                    "aside", "form", "button", "select", "textarea", "menu", "dialog"}
+# class/id fragments that mark navigation, share bars, cookie banners and similar containers
+BOILERPLATE_MARKERS = re.compile(r"(^|[\s_-])(nav|navbar|menu|footer|sidebar|cookie|consent|share|social|related|"
+                                 r"promo|advert|ads?|newsletter|subscribe|comments?|breadcrumbs?)($|[\s_-])", re.I)
+# <header> and site-header classes are boilerplate only outside the article: inside <article> or <main>
+# a header holds the headline, and "article-header"/"entry-header" classes never match
+SITE_HEADER_MARKERS = re.compile(r"(^|\s)((site|page|global|top)[_-]?header|masthead)($|[\s_-])", re.I)
+CONTENT_TAGS = {"article", "main"}
+BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "blockquote", "pre", "td", "th", "dd", "dt", "figcaption",
+              "div", "section", "article", "main", "tr", "table", "ul", "ol", "title"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+HEADING_TAGS = {"title", "h1", "h2", "h3"}
+
+class ArticleTextExtractor(HTMLParser):
+    """Incremental HTML-to-text extractor. Keeps text blocks that look like article prose (long enough,
+    not mostly link text) and headings; `done` turns true once `max_chars` characters are collected."""
+    def __init__(self, max_chars: int = 20_000, min_block_chars: int = 40, max_link_ratio: float = 0.5):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.min_block_chars = min_block_chars
+        self.max_link_ratio = max_link_ratio
+        self.blocks = []
+        self.size = 0
+        self._stack = []
+        self._skip = 0
+        self._links = 0
+        self._block_tag = None
+        self._text = []
+        self._link_chars = 0
+
+    @property
+    def done(self) -> bool:
+        return self.size >= self.max_chars
+
+    def _flush(self):
+        text = " ".join("".join(self._text).split())
+        if text and not self.done:
+            total = len(text)
+            heading = self._block_tag in HEADING_TAGS
+            if heading or (total >= self.min_block_chars and self._link_chars <= total * self.max_link_ratio):
+                self.blocks.append(text)
+                self.size += total + 1
+        self._text = []
+        self._link_chars = 0
+
+    def _is_boilerplate(self, tag, attrs) -> bool:
+        if tag in BOILERPLATE_TAGS:
+            return True
+        in_content = any(name in CONTENT_TAGS for name, _ in self._stack)
+        if tag == "header" and not in_content:
+            return True
+        marker = " ".join(value for name, value in attrs if name in ("class", "id", "role") and value)
+        if not marker:
+            return False
+        return BOILERPLATE_MARKERS.search(marker) is not None or (not in_content and SITE_HEADER_MARKERS.search(marker) is not None)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._flush()
+            self._block_tag = tag
+        if tag == "a":
+            self._links += 1
+        if tag in VOID_TAGS:
+            return
+        boilerplate = self._is_boilerplate(tag, attrs)
+        self._stack.append((tag, boilerplate))
+        self._skip += boilerplate
+
+    def handle_endtag(self, tag):
+        if tag in BLOCK_TAGS:
+            self._flush()
+            self._block_tag = None
+        if tag == "a" and self._links:
+            self._links -= 1
+        if tag not in (name for name, _ in self._stack):
+            return
+        # Pop unclosed children (e.g. <p> or <li> without end tags) along with the element
+        while self._stack:
+            name, boilerplate = self._stack.pop()
+            self._skip -= boilerplate
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        if self._skip or self.done:
+            return
+        self._text.append(data)
+        if self._links:
+            self._link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def text(self) -> str:
+        return "\n".join(self.blocks)[:self.max_chars]
+
+async def extract_html_stream(response: HttpResponse, max_chars: int, max_bytes: int) -> str:
+    """Feed the response body to an ArticleTextExtractor chunk by chunk and stop downloading as soon as
+    it has `max_chars` characters of article text or `max_bytes` bytes have been read."""
+    extractor = ArticleTextExtractor(max_chars)
+    decoder = codecs.getincrementaldecoder(response.charset)(errors="replace")
+    received = 0
+    with span("extract", "html_stream") as attrs:
+        async for chunk in response.iter_chunks():
+            received += len(chunk)
+            extractor.feed(decoder.decode(chunk))
+            if extractor.done or received >= max_bytes:
+                break
+        else:
+            extractor.feed(decoder.decode(b"", final=True))
+        extractor.close()
+        text = extractor.text()
+        attrs.update(bytes=received, chars=len(text))
+    return text
+
+def extract_html_full(html: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.get_text()
+
+# Worker-side functions; they run in the extraction process pool
+def _pdf_to_text(data: bytes, max_pages: int) -> str:
+    from pdfminer.high_level import extract_text
+    return extract_text(io.BytesIO(data), maxpages=max_pages)
+
+def _html_to_text(data: bytes, charset: str) -> str:
+    return extract_html_full(data.decode(charset, errors="replace"))
+
+def _register_worker(pids):
+    pids.put(os.getpid())
+
+class ExtractionPool:
+    """Bounded process pool for CPU-heavy extraction. At most `max_workers` documents are in flight, and
+    each gets `timeout` seconds. A worker stuck past its timeout keeps its slot until it finishes; once
+    every worker is stuck the pool is torn down and replaced. A pool whose worker died is replaced too."""
+    def __init__(self, max_workers: int = EXTRACTION_WORKERS, timeout: float = EXTRACTION_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        # Workers report their pid on start-up, so stuck ones can be stopped
+        self._pids = None
+        self._worker_pids = set()
+        self._stuck = set()
+        self._slots = weakref.WeakKeyDictionary()
+
+    @property
+    def executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            self._pids = multiprocessing.SimpleQueue()
+            self._worker_pids = set()
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_register_worker, initargs=(self._pids,))
+        return self._executor
+
+    def _slot(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slot = self._slots.get(loop)
+        if slot is None:
+            slot = self._slots[loop] = asyncio.Semaphore(self.max_workers)
+        return slot
+
+    def _discard(self, executor: concurrent.futures.ProcessPoolExecutor, terminate: bool = False):
+        """Drop `executor` so the next call starts a new pool; with `terminate`, stop its workers too."""
+        if executor is None or executor is not self._executor:
+            return
+        pids, self._pids = self._pids, None
+        while pids is not None and not pids.empty():
+            self._worker_pids.add(pids.get())
+        self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        if terminate:
+            # ProcessPoolExecutor cannot cancel running work, so stop its workers directly
+            for pid in self._worker_pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+        self._worker_pids = set()
+        self._stuck.clear()
+
+    def _finished(self, future, slot):
+        self._stuck.discard(future)
+        slot.release()
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, func, *args):
+        slot = self._slot()
+        await slot.acquire()
+        executor = None
+        try:
+            executor = self.executor
+            future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        except BaseException as e:
+            slot.release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard(executor)
+            raise
+        future.add_done_callback(lambda f: self._finished(f, slot))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._stuck.add(future)
+            if len(self._stuck) >= self.max_workers:
+                self._discard(executor, terminate=True)
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. crashed on a malformed PDF) and took the pool down with it
+            self._discard(executor)
+            raise
+
+    def close(self):
+        if self._executor is not None:
+            self._discard(self._executor)
+
+_extraction_pool = None
+
+def default_extraction_pool() -> ExtractionPool:
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ExtractionPool()
+    return _extraction_pool
+
+async def _extract_cached(pool: ExtractionPool, cache: Optional[ExtractionCache], key: str, func, *args) -> str:
+    if cache:
+        text = await asyncio.to_thread(cache.get, key)
+        cache_lookup("extraction", text is not None)
+        if text is not None:
+            return text
+    with span("extract", key.split(":", 1)[0]) as attrs:
+        text = await pool.run(func, *args)
+        attrs["chars"] = len(text)
+    if cache:
+        await asyncio.to_thread(cache.put, key, text)
+    return text
+
+async def extract_pdf(response: HttpResponse, pool: ExtractionPool, cache: Optional[ExtractionCache],
+                      max_pages: int = PDF_MAX_PAGES, max_bytes: int = PDF_MAX_BYTES) -> str:
+    """Read at most `max_bytes` of a PDF and extract its first `max_pages` pages off the event loop."""
+    data = await response.read(max_bytes)
+    return await _extract_cached(pool, cache, f"pdf:{max_pages}:{content_hash(data)}", _pdf_to_text, data, max_pages)
+
+async def extract_html(response: HttpResponse, pool: ExtractionPool, cache: Optional[ExtractionCache]) -> str:
+    """Whole-document extraction; pages larger than HEAVY_HTML_BYTES are parsed in the process pool."""
+    data = await response.read()
+    if len(data) <= HEAVY_HTML_BYTES:
+        with span("extract", "html") as attrs:
+            text = _html_to_text(data, response.charset)
+            attrs["chars"] = len(text)
+        return text
+    return await _extract_cached(pool, cache, f"html:{content_hash(data)}", _html_to_text, data, response.charset)
@@ -0,0 +1,51 @@
+"""
+fingerprint.py
+MinHash fingerprints for near-duplicate detection. Signatures use a stable 64-bit shingle hash, so they can be stored and compared across processes, and can be split into LSH bands for bucketed lookup.
+"""
+import re
+import random
+import hashlib
+from typing import Iterable, List, Set, Tuple
+
+NUM_PERM = 64
+MAX_SHINGLES = 500
+# Each permutation XORs the 64-bit shingle hash with a fixed random mask: a bijection on the hash
+# space that is much cheaper in Python than the usual (a*h + b) mod p family
+_rng = random.Random(1928408694)
+_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERM)]
+
+def shingles(text: str, size: int = 5, limit: int = MAX_SHINGLES) -> Set[str]:
+    """Word n-grams of the lower-cased text. Only the first `limit` shingles are kept: copies of one
+    story share their opening, and this bounds the cost on long pages."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    result = set()
+    for i in range(len(words) - size + 1):
+        result.add(" ".join(words[i:i + size]))
+        if len(result) >= limit:
+            break
+    return result
+
+def _hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+def minhash(features: Iterable[str], num_perm: int = NUM_PERM) -> Tuple[int, ...]:
+    hashes = [_hash(f) for f in features]
+    if not hashes:
+        return ()
+    return tuple(min(h ^ mask for h in hashes) for mask in _MASKS[:num_perm])
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the feature sets behind two signatures."""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+def lsh_bands(signature: Tuple[int, ...], bands: int = 16) -> List[str]:
+    """Band keys for locality-sensitive hashing: signatures that agree on any band land in a shared bucket."""
+    if not signature:
+        return []
+    rows = len(signature) // bands
+    return [f"{i}:" + hashlib.blake2b(repr(signature[i * rows:(i + 1) * rows]).encode(), digest_size=8).hexdigest()
+            for i in range(bands)]
@@ -0,0 +1,132 @@
+"""
+http_client.py
+Long-lived pooled async HTTP client shared by the search and fetch layers: keep-alive connections, DNS caching, per-host concurrency limits, and HTTP/2 when the optional `h2` package is installed.
+"""
+import os
+import json
+import codecs
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("VERYNEWS_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_PER_HOST = int(os.environ.get("VERYNEWS_HTTP_MAX_PER_HOST", "6"))
+HTTP_KEEPALIVE = float(os.environ.get("VERYNEWS_HTTP_KEEPALIVE", "60"))
+HTTP_DNS_TTL = int(os.environ.get("VERYNEWS_HTTP_DNS_TTL", "300"))
+HTTP2_ENABLED = os.environ.get("VERYNEWS_HTTP2", "1") != "0"
+
+class HttpResponse:
+    """Backend-independent view of a streamed response."""
+    def __init__(self, url: str, status: int, headers, chunks, read_all):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self._chunks = chunks
+        self._read_all = read_all
+        self.bytes_read = 0
+
+    async def iter_chunks(self, size: int = 16384) -> AsyncIterator[bytes]:
+        async for chunk in self._chunks(size):
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    async def read(self, limit: int = -1) -> bytes:
+        if limit < 0:
+            data = await self._read_all()
+            self.bytes_read += len(data)
+            return data
+        data = bytearray()
+        async for chunk in self.iter_chunks():
+            data.extend(chunk)
+            if len(data) >= limit:
+                break
+        return bytes(data[:limit])
+
+    @property
+    def charset(self) -> str:
+        content_type = self.headers.get("Content-Type", "")
+        if "charset=" in content_type:
+            charset = content_type.split("charset=")[-1].split(";")[0].strip().strip('"')
+            try:
+                return codecs.lookup(charset).name
+            except LookupError:
+                pass
+        return "utf-8"
+
+    async def text(self, errors: str = "replace") -> str:
+        return (await self.read()).decode(self.charset, errors=errors)
+
+    async def json(self):
+        return json.loads(await self.read())
+
+class HttpClient:
+    """One pooled client for every request made by a search context. Requests to the same host share
+    keep-alive connections and at most `max_per_host` of them run at once."""
+    def __init__(self, max_connections: int = HTTP_MAX_CONNECTIONS, max_per_host: int = HTTP_MAX_PER_HOST,
+                 keepalive: float = HTTP_KEEPALIVE, dns_ttl: int = HTTP_DNS_TTL, http2: bool = HTTP2_ENABLED):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._clients: Dict[bool, object] = {}
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _client(self, verify_ssl: bool):
+        client = self._clients.get(verify_ssl)
+        if client is None:
+            if self.http2:
+                client = httpx.AsyncClient(
+                    http2=True, verify=verify_ssl, follow_redirects=True,
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections,
+                                        keepalive_expiry=self.keepalive))
+            else:
+                client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                    limit=self.max_connections, limit_per_host=self.max_per_host, ssl=None if verify_ssl else False,
+                    use_dns_cache=True, ttl_dns_cache=self.dns_ttl, keepalive_timeout=self.keepalive))
+            self._clients[verify_ssl] = client
+        return client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return semaphore
+
+    @asynccontextmanager
+    async def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                  timeout: float = 30, verify_ssl: bool = True) -> AsyncIterator[HttpResponse]:
+        client = self._client(verify_ssl)
+        async with self._host_semaphore(url):
+            if isinstance(client, httpx.AsyncClient):
+                try:
+                    async with client.stream("GET", url, params=params, headers=headers, timeout=timeout) as response:
+                        yield HttpResponse(str(response.url), response.status_code, response.headers,
+                                           lambda size: response.aiter_bytes(size), response.aread)
+                except httpx.TimeoutException as e:
+                    raise asyncio.TimeoutError(str(e)) from e
+            else:
+                async with client.get(url, params=params, headers=headers,
+                                      timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    yield HttpResponse(str(response.url), response.status, response.headers,
+                                       lambda size: response.content.iter_chunked(size), response.read)
+
+    async def close(self):
+        for client in self._clients.values():
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                await client.close()
+        self._clients.clear()
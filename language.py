@@ -0,0 +1,93 @@
+"""
+language.py
+Local language detection used to skip or narrow the translation step. Text is classified line by line from its script and English function words; English lines pass through untouched and only the remaining non-English lines are sent to the translator.
+"""
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+ENGLISH_WORDS = {
+    "the", "a", "an", "and", "or", "but", "of", "in", "on", "at", "to", "for", "by", "with", "from", "about",
+    "is", "are", "was", "were", "be", "been", "has", "have", "had", "will", "would", "that", "this", "these",
+    "it", "its", "his", "her", "their", "they", "he", "she", "we", "you", "not", "no", "after", "during",
+    "over", "into", "than", "as", "news", "breaking", "said", "says", "who", "what", "when", "where", "why", "how",
+}
+# Frequent function words of other Latin-script languages (French, Spanish, Portuguese, Italian, German, Dutch)
+OTHER_LATIN_WORDS = {
+    "le", "la", "les", "des", "du", "et", "est", "une", "dans", "pour", "qui", "el", "los", "las", "del", "y", "que",
+    "por", "para", "con", "una", "em", "um", "uma", "não", "il", "di", "che", "della", "und", "der", "die", "das",
+    "ist", "nicht", "ein", "eine", "mit", "van", "het", "een", "niet", "op", "en", "de", "al", "au", "aux", "sur",
+    "zu", "im", "dem", "den", "dos", "da", "sul", "nel",
+}
+# Share of non-Latin letters above which a line is treated as non-English
+NON_LATIN_SHARE = 0.2
+MIN_ENGLISH_WORD_SHARE = 0.08
+# A non-English line is only dropped as the counterpart of an English line when they share at least this many
+# verbatim tokens and neither is more than LENGTH_RATIO times as long as the other
+MIN_SHARED_ANCHORS = 2
+LENGTH_RATIO = 2.0
+
+def _is_latin(char: str) -> bool:
+    return "LATIN" in unicodedata.name(char, "")
+
+def detect_language(text: str) -> str:
+    """Classify text as "en" (English), "other" (another language) or "neutral" (names, handles, dates,
+    emoji and other fragments that carry no language signal)."""
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return "neutral"
+    non_latin = sum(1 for c in letters if not _is_latin(c))
+    if non_latin / len(letters) > NON_LATIN_SHARE:
+        return "other"
+    words = re.findall(r"[^\W\d_]+", text.lower())
+    english = sum(1 for w in words if w in ENGLISH_WORDS)
+    # Function words of other languages and accented Latin letters ("Guerra en Ucrania", "Guerre à Gaza")
+    other = sum(1 for w in words if w in OTHER_LATIN_WORDS or any(not c.isascii() and _is_latin(c) for c in w))
+    if len(words) < 4 and not english and not other:
+        return "neutral"
+    if english > other and english / len(words) >= MIN_ENGLISH_WORD_SHARE:
+        return "en"
+    return "other" if other or len(words) >= 4 else "neutral"
+
+def _anchors(text: str) -> set:
+    # Tokens a translation keeps verbatim: Latin words, numbers, model names and emoji
+    tokens = {t.lower() for t in re.findall(r"[A-Za-z0-9][A-Za-z0-9\-\.]*[A-Za-z0-9]|[A-Za-z0-9]", text)}
+    tokens.update(c for c in text if unicodedata.category(c) == "So")
+    return tokens
+
+def _length(text: str) -> int:
+    # A wide (CJK) character carries about as much as three Latin ones
+    return sum(3 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+def _counterpart(line: str, anchors: set, english_line: str, english_anchors: set) -> bool:
+    if len(anchors) < MIN_SHARED_ANCHORS or not anchors <= english_anchors:
+        return False
+    length, english_length = _length(line), _length(english_line)
+    return max(length, english_length) <= LENGTH_RATIO * min(length, english_length)
+
+def split_for_translation(text: str) -> Tuple[str, Optional[str]]:
+    """Return (english_text, text_to_translate). English and neutral lines are kept as they are.
+    A non-English line whose verbatim tokens (numbers, Latin names, emoji), at least two of them, all
+    reappear in one English line of similar length is treated as the other half of a bilingual post and
+    dropped; when unsure, the line is translated. Anything left is returned for translation, or the whole
+    input if it contains no English at all; None means no LLM call is needed."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    labelled = [(line, detect_language(line)) for line in lines]
+    english_lines = [line for line, language in labelled if language == "en"]
+    if not english_lines:
+        if any(language == "other" for _, language in labelled):
+            return "", text.strip()
+        return "\n".join(lines), None
+    english_anchors = [(line, _anchors(line)) for line in english_lines]
+
+    kept: List[str] = []
+    untranslated: List[str] = []
+    for line, language in labelled:
+        if language != "other":
+            kept.append(line)
+            continue
+        anchors = _anchors(line)
+        if any(_counterpart(line, anchors, candidate, candidate_anchors) for candidate, candidate_anchors in english_anchors):
+            continue
+        untranslated.append(line)
+    return "\n".join(kept), "\n".join(untranslated) or None
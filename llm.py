@@ -0,0 +1,256 @@
+"""
+llm.py
+Shared async Gemini model layer used by every agent: one model client, a bounded number of in-flight requests per event loop, prompts formatted from the templates in prompts.py, validated structured (JSON) answers, and a pluggable response cache with per-stage TTLs.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import weakref
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.api_core import exceptions as google_exceptions
+
+from cache import CACHE_PATH, ResponseCache
+from metrics import span, inc, cache_lookup
+from ratelimit import LIMITERS, RATE_RETRIES, backoff
+from utils import parse_structured, StructuredOutputError
+
+# Read Gemini API key
+GEMINI_API_KEY = os.environ.get("GOOGLE_API_KEY")
+MODEL = os.environ.get("MODEL")
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8"))
+genai.configure(api_key=GEMINI_API_KEY)
+
+# "sqlite" (shared on-disk cache), "memory" (per-process LRU) or "off"
+LLM_CACHE = os.environ.get("VERYNEWS_LLM_CACHE", "sqlite" if CACHE_PATH else "memory")
+# Seconds a cached answer stays valid per stage; None caches forever, 0 disables caching for the stage.
+# Override with VERYNEWS_LLM_CACHE_TTLS='{"timeliness": 600}'.
+STAGE_CACHE_TTLS: Dict[str, Optional[float]] = {
+    "translate": None,
+    "facts": 7 * 24 * 3600,
+    "fused": 7 * 24 * 3600,
+    "queries": 24 * 3600,
+    "evidence": 6 * 3600,
+    "expert": 6 * 3600,
+    "timeliness": 3600,
+    "judge": 3600,
+    "visualization": 6 * 3600,
+    "report": 6 * 3600,
+}
+STAGE_CACHE_TTLS.update(json.loads(os.environ.get("VERYNEWS_LLM_CACHE_TTLS", "{}")))
+# Most answers either cache backend keeps before evicting
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("VERYNEWS_LLM_CACHE_MAX_ENTRIES", "20000"))
+# Extra model calls allowed per stage when a structured answer fails validation
+JSON_RETRIES = int(os.environ.get("VERYNEWS_LLM_JSON_RETRIES", "1"))
+REPAIR_NOTE = "\nYour previous answer was not valid for the requested format ({error}). Output only the JSON object in the requested format."
+# Quota and overload errors slow the shared Gemini limiter down; all of these are retried with backoff
+THROTTLE_ERRORS = (google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable)
+RETRY_ERRORS = THROTTLE_ERRORS + (google_exceptions.InternalServerError, google_exceptions.DeadlineExceeded)
+# Inputs that change on every run but only matter to the answer at a coarser grain: cache keys use the
+# coarse value, so an answer that reasons about "today" or "recent" is never reused on a later day
+COARSE_INPUTS = {"current_time": lambda value: str(value)[:10]}
+
+def _record_usage(attrs: dict, response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        attrs["prompt_tokens"] = getattr(usage, "prompt_token_count", 0) or 0
+        attrs["completion_tokens"] = getattr(usage, "candidates_token_count", 0) or 0
+
+class MemoryResponseCache:
+    """In-process LRU response cache holding at most `max_entries` answers."""
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (max_age is not None and time.time() - entry[1] >= max_age):
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, text: str, stage: str = ""):
+        with self._lock:
+            self._entries[key] = (text, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+def default_response_cache():
+    if LLM_CACHE == "sqlite" and CACHE_PATH:
+        return ResponseCache(CACHE_PATH, LLM_CACHE_MAX_ENTRIES)
+    if LLM_CACHE == "memory":
+        return MemoryResponseCache(LLM_CACHE_MAX_ENTRIES)
+    return None
+
+def _async_client():
+    return genai_client._client_manager.make_client("generative_async")
+
+class PerLoopModel:
+    """genai.GenerativeModel with one gRPC async client per event loop. The library caches a single
+    process-wide async client, whose channel is bound to the loop that first used it, so calls from a
+    second loop (another asyncio.run, or a caller's loop next to run_sync's) would reuse a foreign or
+    closed channel."""
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._models = weakref.WeakKeyDictionary()
+
+    def _model(self) -> genai.GenerativeModel:
+        loop = asyncio.get_running_loop()
+        model = self._models.get(loop)
+        if model is None:
+            model = self._models[loop] = genai.GenerativeModel(self.model_name)
+            model._async_client = _async_client()
+        return model
+
+    def generate_content_async(self, *args, **kwargs):
+        return self._model().generate_content_async(*args, **kwargs)
+
+class AsyncModel:
+    def __init__(self, model_name: str, max_concurrency: int = GEMINI_MAX_CONCURRENCY, cache=None, stage_ttls: Optional[Dict[str, Optional[float]]] = None):
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.model = PerLoopModel(model_name)
+        self.cache = cache
+        self.stage_ttls = dict(STAGE_CACHE_TTLS, **(stage_ttls or {}))
+        # asyncio primitives are bound to one loop, so keep a semaphore per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def cache_key(self, template: str, stage: str, inputs: dict) -> str:
+        """Model name, stage, template identity and a hash of the formatted inputs (the run time by its date)."""
+        stable = {k: COARSE_INPUTS[k](v) if k in COARSE_INPUTS else v for k, v in inputs.items()}
+        template_id = hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+        inputs_id = hashlib.sha256(json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{stage}:{template_id}:{inputs_id}"
+
+    def _cacheable(self, stage: str, use_cache: bool) -> bool:
+        return use_cache and self.cache is not None and self.stage_ttls.get(stage) != 0
+
+    async def _lookup(self, key: str, stage: str) -> Optional[str]:
+        cached = await asyncio.to_thread(self.cache.get, key, self.stage_ttls.get(stage))
+        cache_lookup("llm", cached is not None)
+        return cached
+
+    async def _retry(self, stage: str, error: Exception, attempt: int):
+        """Back off before retry `attempt` after a rate limit or server error, or re-raise it when the
+        retries are used up."""
+        if isinstance(error, THROTTLE_ERRORS):
+            LIMITERS.get("gemini").throttled()
+        if attempt >= RATE_RETRIES:
+            raise error
+        print(f"Gemini error in {stage}, retrying ({attempt + 1}/{RATE_RETRIES}): {str(error)[:200]}")
+        await asyncio.sleep(backoff(attempt))
+
+    async def _complete(self, prompt: str, stage: str, json_mode: bool = False) -> str:
+        limiter = LIMITERS.get("gemini")
+        for attempt in range(RATE_RETRIES + 1):
+            await limiter.acquire()
+            try:
+                async with self._semaphore():
+                    with span("llm", stage) as attrs:
+                        response = await self.model.generate_content_async(
+                            prompt, generation_config={"response_mime_type": "application/json"} if json_mode else None)
+                        _record_usage(attrs, response)
+            except RETRY_ERRORS as e:
+                await self._retry(stage, e, attempt)
+                continue
+            limiter.succeeded()
+            return response.text
+
+    async def generate(self, template: str, stage: str, use_cache: bool = True, json_mode: bool = False, **inputs) -> str:
+        """Format `template` with `inputs` and return the model's text answer for pipeline stage `stage`.
+        `json_mode` asks Gemini for a bare JSON answer (response_mime_type application/json)."""
+        cacheable = self._cacheable(stage, use_cache)
+        if cacheable:
+            key = self.cache_key(template, stage, inputs) + (":json" if json_mode else "")
+            cached = await self._lookup(key, stage)
+            if cached is not None:
+                return cached
+        text = await self._complete(template.format(**inputs), stage, json_mode)
+        if cacheable:
+            await asyncio.to_thread(self.cache.put, key, text, stage)
+        return text
+
+    async def stream(self, template: str, stage: str, use_cache: bool = True, **inputs) -> AsyncIterator[str]:
+        """Like `generate`, but yield the answer in chunks as the model produces them. A cached answer is
+        yielded as one chunk; a completed stream is cached like a `generate` answer."""
+        cacheable = self._cacheable(stage, use_cache)
+        if cacheable:
+            key = self.cache_key(template, stage, inputs)
+            cached = await self._lookup(key, stage)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        limiter = LIMITERS.get("gemini")
+        for attempt in range(RATE_RETRIES + 1):
+            await limiter.acquire()
+            try:
+                async with self._semaphore():
+                    with span("llm", stage) as attrs:
+                        response = await self.model.generate_content_async(template.format(**inputs), stream=True)
+                        chunk = None
+                        async for chunk in response:
+                            chunks.append(chunk.text)
+                            yield chunk.text
+                        # The final chunk carries the usage totals of the whole stream
+                        _record_usage(attrs, chunk)
+            except RETRY_ERRORS as e:
+                # Text already yielded cannot be taken back, so only a stream that failed before its first chunk is retried
+                if chunks:
+                    raise
+                await self._retry(stage, e, attempt)
+                continue
+            limiter.succeeded()
+            break
+        if cacheable:
+            await asyncio.to_thread(self.cache.put, key, "".join(chunks), stage)
+
+    async def generate_json(self, template: str, stage: str, schema, use_cache: bool = True, retries: int = JSON_RETRIES, **inputs):
+        """Like `generate` in JSON mode, but return the answer validated as the pydantic model `schema`.
+        Answers are repaired locally first (see utils.parse_structured); if that fails, only this stage
+        is asked again, with the validation error appended, up to `retries` times. Only validated answers
+        are cached. Raises StructuredOutputError when every attempt fails."""
+        cacheable = self._cacheable(stage, use_cache)
+        if cacheable:
+            key = self.cache_key(template, stage, inputs) + ":json"
+            cached = await self._lookup(key, stage)
+            if cached is not None:
+                try:
+                    return parse_structured(cached, schema)
+                except StructuredOutputError:
+                    pass
+        prompt = template.format(**inputs)
+        error = None
+        for attempt in range(retries + 1):
+            if error is not None:
+                print(f"Invalid {stage} answer, retrying ({attempt}/{retries}): {str(error)[:200]}")
+                inc("verynews_llm_retries_total", name=stage)
+            text = await self._complete(prompt if error is None else prompt + REPAIR_NOTE.format(error=str(error)[:500]), stage, True)
+            try:
+                result = parse_structured(text, schema)
+            except StructuredOutputError as e:
+                error = e
+                continue
+            if cacheable:
+                await asyncio.to_thread(self.cache.put, key, text, stage)
+            return result
+        raise error
+
+# Shared client for all agents. The async transport of each event loop is created on first use and
+# reused by every later call made from that loop (see PerLoopModel and utils.run_sync).
+llm = AsyncModel(MODEL, cache=default_response_cache())
@@ -0,0 +1,143 @@
+"""
+metrics.py
+Built-in, offline metrics. Every pipeline stage, model call, search, page fetch and extraction is
+recorded twice: as a span in the trace of the run it belongs to (a context variable, so concurrent
+runs keep separate traces), and in process-wide counters and latency histograms that can be exported
+in Prometheus text format.
+"""
+import math
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+def _labels(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}" if labels else ""
+
+class Registry:
+    """Process-wide counters and histograms, safe to update from worker threads."""
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, list]] = {}
+
+    def inc(self, metric: str, value: float = 1.0, **labels):
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, metric: str, value: float, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            # [per-bucket counts, sum, count]
+            entry = series.setdefault(_labels(labels), [[0] * len(self.buckets), 0.0, 0])
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                             for name, series in self._counters.items()},
+                "histograms": {name: [{"labels": dict(k), "count": e[2], "sum": e[1]} for k, e in series.items()]
+                               for name, series in self._histograms.items()},
+            }
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{_format_labels(k)} {v:g}" for k, v in series.items())
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for k, (counts, total, count) in series.items():
+                    cumulative = 0
+                    for bound, n in zip(self.buckets, counts):
+                        cumulative += n
+                        le = "+Inf" if bound == math.inf else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(k + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(k)} {total:g}")
+                    lines.append(f"{name}_count{_format_labels(k)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+REGISTRY = Registry()
+
+class Trace:
+    """Spans and counter totals of one run; timestamps are seconds from the start of the trace."""
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.totals = Counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"spans": list(self.spans), "totals": dict(self.totals)}
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("verynews_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+@contextmanager
+def trace(existing: Optional[Trace] = None) -> Iterator[Trace]:
+    """Collect the spans of the code in this block, and of the tasks it starts, into one Trace."""
+    run_trace = existing or Trace()
+    token = _trace.set(run_trace)
+    try:
+        yield run_trace
+    finally:
+        _trace.reset(token)
+
+def inc(metric: str, value: float = 1.0, **labels):
+    REGISTRY.inc(metric, value, **labels)
+    run_trace = _trace.get()
+    if run_trace is not None:
+        run_trace.totals[metric + _format_labels(_labels(labels))] += value
+
+@contextmanager
+def span(kind: str, name: str, **attrs) -> Iterator[Dict[str, Any]]:
+    """Time a unit of work. The yielded dict collects attributes for the span; integer attributes
+    (tokens, bytes, retries, ...) are also added to `verynews_<kind>_<attribute>_total` counters.
+    The duration goes to the `verynews_<kind>_seconds` histogram."""
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        REGISTRY.observe(f"verynews_{kind}_seconds", duration, name=name)
+        for key, value in attrs.items():
+            if isinstance(value, int) and not isinstance(value, bool):
+                inc(f"verynews_{kind}_{key}_total", value, name=name)
+        if "error" in attrs:
+            inc(f"verynews_{kind}_errors_total", name=name)
+        run_trace = _trace.get()
+        if run_trace is not None:
+            run_trace.spans.append({"kind": kind, "name": name, "start": round(start - run_trace.origin, 4),
+                                    "duration": round(duration, 4), **attrs})
+
+def cache_lookup(cache: str, hit: bool):
+    inc("verynews_cache_requests_total", cache=cache, result="hit" if hit else "miss")
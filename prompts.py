@@ -58,12 +58,35 @@ Output format:
 ]
 """
 
+PROMPT_FUSED_EXTRACTION = """
+You are a news analysis agent. In one pass, translate the news content, extract its 5W1H elements, and generate Google search queries to verify it.
+News content: {news_content}
+Current research time: {current_time}
+1. news_en: accurately and fluently translate the news content into English (copy it unchanged if it is already English). If the content repeats the same message in several languages, translate it once.
+2. facts: use the 5W1H method on the English text. For each element (Who, What, When, Where, Why, How):
+- If the information is explicitly provided, extract it directly.
+- If not explicitly provided, try to infer it from the context.
+- If you cannot infer, use a reasonable default:
+    - For 'When', if no time is given and cannot be inferred, you must output 'Current research time within the past month'. Never use the current time or a guessed specific date.
+    - For other elements, use 'unknown' or 'cannot be determined'.
+- For any inferred or defaulted value, clearly indicate in the value that it is inferred or defaulted.
+3. queries: 3 to 5 concise Google search queries that would find authoritative reports confirming or refuting the news.
+Output only JSON in this format:
+{{
+  "news_en": "...",
+  "facts": {{"who": "...", "what": "...", "when": "...", "where": "...", "why": "...", "how": "..."}},
+  "queries": [{{"search_query": "..."}}, ...]
+}}
+"""
+
 PROMPT_EVIDENCE_AGGREGATION = """
 You are an evidence aggregation agent. Please deduplicate, summarize, and aggregate the following search results to form a chain of facts, highlighting key evidence and contradictions.
+News content: {news_content}
 Search results: {search_results}
 Current research time: {current_time}
+Also state whether the evidence, taken together, confirms or refutes the news ("stance": "confirmed", "refuted", "mixed" or "insufficient"), how confident you are (0 to 1), and the URLs of the sources that directly support that stance.
 Output format:
-{{"key_evidence": ["..."], "contradictions": ["..."], "summary": "..."}}
+{{"key_evidence": ["..."], "contradictions": ["..."], "summary": "...", "stance": "confirmed/refuted/mixed/insufficient", "confidence": 0.0, "sources": ["..."]}}
 """
 
 PROMPT_EXPERT_ANALYSIS = """
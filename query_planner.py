@@ -0,0 +1,55 @@
+"""
+query_planner.py
+Query planning for the trusted-site search. Google ignores everything past the 32nd word of a query and
+rejects overlong requests, so one "site:a OR site:b OR ..." suffix with a long trusted-site list silently
+drops sites. The planner splits the site list into shards that fit those limits, one sub-query per shard;
+the shard results are merged with reciprocal-rank fusion and deduplicated by URL.
+"""
+import os
+from typing import Dict, List, Sequence
+from urllib.parse import quote_plus
+
+from cache import normalize_url
+
+MAX_QUERY_WORDS = int(os.environ.get("VERYNEWS_MAX_QUERY_WORDS", "32"))
+# Budget for the URL-encoded q parameter, leaving room for the rest of the request URL within 2048 characters
+MAX_QUERY_CHARS = int(os.environ.get("VERYNEWS_MAX_QUERY_CHARS", "1800"))
+RRF_K = 60
+
+def site_filter(sites: Sequence[str]) -> str:
+    return " OR ".join(f"site:{site}" for site in sites)
+
+def _fits(query: str, max_words: int, max_chars: int) -> bool:
+    return len(query.split()) <= max_words and len(quote_plus(query)) <= max_chars
+
+def plan_queries(query: str, sites: Sequence[str], max_words: int = MAX_QUERY_WORDS, max_chars: int = MAX_QUERY_CHARS) -> List[str]:
+    """Sub-queries covering every site in `sites`: the query followed by as many site: filters as fit
+    the limits. A query too long to leave room for one site filter is shortened first."""
+    if not sites:
+        return [query]
+    words = query.split()
+    while len(words) > 1 and not _fits(f"{' '.join(words)} site:{max(sites, key=len)}", max_words, max_chars):
+        words.pop()
+    query = " ".join(words)
+    shards, current = [], []
+    for site in sites:
+        if current and not _fits(f"{query} {site_filter(current + [site])}", max_words, max_chars):
+            shards.append(current)
+            current = []
+        current.append(site)
+    shards.append(current)
+    return [f"{query} {site_filter(shard)}" for shard in shards]
+
+def merge_results(result_lists: Sequence[List[Dict]], limit: int, k: int = RRF_K) -> List[Dict]:
+    """Reciprocal-rank fusion of ranked result lists: a result scores 1 / (k + rank) in every list it
+    appears in, and results with the same normalized URL are merged. Ties keep the order of the lists,
+    so the top result of each shard comes before any shard's second result."""
+    scores: Dict[str, float] = {}
+    merged: Dict[str, Dict] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            key = normalize_url(result["url"])
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            merged.setdefault(key, result)
+    ranked = sorted(merged, key=lambda key: scores[key], reverse=True)
+    return [dict(merged[key], score=round(scores[key], 5)) for key in ranked[:limit]]
@@ -0,0 +1,211 @@
+"""
+ratelimit.py
+Shared rate control for every upstream the pipeline calls: Google Custom Search, Google scraping, Gemini and
+each fetched host. Every upstream has a token bucket sized by its quota whose rate adapts AIMD-style (halved
+on 429/503, raised step by step while requests succeed), Retry-After pauses, jittered exponential backoff for
+retries, and hedged requests for slow page fetches.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from metrics import REGISTRY, inc
+
+T = TypeVar("T")
+
+# Requests per second and burst size per upstream. "host" applies to every fetched host without an entry
+# of its own (e.g. "www.reuters.com"). Override with VERYNEWS_RATE_LIMITS='{"cse": {"rate": 10, "burst": 10}}'.
+RATE_LIMITS: Dict[str, Dict[str, float]] = {
+    # Custom Search allows 100 queries per minute per user
+    "cse": {"rate": 1.6, "burst": 5},
+    "scrape": {"rate": 0.5, "burst": 1},
+    "gemini": {"rate": 10, "burst": 20},
+    "host": {"rate": 5, "burst": 10},
+}
+for _name, _limits in json.loads(os.environ.get("VERYNEWS_RATE_LIMITS", "{}")).items():
+    RATE_LIMITS[_name] = dict(RATE_LIMITS.get(_name, RATE_LIMITS["host"]), **_limits)
+# Retries after a throttled or failed request (429, 5xx, timeouts)
+RATE_RETRIES = int(os.environ.get("VERYNEWS_RATE_RETRIES", "3"))
+BACKOFF_BASE = float(os.environ.get("VERYNEWS_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.environ.get("VERYNEWS_BACKOFF_MAX", "30"))
+# A page fetch still running after this many seconds gets a second, hedged request (0 disables hedging).
+# Once enough fetches have been timed, the delay follows their 90th percentile instead.
+HEDGE_AFTER = float(os.environ.get("VERYNEWS_HEDGE_AFTER", "3"))
+
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header: delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class Limiter:
+    """Token bucket for one upstream. Callers reserve a token and wait for it, so waiting requests are
+    served in order at the current rate. `throttled` halves the rate (at most once per second) and pauses
+    the bucket for Retry-After; `succeeded` adds 5% of the quota back. Thread-safe, and not bound to an
+    event loop, so runs on different loops (e.g. run_sync threads) share the bucket."""
+    def __init__(self, name: str, rate: float, burst: float = 1, min_rate: Optional[float] = None):
+        self.name = name
+        self.max_rate = self.rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate is not None else self.max_rate / 20
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate, self._blocked_until - now)
+        if wait > 0:
+            REGISTRY.observe("verynews_ratelimit_wait_seconds", wait, name=self.name)
+        return wait
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttled(self, delay: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= 1.0:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._last_decrease = now
+            if delay:
+                self._blocked_until = max(self._blocked_until, now + delay)
+        inc("verynews_ratelimit_throttled_total", upstream=self.name)
+        print(f"Rate limited by {self.name}, slowing down to {self.rate:.2f} req/s"
+              + (f" and pausing {delay:.1f}s" if delay else ""))
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def observe(self, status: int, headers=None) -> bool:
+        """Adjust the rate from a response status; True if the request should be retried."""
+        if status in THROTTLE_STATUSES:
+            self.throttled(retry_after(headers.get("Retry-After")) if headers is not None else None)
+        elif status < 400:
+            self.succeeded()
+        return status in RETRY_STATUSES
+
+class Limiters:
+    """The process-wide limiters, created on first use from RATE_LIMITS."""
+    def __init__(self, limits: Dict[str, Dict[str, float]] = RATE_LIMITS):
+        self.limits = limits
+        self._limiters: Dict[str, Limiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Limiter:
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(name)
+                if limiter is None:
+                    limiter = self._limiters[name] = Limiter(name, **self.limits.get(name, self.limits["host"]))
+        return limiter
+
+    def host(self, host: str) -> Limiter:
+        host = (host or "").lower()
+        return self.get(host if host in self.limits else f"host:{host}")
+
+    @contextmanager
+    def overridden(self, limits: Dict[str, Dict[str, float]]):
+        """Use fresh buckets sized by `limits` until the block exits, e.g. to benchmark offline runs
+        without waiting on real quotas."""
+        with self._lock:
+            saved = self.limits, self._limiters
+            self.limits, self._limiters = limits, {}
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.limits, self._limiters = saved
+
+LIMITERS = Limiters()
+
+class HedgePolicy:
+    """When to send a hedged copy of a slow request: after the 90th percentile of recent latencies,
+    or `default` seconds until `min_samples` requests have been timed."""
+    def __init__(self, default: float = HEDGE_AFTER, quantile: float = 0.9, min_delay: float = 0.5,
+                 min_samples: int = 20, window: int = 200):
+        self.default = default
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        if not self.default:
+            return None
+        if len(self._latencies) < self.min_samples:
+            return self.default
+        ordered = sorted(self._latencies)
+        return max(self.min_delay, ordered[int(self.quantile * (len(ordered) - 1))])
+
+FETCH_HEDGE = HedgePolicy()
+
+async def hedged(request: Callable[[], Awaitable[T]], delay: Optional[float], attrs: Optional[dict] = None,
+                 discard: Optional[Callable[[T], Awaitable]] = None) -> T:
+    """Await `request()`; if it has not finished after `delay` seconds, start a second copy and return
+    whichever finishes first, cancelling the other. A copy that fails leaves the race to the other one,
+    and one that also finished but lost is passed to `discard`. Sets attrs["hedged"] when the second
+    copy was started."""
+    if delay is None:
+        return await request()
+    tasks = {asyncio.ensure_future(request())}
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            if attrs is not None:
+                attrs["hedged"] = 1
+            tasks.add(asyncio.ensure_future(request()))
+        error = None
+        pending = tasks
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        if discard is not None:
+            for task in tasks:
+                if task is not winner and task.done() and not task.cancelled() and task.exception() is None:
+                    await discard(task.result())
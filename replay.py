@@ -0,0 +1,283 @@
+"""
+replay.py
+Record/replay layer for offline, reproducible runs. The Gemini model behind `llm.llm` and the pooled HTTP
+client (which also carries the scraped Google result pages) are swapped for stand-ins that either record
+live traffic to a fixtures file, replay it without network access, or answer synthetically with well-formed responses.
+Every replayed call can be delayed by an injected latency, so benchmarks still see realistic overlap.
+"""
+import re
+import json
+import base64
+import random
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urlencode, urlsplit
+
+from multidict import CIMultiDict
+
+import prompts
+from http_client import HttpClient, HttpResponse
+
+MODES = ("record", "replay", "synthetic")
+# Per-run values that are formatted into prompts; they are masked in fixture keys
+_VOLATILE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d+)?Z?")
+# Query parameters that identify the caller rather than the request
+_SECRET_PARAMS = ("key", "cx")
+
+class FixtureMissing(LookupError):
+    """Replay mode met a request that was not recorded."""
+
+@dataclass
+class Latency:
+    """Injected delay per call: `base` seconds, plus up to `jitter` seconds, plus `per_1k_tokens` seconds
+    per thousand generated tokens for model calls. Jitter is drawn from a seeded generator."""
+    base: float = 0.0
+    jitter: float = 0.0
+    per_1k_tokens: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    def delay(self, tokens: int = 0) -> float:
+        return self.base + self._rng.random() * self.jitter + self.per_1k_tokens * tokens / 1000
+
+    async def wait(self, tokens: int = 0):
+        delay = self.delay(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class Fixtures:
+    """Recorded model answers and HTTP responses, stored as one JSON file."""
+    def __init__(self, llm: Optional[Dict[str, Any]] = None, http: Optional[Dict[str, Any]] = None):
+        self.llm = llm or {}
+        self.http = http or {}
+
+    @classmethod
+    def load(cls, path: str) -> "Fixtures":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("llm"), data.get("http"))
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"llm": self.llm, "http": self.http}, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def prompt_key(prompt: str, json_mode: bool) -> str:
+    normalized = _VOLATILE.sub("<time>", prompt)
+    return hashlib.sha256(f"{json_mode}:{normalized}".encode("utf-8")).hexdigest()
+
+def request_key(url: str, params: Optional[dict] = None) -> str:
+    query = sorted((k, str(v)) for k, v in (params or {}).items() if k not in _SECRET_PARAMS)
+    return f"GET {url}" + (f"?{urlencode(query)}" if query else "")
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+# ---------- Synthetic answers ----------
+
+def _template_stage(prompt: str) -> str:
+    # Every prompt template starts with a fixed instruction line, which identifies the stage
+    for stage, name in (("translate", "PROMPT_TRANSLATE_TO_EN"), ("facts", "PROMPT_5W1H"), ("queries", "PROMPT_FACT_CHECK"),
+                        ("fused", "PROMPT_FUSED_EXTRACTION"), ("evidence", "PROMPT_EVIDENCE_AGGREGATION"),
+                        ("expert", "PROMPT_EXPERT_ANALYSIS"), ("timeliness", "PROMPT_TIMELINESS"),
+                        ("judge", "PROMPT_JUDGEMENT"), ("visualization", "PROMPT_VISUALIZATION"), ("report", "PROMPT_REPORT_EXPERT")):
+        first_line = getattr(prompts, name).strip().splitlines()[0].replace("\r", "")
+        if prompt.strip().replace("\r", "").startswith(first_line):
+            return stage
+    return "unknown"
+
+def synthetic_answer(prompt: str) -> str:
+    """A well-formed answer for the stage whose template produced `prompt`, of a realistic length."""
+    stage = _template_stage(prompt)
+    digest = hashlib.sha256(_VOLATILE.sub("<time>", prompt).encode("utf-8")).hexdigest()[:8]
+    facts = {"who": "Officials (explicit)", "what": f"Reported event {digest} (explicit)",
+             "when": "Current research time within the past month (defaulted)", "where": "unknown",
+             "why": "cannot be determined", "how": "unknown"}
+    queries = [f"event {digest} official statement", f"event {digest} fact check", f"event {digest} news report"]
+    if stage == "translate":
+        return f"Synthetic English translation of claim {digest}."
+    if stage == "facts":
+        return json.dumps(facts)
+    if stage == "queries":
+        return json.dumps([{"query": q} for q in queries])
+    if stage == "fused":
+        return json.dumps({"news_en": f"Synthetic English translation of claim {digest}.", "facts": facts,
+                           "queries": [{"search_query": q} for q in queries]})
+    if stage == "evidence":
+        return json.dumps({"key_evidence": [f"Source {i} reports on event {digest}." for i in range(5)],
+                           "contradictions": ["Sources disagree on the date."], "summary": "Mixed evidence. " * 20,
+                           "stance": "mixed", "confidence": 0.5, "sources": []})
+    if stage == "expert":
+        return json.dumps({"analysis": "The claim is partly supported. " * 30, "controversy": ["Date", "Scale"], "credibility": "Medium"})
+    if stage == "timeliness":
+        return json.dumps({"timeline": [{"date": "2025-05-30", "event": f"Event {digest} reported."}], "latest_updates": ["No further updates."]})
+    if stage == "judge":
+        return json.dumps({"result": "Partially True", "reason": "Only part of the claim is supported. " * 5, "sources": [], "timestamp": ""})
+    if stage == "visualization":
+        return "| Date | Event |\n|---|---|\n" + "\n".join(f"| 2025-05-{i:02d} | Event {digest} step {i} |" for i in range(1, 21))
+    return "# Report\n\n" + "\n\n".join(f"## Section {i}\n" + "Synthetic report text. " * 40 for i in range(8))
+
+def _synthetic_hosts(query: str) -> List[str]:
+    """Result hosts for a query: its site: filters, like a real search restricted to the trusted sites."""
+    sites = [t[len("site:"):].split("/")[0] for t in query.split() if t.startswith("site:")]
+    return sites or [f"news{i}.example" for i in range(5)]
+
+def _synthetic_search(params: dict) -> bytes:
+    query = str(params.get("q", ""))
+    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()[:8]
+    num = int(params.get("num", 10))
+    hosts = _synthetic_hosts(query)
+    # Titles repeat the query terms so the articles can be found again in the evidence index
+    topic = " ".join(t for t in query.split() if not t.startswith("site:") and t != "OR")
+    items = [{"title": f"{topic} - Report {digest}-{i}", "link": f"https://{hosts[(i + int(digest, 16)) % len(hosts)]}/{digest}/{i}",
+              "snippet": f"Snippet for {params.get('q', '')} result {i}."} for i in range(num)]
+    return json.dumps({"items": items}).encode("utf-8")
+
+def _synthetic_article(url: str) -> bytes:
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:8]
+    paragraphs = "".join(f"<p>Paragraph {i} of article {digest}: officials said the reported event was reviewed "
+                         f"and described the circumstances in detail for the public record.</p>" for i in range(150))
+    return (f"<html><head><title>Article {digest}</title><script>var a = 1;</script></head><body>"
+            f"<nav>Home | World | Politics</nav><article><h1>Article {digest}</h1>{paragraphs}</article>"
+            f"<footer>Copyright</footer></body></html>").encode("utf-8")
+
+def _synthetic_serp(params: dict) -> bytes:
+    query = str(params.get("q", ""))
+    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()[:8]
+    hosts = _synthetic_hosts(query)
+    blocks = "".join(f'<div class="ezO2md"><a href="/url?q=https://{hosts[(i + int(digest, 16)) % len(hosts)]}/{digest}/{i}&sa=U">'
+                     f'<span class="CVA68e">Report {digest}-{i}</span></a><span class="FrIlee">Snippet {i}.</span></div>'
+                     for i in range(int(params.get("num", 7))))
+    return f"<html><body>{blocks}</body></html>".encode("utf-8")
+
+def synthetic_response(url: str, params: Optional[dict] = None) -> Dict[str, Any]:
+    params = params or {}
+    if "customsearch" in url:
+        return {"status": 200, "headers": {"Content-Type": "application/json; charset=UTF-8"}, "body": _synthetic_search(params)}
+    if urlsplit(url).hostname == "www.google.com":
+        return {"status": 200, "headers": {"Content-Type": "text/html; charset=UTF-8"}, "body": _synthetic_serp(params)}
+    return {"status": 200, "headers": {"Content-Type": "text/html; charset=UTF-8"}, "body": _synthetic_article(url)}
+
+# ---------- Model ----------
+
+class _Chunk(SimpleNamespace):
+    pass
+
+def _response(text: str, prompt_tokens: int, completion_tokens: int) -> _Chunk:
+    return _Chunk(text=text, usage_metadata=SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=completion_tokens))
+
+class ReplayModel:
+    """Stand-in for genai.GenerativeModel implementing the generate_content_async calls made by llm.AsyncModel."""
+    def __init__(self, fixtures: Fixtures, mode: str = "replay", model=None, latency: Optional[Latency] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown replay mode '{mode}'")
+        if mode == "record" and model is None:
+            raise ValueError("Record mode needs the real model to record from")
+        self.fixtures = fixtures
+        self.mode = mode
+        self.model = model
+        self.latency = latency or Latency()
+
+    async def _answer(self, prompt: str, json_mode: bool) -> Dict[str, Any]:
+        key = prompt_key(prompt, json_mode)
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = await self.model.generate_content_async(
+                prompt, generation_config={"response_mime_type": "application/json"} if json_mode else None)
+            usage = getattr(response, "usage_metadata", None)
+            entry = self.fixtures.llm[key] = {
+                "text": response.text,
+                "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+                "completion_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+                "latency": round(time.perf_counter() - start, 3),
+            }
+            return entry
+        if self.mode == "synthetic":
+            text = synthetic_answer(prompt)
+            entry = {"text": text, "prompt_tokens": _estimate_tokens(prompt), "completion_tokens": _estimate_tokens(text)}
+        else:
+            entry = self.fixtures.llm.get(key)
+            if entry is None:
+                raise FixtureMissing(f"No recorded model answer for prompt {prompt.strip()[:80]!r}")
+        await self.latency.wait(entry["completion_tokens"])
+        return entry
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[dict] = None, stream: bool = False):
+        json_mode = bool(generation_config and generation_config.get("response_mime_type") == "application/json")
+        entry = await self._answer(prompt, json_mode)
+        if not stream:
+            return _response(entry["text"], entry["prompt_tokens"], entry["completion_tokens"])
+        return self._stream(entry)
+
+    async def _stream(self, entry: Dict[str, Any], size: int = 200) -> AsyncIterator[_Chunk]:
+        text = entry["text"]
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            yield _response(piece, entry["prompt_tokens"] if last else 0, entry["completion_tokens"] if last else 0)
+            await asyncio.sleep(0)
+
+# ---------- HTTP ----------
+
+def _encode(status: int, headers, body: bytes) -> Dict[str, Any]:
+    kept = {k: v for k, v in headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+    return {"status": status, "headers": kept, "body": base64.b64encode(body).decode("ascii")}
+
+def _replayed(url: str, entry: Dict[str, Any]) -> HttpResponse:
+    body = entry["body"] if isinstance(entry["body"], bytes) else base64.b64decode(entry["body"])
+
+    async def chunks(size: int):
+        for i in range(0, len(body), size):
+            yield body[i:i + size]
+
+    async def read_all():
+        return body
+
+    return HttpResponse(url, entry["status"], CIMultiDict(entry["headers"]), chunks, read_all)
+
+class ReplayHttpClient(HttpClient):
+    """HttpClient that records responses to, or serves them from, `fixtures`."""
+    def __init__(self, fixtures: Fixtures, mode: str = "replay", latency: Optional[Latency] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures = fixtures
+        self.mode = mode
+        self.latency = latency or Latency()
+
+    @asynccontextmanager
+    async def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                  timeout: float = 30, verify_ssl: bool = True) -> AsyncIterator[HttpResponse]:
+        key = request_key(url, params)
+        if self.mode == "record":
+            async with super().get(url, params=params, headers=headers, timeout=timeout, verify_ssl=verify_ssl) as response:
+                entry = self.fixtures.http[key] = _encode(response.status, response.headers, await response.read())
+        elif self.mode == "synthetic":
+            entry = synthetic_response(url, params)
+            await self.latency.wait()
+        else:
+            entry = self.fixtures.http.get(key)
+            if entry is None:
+                raise FixtureMissing(f"No recorded response for {key}")
+            await self.latency.wait()
+        yield _replayed(url, entry)
+
+def install(fixtures: Fixtures, mode: str, latency: Optional[Latency] = None):
+    """Route the shared model client through a ReplayModel. The response cache is switched off so every
+    run reaches the (replayed) model."""
+    from llm import llm
+    llm.model = ReplayModel(fixtures, mode, model=llm.model if mode == "record" else None, latency=latency)
+    llm.cache = None
+
+def search_context(fixtures: Fixtures, mode: str, latency: Optional[Latency] = None, search_mode: str = "web", evidence_index=None):
+    """A SearchContext whose HTTP client (also used by the scraping backend) records or replays, without persistent caches.
+    Only the given `evidence_index` (e.g. an in-memory one shared by the benchmark runs) is used."""
+    from utils import SearchContext
+    context = SearchContext(http=ReplayHttpClient(fixtures, mode, latency), search_mode=search_mode)
+    context.page_cache = context.search_cache = context.extraction_cache = None
+    context.evidence_index = evidence_index
+    return context
@@ -0,0 +1,109 @@
+"""
+run_store.py
+Persistent store of finished runs. Each run keeps its claim, config and the intermediate values of every
+stage (facts, queries, the content hash of every source, evidence, analysis, timeline, verdict and
+report), so a developing story can be re-checked with `reverify`: only the searches run again, and the
+rest of the pipeline only reruns when the fetched sources differ from the stored ones.
+"""
+import os
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from cache import CACHE_PATH, SQLiteStore, content_hash, normalize_url
+from evidence import _usable_content
+
+RUN_STORE = os.environ.get("VERYNEWS_RUN_STORE", "1") != "0"
+RUN_STORE_PATH = os.environ.get("VERYNEWS_RUN_STORE_PATH", CACHE_PATH)
+# Runs neither created nor re-checked for this many seconds are dropped
+RUN_STORE_MAX_AGE = float(os.environ.get("VERYNEWS_RUN_STORE_MAX_AGE", 30 * 24 * 3600))
+
+def source_hashes(search_responses: List[dict]) -> Dict[str, Optional[str]]:
+    """Content hash of the fetched text of every search result, by normalized URL; None when the fetch
+    failed and left a placeholder ("[HTTP error: 503]") instead of page text."""
+    hashes = {}
+    for response in search_responses:
+        for result in response["results"]:
+            text = _usable_content(result.get("raw_content"))
+            hashes[normalize_url(result["url"])] = content_hash(text) if text else None
+    return hashes
+
+@dataclass
+class SourceDiff:
+    """Sources (normalized URLs) found only by the new search, only by the stored one, or with new text."""
+    added: List[str]
+    removed: List[str]
+    modified: List[str]
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+    def info(self) -> Dict[str, Any]:
+        return {"changed": self.changed, "added": self.added, "removed": self.removed, "modified": self.modified}
+
+def diff_sources(old: Dict[str, Optional[str]], new: Dict[str, Optional[str]]) -> SourceDiff:
+    """Only fetched text counts: a source whose fetch fails this time is neither removed nor modified,
+    so a transient failure does not rerun the pipeline, while one fetched for the first time is added."""
+    old = {url: digest for url, digest in old.items() if digest}
+    failed = {url for url, digest in new.items() if not digest}
+    new = {url: digest for url, digest in new.items() if digest}
+    return SourceDiff(sorted(new.keys() - old.keys()), sorted(old.keys() - new.keys() - failed),
+                      sorted(url for url in new.keys() & old.keys() if new[url] != old[url]))
+
+@dataclass
+class StoredRun:
+    id: str
+    news_content: str
+    config: Dict[str, Any]
+    state: Dict[str, Any]
+    early_exit: bool
+    parent_id: Optional[str]
+    created_at: float
+    checked_at: float
+
+class RunStore(SQLiteStore):
+    """Finished runs by id. A run re-checked with changed evidence is stored as a new run whose
+    `parent_id` is the run it was re-checked from."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        id TEXT PRIMARY KEY, parent_id TEXT, news_content TEXT NOT NULL, config TEXT NOT NULL, state TEXT NOT NULL,
+        early_exit INTEGER NOT NULL, created_at REAL NOT NULL, checked_at REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS runs_checked_at ON runs (checked_at);
+    """
+
+    def __init__(self, path: str = RUN_STORE_PATH, max_age: float = RUN_STORE_MAX_AGE):
+        super().__init__(path)
+        self.max_age = max_age
+
+    def put(self, news_content: str, config: Dict[str, Any], state: Dict[str, Any], early_exit: bool = False,
+            parent_id: Optional[str] = None) -> str:
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (run_id, parent_id, news_content, json.dumps(config, default=str),
+                          json.dumps(state, ensure_ascii=False, default=str), int(early_exit), now, now))
+            conn.execute("DELETE FROM runs WHERE checked_at < ?", (now - self.max_age,))
+        return run_id
+
+    def get(self, run_id: str) -> Optional[StoredRun]:
+        rows = self._execute("SELECT id, news_content, config, state, early_exit, parent_id, created_at, checked_at FROM runs WHERE id = ?", (run_id,))
+        if not rows:
+            return None
+        run_id, news_content, config, state, early_exit, parent_id, created_at, checked_at = rows[0]
+        return StoredRun(run_id, news_content, json.loads(config), json.loads(state), bool(early_exit), parent_id, created_at, checked_at)
+
+    def checked(self, run_id: str):
+        """Record a re-check that found the evidence unchanged."""
+        self._execute("UPDATE runs SET checked_at = ? WHERE id = ?", (time.time(), run_id))
+
+_run_store = None
+
+def default_run_store() -> Optional[RunStore]:
+    global _run_store
+    if _run_store is None and RUN_STORE and RUN_STORE_PATH:
+        _run_store = RunStore(RUN_STORE_PATH)
+    return _run_store
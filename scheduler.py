@@ -0,0 +1,128 @@
+"""
+scheduler.py
+Dependency-graph scheduler for the multi-agent pipeline. Each stage declares the values it reads and the values it produces; stages whose inputs are ready run concurrently on the event loop.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from events import StageCompleted, emit
+from metrics import span
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        if not self.outputs:
+            self.outputs = (self.name,)
+
+def _producers(stages: List[Stage]) -> Dict[str, Stage]:
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"Value '{output}' is produced by both '{producers[output].name}' and '{stage.name}'")
+            producers[output] = stage
+    return producers
+
+async def _run_stage(stage: Stage, values: Dict[str, Any]):
+    args = [values[name] for name in stage.inputs]
+    with span("stage", stage.name):
+        if asyncio.iscoroutinefunction(stage.func):
+            return await stage.func(*args)
+        # Blocking agents run in a worker thread so independent stages still overlap
+        return await asyncio.to_thread(stage.func, *args)
+
+def _needed(stages: List[Stage], values: Dict[str, Any], targets: Optional[Iterable[str]]) -> List[Stage]:
+    # Stages whose outputs are all present already ran (e.g. in an earlier, partial run) and are skipped.
+    # With targets, only the stages the targets transitively depend on are kept.
+    missing = [s for s in stages if not all(name in values for name in s.outputs)]
+    if targets is None:
+        return missing
+    producers = {name: stage for stage in missing for name in stage.outputs}
+    needed, wanted = set(), [name for name in targets if name not in values]
+    while wanted:
+        name = wanted.pop()
+        stage = producers.get(name)
+        if stage is None:
+            raise ValueError(f"No stage produces target '{name}'")
+        if stage.name not in needed:
+            needed.add(stage.name)
+            wanted.extend(n for n in stage.inputs if n not in values)
+    return [s for s in missing if s.name in needed]
+
+def downstream(stages: List[Stage], names: Iterable[str]) -> List[Stage]:
+    """The named stages and every stage that depends on their outputs, directly or transitively."""
+    affected = set(names)
+    while True:
+        produced = {name for s in stages if s.name in affected for name in s.outputs}
+        grown = {s.name for s in stages if produced.intersection(s.inputs)} - affected
+        if not grown:
+            return [s for s in stages if s.name in affected]
+        affected |= grown
+
+async def run_stages(stages: List[Stage], values: Dict[str, Any], targets: Optional[Iterable[str]] = None,
+                     origin: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, Dict[str, float]]]:
+    """Run every stage once its inputs are available. Returns (values, timings), timings in seconds from the start of the run
+    (or from the perf_counter() value `origin`, to line up several partial runs of one pipeline).
+    If `targets` is given, only the stages needed to produce those values run; stages whose outputs
+    are already in `values` never run, so a later call can resume a partial run from its values."""
+    _producers(stages)
+    values = dict(values)
+    stages = _needed(stages, values, targets)
+    producers = _producers(stages)
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in values and name not in producers:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown value '{name}'")
+
+    origin = time.perf_counter() if origin is None else origin
+    timings = {}
+    pending = list(stages)
+    running = {}
+    try:
+        while pending or running:
+            for stage in [s for s in pending if all(name in values for name in s.inputs)]:
+                pending.remove(stage)
+                timings[stage.name] = {"start": round(time.perf_counter() - origin, 3)}
+                running[asyncio.create_task(_run_stage(stage, values))] = stage
+            if not running:
+                raise ValueError(f"Cyclic dependency between stages: {[s.name for s in pending]}")
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                stage = running.pop(task)
+                result = task.result()
+                end = round(time.perf_counter() - origin, 3)
+                timings[stage.name].update(end=end, duration=round(end - timings[stage.name]["start"], 3))
+                outputs = {stage.outputs[0]: result} if len(stage.outputs) == 1 else dict(zip(stage.outputs, result))
+                values.update(outputs)
+                emit(StageCompleted(stage.name, outputs, timings[stage.name]["duration"]))
+    finally:
+        for task in running:
+            task.cancel()
+    return values, timings
+
+def critical_path(stages: List[Stage], timings: Dict[str, Dict[str, float]]) -> List[str]:
+    """Walk back from the last stage to finish, following the input that became ready last."""
+    producers = _producers(stages)
+    finished = [s for s in stages if "end" in timings.get(s.name, {})]
+    if not finished:
+        return []
+    # End times are rounded to milliseconds, so a fast stage can share its end time with its input;
+    # on a tie the stage that started last is the later one
+    stage = max(finished, key=lambda s: (timings[s.name]["end"], timings[s.name]["start"]))
+    path = [stage.name]
+    while True:
+        upstream = [producers[name] for name in stage.inputs if name in producers and producers[name].name in timings]
+        if not upstream:
+            break
+        stage = max(upstream, key=lambda s: timings[s.name]["end"])
+        if stage.name in path:
+            break
+        path.append(stage.name)
+    return path[::-1]
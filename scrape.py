@@ -0,0 +1,131 @@
+"""
+scrape.py
+Async Google results scraping, the search backend used without Custom Search credentials (and as its
+overflow). Result pages are requested concurrently through the pooled HTTP client and parsed as they
+stream in with a small HTMLParser instead of a full BeautifulSoup tree, and every result is handed to
+`on_result` as soon as its link is parsed, so fetching the article can start right away.
+"""
+import math
+import random
+import asyncio
+import codecs
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+from urllib.parse import unquote
+
+from http_client import HttpClient
+from ratelimit import Limiter, RATE_RETRIES, backoff
+
+SEARCH_URL = "https://www.google.com/search"
+# Google answers the basic-HTML result page with 10 results per page
+RESULTS_PER_PAGE = 10
+# Skips the cookie consent interstitial
+COOKIES = "CONSENT=PENDING+987; SOCS=CAESHAgBEhIaAB"
+
+def get_useragent():
+    lynx_version = f"Lynx/{random.randint(2, 3)}.{random.randint(8, 9)}.{random.randint(0, 2)}"
+    libwww_version = f"libwww-FM/{random.randint(2, 3)}.{random.randint(13, 15)}"
+    ssl_mm_version = f"SSL-MM/{random.randint(1, 2)}.{random.randint(3, 5)}"
+    openssl_version = f"OpenSSL/{random.randint(1, 3)}.{random.randint(0, 4)}.{random.randint(0, 9)}"
+    return f"{lynx_version} {libwww_version} {ssl_mm_version} {openssl_version}"
+
+class ResultPageParser(HTMLParser):
+    """Incremental parser for the basic-HTML result page: each `div.ezO2md` block holds a result link,
+    its title (`span.CVA68e`) and snippet (`span.FrIlee`). Complete results go to `on_result`."""
+    def __init__(self, on_result: Callable[[Dict], None]):
+        super().__init__(convert_charrefs=True)
+        self.on_result = on_result
+        self._depth = 0
+        self._link = None
+        self._field = None
+        self._field_depth = 0
+        self._text = {"title": [], "content": []}
+
+    def handle_starttag(self, tag, attrs):
+        classes = (dict(attrs).get("class") or "").split()
+        if tag == "div" and not self._depth and "ezO2md" in classes:
+            self._depth = 1
+            self._link, self._field = None, None
+            self._text = {"title": [], "content": []}
+            return
+        if not self._depth:
+            return
+        if tag == "div":
+            self._depth += 1
+        elif tag == "a" and self._link is None:
+            href = dict(attrs).get("href")
+            if href:
+                self._link = unquote(href.split("&")[0].replace("/url?q=", ""))
+        elif tag == "span":
+            if self._field:
+                self._field_depth += 1
+            elif "CVA68e" in classes and self._link is not None:
+                self._field, self._field_depth = "title", 1
+            elif "FrIlee" in classes:
+                self._field, self._field_depth = "content", 1
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+        if tag == "span" and self._field:
+            self._field_depth -= 1
+            if not self._field_depth:
+                self._field = None
+        elif tag == "div":
+            self._depth -= 1
+            if not self._depth:
+                title = "".join(self._text["title"]).strip()
+                content = "".join(self._text["content"]).strip()
+                if self._link and title and content:
+                    self.on_result({"title": title, "url": self._link, "content": content, "score": None, "raw_content": content})
+
+    def handle_data(self, data):
+        if self._field:
+            self._text[self._field].append(data)
+
+async def _scrape_page(query: str, start: int, max_results: int, http: HttpClient, limiter: Limiter, attrs: dict,
+                       on_result: Callable[[Dict], None]):
+    params = {"q": query, "num": max_results + 2, "hl": "en", "start": start, "safe": "active"}
+    for attempt in range(RATE_RETRIES + 1):
+        await limiter.acquire()
+        attrs["requests"] = attrs.get("requests", 0) + 1
+        async with http.get(SEARCH_URL, params=params, headers={"User-Agent": get_useragent(), "Accept": "*/*", "Cookie": COOKIES}) as response:
+            retry = limiter.observe(response.status, response.headers)
+            if response.status == 200:
+                parser = ResultPageParser(on_result)
+                decoder = codecs.getincrementaldecoder(response.charset)(errors="replace")
+                async for chunk in response.iter_chunks():
+                    parser.feed(decoder.decode(chunk))
+                parser.feed(decoder.decode(b"", final=True))
+                parser.close()
+                return
+            attrs["status"] = str(response.status)
+        if not retry or attempt == RATE_RETRIES:
+            raise RuntimeError(f"HTTP {response.status} from Google search")
+        await asyncio.sleep(backoff(attempt))
+
+async def scrape_google(query: str, max_results: int, http: HttpClient, limiter: Limiter, attrs: Optional[dict] = None,
+                        on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """Up to `max_results` Google results for `query`. All result pages needed are requested at once;
+    `on_result` sees each new result as soon as it is parsed. A page Google keeps refusing is logged,
+    counted in attrs["failed_pages"] and skipped; the results parsed from the other pages are still returned."""
+    attrs = attrs if attrs is not None else {}
+    pages: List[List[Dict]] = [[] for _ in range(math.ceil(max_results / RESULTS_PER_PAGE))]
+    seen = set()
+
+    def found(page: List[Dict], result: Dict):
+        if result["url"] in seen or len(seen) >= max_results:
+            return
+        seen.add(result["url"])
+        page.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    outcomes = await asyncio.gather(*(_scrape_page(query, index * RESULTS_PER_PAGE, max_results, http, limiter, attrs,
+                                                   lambda result, page=page: found(page, result))
+                                      for index, page in enumerate(pages)), return_exceptions=True)
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            attrs["failed_pages"] = attrs.get("failed_pages", 0) + 1
+            print(f"Error in Google search for '{query}', result page {index + 1}: {str(outcome)}")
+    return [result for page in pages for result in page][:max_results]
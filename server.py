@@ -0,0 +1,88 @@
+"""
+server.py
+Thin HTTP wrapper around the pipeline.
+
+    python server.py            # listens on VERYNEWS_HOST:VERYNEWS_PORT (default 127.0.0.1:8080)
+
+POST /judge          {"news": "..."} -> verdict JSON once the judgement is done
+POST /reverify       {"run_id": "..."} -> verdict JSON of a stored run re-checked against fresh sources
+POST /judge/stream   {"news": "..."} -> Server-Sent Events (events.py) as each stage completes;
+                     GET /judge/stream?news=... works too, for EventSource clients.
+                     Closing the connection cancels the run.
+GET /metrics         Prometheus text format (metrics.py)
+"""
+import os
+from dotenv import load_dotenv
+load_dotenv()
+from aiohttp import web
+
+import metrics
+from utils import default_search_context
+from verynews_news_agent import verynews_news_judge_async, verynews_news_judge_events, reverify_async
+
+HOST = os.environ.get("VERYNEWS_HOST", "127.0.0.1")
+PORT = int(os.environ.get("VERYNEWS_PORT", "8080"))
+
+async def _read_claim(request: web.Request) -> tuple:
+    if request.method == "GET":
+        body = dict(request.query)
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Expected a JSON body")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="Expected a JSON object")
+    news = body.get("news")
+    if not isinstance(news, str) or not news.strip():
+        raise web.HTTPBadRequest(text="Missing 'news'")
+    config = body.get("config") if isinstance(body.get("config"), dict) else {}
+    return news, config
+
+async def judge(request: web.Request) -> web.Response:
+    news, config = await _read_claim(request)
+    result = await verynews_news_judge_async(news, {**config, "report": "lazy"}, default_search_context())
+    return web.json_response({k: result[k] for k in ("judge_json", "early_exit", "run_id", "timings", "critical_path", "trace")})
+
+async def reverify(request: web.Request) -> web.Response:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Expected a JSON body")
+    run_id = body.get("run_id") if isinstance(body, dict) else None
+    if not isinstance(run_id, str) or not run_id:
+        raise web.HTTPBadRequest(text="Missing 'run_id'")
+    try:
+        result = await reverify_async(run_id, {"report": "lazy"})
+    except KeyError:
+        raise web.HTTPNotFound(text=f"Unknown run '{run_id}'")
+    return web.json_response({k: result[k] for k in ("judge_json", "early_exit", "run_id", "evidence_diff", "timings", "critical_path", "trace")})
+
+async def judge_stream(request: web.Request) -> web.StreamResponse:
+    news, config = await _read_claim(request)
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    report = request.query.get("report", "1") != "0"
+    # aiohttp cancels this handler when the client disconnects, which closes the iterator and cancels the run
+    events = verynews_news_judge_events(news, config, default_search_context(), report=report)
+    try:
+        async for event in events:
+            await response.write(event.to_sse().encode("utf-8"))
+    finally:
+        await events.aclose()
+    return response
+
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.REGISTRY.prometheus(), content_type="text/plain", charset="utf-8")
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_post("/judge", judge)
+    app.router.add_post("/reverify", reverify)
+    app.router.add_post("/judge/stream", judge_stream)
+    app.router.add_get("/judge/stream", judge_stream)
+    app.router.add_get("/metrics", prometheus_metrics)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=HOST, port=PORT)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The modules are flat files at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the persistent caches and stores out of the working tree; tests that need one create it in memory
+os.environ["VERYNEWS_CACHE_PATH"] = ""
+# llm.py builds its model client at import; no request is made until a test calls the model
+os.environ.setdefault("MODEL", "gemini-test")
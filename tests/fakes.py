@@ -0,0 +1,73 @@
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+class FakeResponse:
+    def __init__(self, status, body=b"", content_type="text/html; charset=utf-8"):
+        self.status = status
+        self.headers = {"Content-Type": content_type}
+        self.charset = "utf-8"
+        self.bytes_read = len(body)
+        self._body = body
+
+    async def iter_chunks(self, size=16384):
+        yield self._body
+
+    async def read(self, limit=-1):
+        return self._body
+
+    async def text(self, errors="replace"):
+        return self._body.decode("utf-8", errors=errors)
+
+    async def json(self):
+        return json.loads(self._body)
+
+class FakeHttp:
+    """Stands in for http_client.HttpClient: answers Custom Search calls with `results_per_query` links
+    per query and every other GET with `status` and `body` after `delay` seconds. Counts the requests
+    per URL and the responses still open."""
+    def __init__(self, status=404, delay=0.0, results_per_query=5, body=b""):
+        self.status = status
+        self.body = body
+        self.delay = delay
+        self.results_per_query = results_per_query
+        self.requests = {}
+        self.open = 0
+
+    @asynccontextmanager
+    async def get(self, url, params=None, headers=None, timeout=30, verify_ssl=True):
+        self.requests[url] = self.requests.get(url, 0) + 1
+        await asyncio.sleep(self.delay)
+        self.open += 1
+        try:
+            if "customsearch" in url:
+                shard = abs(hash(params["q"])) % 10**8
+                items = [{"title": f"r{i}", "link": f"https://news.example/{shard}/{i}", "snippet": "s"}
+                         for i in range(min(params["num"], self.results_per_query))]
+                yield FakeResponse(200, json.dumps({"items": items}).encode(), "application/json")
+            else:
+                yield FakeResponse(self.status, self.body)
+        finally:
+            self.open -= 1
+
+    def page_requests(self):
+        return {url: n for url, n in self.requests.items() if urlsplit(url).hostname == "news.example"}
+
+    async def close(self):
+        pass
+
+class FakeCompletions:
+    """Stands in for llm.AsyncModel._complete: answers each stage from `answers` (one text, or a list of
+    texts used in turn) and records the stage and prompt of every call."""
+    def __init__(self, answers):
+        self.answers = {stage: list(a) if isinstance(a, list) else a for stage, a in answers.items()}
+        self.calls = []
+
+    async def __call__(self, prompt, stage, json_mode=False):
+        self.calls.append((stage, prompt))
+        answer = self.answers[stage]
+        return answer.pop(0) if isinstance(answer, list) else answer
+
+    def stages(self):
+        return [stage for stage, _ in self.calls]
@@ -0,0 +1,41 @@
+import time
+
+from cache import PageCache, PageMemo, SearchCache, content_hash, normalize_query, normalize_url
+
+def test_normalize_url_drops_tracking_and_www():
+    assert normalize_url("http://www.Example.com/a/?utm_source=x&b=2&a=1#frag") == "https://example.com/a?a=1&b=2"
+
+def test_page_memo_is_bounded_lru():
+    memo = PageMemo(max_entries=2, ttl=60)
+    memo.put("a", "A")
+    memo.put("b", "B")
+    assert memo.get("a") == "A"
+    memo.put("c", "C")
+    assert memo.get("b") is None and memo.get("a") == "A" and memo.get("c") == "C"
+    assert len(memo) == 2
+
+def test_page_memo_expires_with_the_fetch_time():
+    memo = PageMemo(ttl=60)
+    memo.put("old", "text", fetched_at=time.time() - 120)
+    memo.put("new", "text")
+    assert memo.get("old") is None
+    assert memo.get("new") == "text"
+
+def test_page_cache_freshness_and_revalidation():
+    cache = PageCache(":memory:", ttl=0)
+    cache.put("https://www.example.com/a?utm_medium=x", "body", etag='"v1"')
+    page = cache.get("https://example.com/a")
+    assert page.text == "body" and page.etag == '"v1"' and not page.fresh
+    assert content_hash("body") == content_hash(b"body")
+
+def test_search_cache_round_trip():
+    cache = SearchCache(":memory:")
+    cache.put("flood in valencia site:a.com", "api", 5, [{"url": "u"}])
+    assert cache.get("Flood in Valencia  site:a.com", "api", 5) == [{"url": "u"}]
+    assert cache.get("flood in valencia site:a.com", "api", 10) is None
+
+def test_normalize_query_keeps_word_order():
+    assert normalize_query("Did Israel attack Iran?") != normalize_query("Did Iran attack Israel?")
+    assert normalize_query("Did  Israel attack, Iran?") == normalize_query("did israel attack iran")
+    assert normalize_query("f-35 site:b.com OR site:a.com") == normalize_query("F-35 site:a.com OR site:b.com")
+    assert normalize_query('"shot down" f-35') != normalize_query("shot down f-35")
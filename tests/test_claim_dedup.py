@@ -0,0 +1,39 @@
+import asyncio
+
+from claim_dedup import ClaimIndex, ClaimStore, CLAIM_DEDUP_THRESHOLD, fingerprint
+from fingerprint import similarity
+
+FACTS = {"who": "China", "what": "shot down a US F-35", "when": "Monday", "where": "Taiwan Strait"}
+
+def _matches(a, b, facts_a=FACTS, facts_b=FACTS):
+    fa, fb = fingerprint(a, facts_a), fingerprint(b, facts_b)
+    return fa.guard == fb.guard and similarity(fa.signature, fb.signature) >= CLAIM_DEDUP_THRESHOLD
+
+def test_rewordings_match():
+    assert _matches("China shot down a US F-35 over the Taiwan Strait on Monday, reports say.",
+                    "Reports say China shot down a US F-35 over the Taiwan Strait on Monday.")
+
+def test_swapped_roles_do_not_match():
+    a = "The Chinese Air Force shot down the US Air Force F-35 over the Taiwan Strait on Monday."
+    b = "The US Air Force shot down the Chinese Air Force F-35 over the Taiwan Strait on Monday."
+    assert not _matches(a, b, dict(FACTS, who="Chinese Air Force"), dict(FACTS, who="US Air Force"))
+    # Even with identical extracted facts the texts are too far apart
+    assert not _matches(a, b)
+
+def test_numbers_and_negation_guard():
+    assert not _matches("5 killed in the Taiwan Strait clash on Monday", "50 killed in the Taiwan Strait clash on Monday")
+    assert not _matches("China shot down a US F-35 on Monday", "China did not shoot down a US F-35 on Monday")
+
+def test_store_round_trip_and_running_coalescing():
+    index = ClaimIndex(ClaimStore(":memory:"))
+    fp = fingerprint("China shot down a US F-35 over the Taiwan Strait on Monday.", FACTS)
+
+    async def main():
+        entry = index.begin(fp)
+        assert index.running(fp).claim_id == entry.claim_id
+        await index.finish(entry, {"judge": {"result": "False"}})
+        assert index.running(fp) is None
+        return await index.find(fp)
+
+    duplicate = asyncio.run(main())
+    assert duplicate.state == {"judge": {"result": "False"}}
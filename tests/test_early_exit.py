@@ -0,0 +1,37 @@
+import json
+import asyncio
+
+from fakes import FakeCompletions
+from llm import llm
+from verynews_news_agent import _judge, pipeline_for
+
+CLAIM = "The Chinese Air Force shot down a US F-35"
+ANSWERS = {
+    "expert": json.dumps({"analysis": "a", "controversy": [], "credibility": "Low"}),
+    "timeliness": json.dumps({"timeline": [], "latest_updates": []}),
+    "judge": json.dumps({"result": "False", "reason": "r", "sources": [], "timestamp": "t"}),
+}
+
+def _run(monkeypatch, evidence):
+    completions = FakeCompletions(dict(ANSWERS, evidence=json.dumps(evidence)))
+    monkeypatch.setattr(llm, "_complete", completions)
+    monkeypatch.setattr(llm, "cache", None)
+    config = {"early_exit": True, "report": "lazy"}
+    values = {"news_content": CLAIM, "news_en": CLAIM, "current_time": "2026-10-18T00:00:00Z", "search_context": None,
+              "facts": {"who": "Chinese Air Force"}, "queries": ["q"], "search_results": "results", "sources": {}}
+    _, _, _, early_exit = asyncio.run(_judge(pipeline_for(config), values, config, 0.0))
+    return completions, early_exit
+
+def test_decisive_evidence_exits_early(monkeypatch):
+    completions, early_exit = _run(monkeypatch, {"stance": "refuted", "confidence": 0.95, "contradictions": [],
+                                                  "sources": ["https://a.example/1", "https://b.example/2"]})
+    assert early_exit
+    assert completions.stages() == ["evidence", "judge"]
+    # The stance is judged against the claim itself
+    assert CLAIM in completions.calls[0][1]
+
+def test_mixed_evidence_runs_the_full_pipeline(monkeypatch):
+    completions, early_exit = _run(monkeypatch, {"stance": "mixed", "confidence": 0.95, "contradictions": ["dates differ"],
+                                                  "sources": ["https://a.example/1", "https://b.example/2"]})
+    assert not early_exit
+    assert sorted(completions.stages()) == ["evidence", "expert", "judge", "timeliness"]
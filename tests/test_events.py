@@ -0,0 +1,25 @@
+import json
+import asyncio
+
+from events import StageCompleted, RunCompleted, emit, listen
+
+def test_sse_frame_carries_type_and_json_payload():
+    frame = StageCompleted("facts", {"facts": {"who": "X"}}, 0.5).to_sse()
+    header, data, blank, end = frame.split("\n")
+    assert header == "event: stage" and blank == "" and end == ""
+    payload = json.loads(data.removeprefix("data: "))
+    assert payload["type"] == "stage" and payload["outputs"] == {"facts": {"who": "X"}}
+
+def test_events_reach_only_the_listening_run():
+    async def run(name, queue):
+        if queue is not None:
+            listen(queue)
+        await asyncio.sleep(0)
+        emit(RunCompleted({"result": name}, False, {}))
+
+    async def main():
+        queue = asyncio.Queue()
+        await asyncio.gather(asyncio.create_task(run("a", queue)), asyncio.create_task(run("b", None)))
+        return [queue.get_nowait().judge_json["result"] for _ in range(queue.qsize())]
+
+    assert asyncio.run(main()) == ["a"]
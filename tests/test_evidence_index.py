@@ -0,0 +1,76 @@
+import asyncio
+
+import utils
+from evidence_index import EvidenceIndex, trusted_site
+from fakes import FakeHttp
+from utils import SearchContext, google_search_async
+
+FILLER = " Officials gave no further details, and the report could not be independently verified by other outlets."
+ARTICLES = {
+    "https://a.example/missile": ("Missile strike hits Kyiv power plant",
+                                  "A missile strike hit a power plant in Kyiv on Monday, officials said." + FILLER * 3),
+    "https://b.example/power": ("Energy prices rise",
+                                "Power prices rose in Kyiv after a strike on a plant, analysts said." + FILLER * 3),
+    "https://c.example/flood": ("Floods in Valencia",
+                                "Heavy rain flooded streets in Valencia, the regional government said." + FILLER * 3),
+}
+
+def _index():
+    index = EvidenceIndex(":memory:")
+    for url, (title, text) in ARTICLES.items():
+        assert index.add(url, text, title, "snippet", trusted_site(url, []))
+    return index
+
+def test_search_ranks_title_matches_first():
+    results = _index().search("missile strike kyiv power plant")
+    assert [r["url"] for r in results] == ["https://a.example/missile", "https://b.example/power"]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0]["raw_content"] == ARTICLES["https://a.example/missile"][1]
+
+def test_search_needs_most_query_terms():
+    index = _index()
+    # "missiles" matches "missile"; site: filters are ignored
+    assert [r["url"] for r in index.search("missiles kyiv site:a.example")] == ["https://a.example/missile"]
+    assert index.search("valencia missile earthquake tsunami") == []
+    assert index.search("the of and") == []
+
+def test_placeholders_and_snippets_are_not_indexed():
+    index = EvidenceIndex(":memory:")
+    assert not index.add("https://a.example/x", "[HTTP error: 403]")
+    assert not index.add("https://a.example/y", "Too short to be an article.")
+    assert index.stats() == {"articles": 0}
+
+def test_oldest_articles_are_evicted():
+    index = EvidenceIndex(":memory:", max_articles=2)
+    for url, (title, text) in ARTICLES.items():
+        index.add(url, text, title)
+    assert index.stats() == {"articles": 1}
+    assert index.search("valencia floods")[0]["url"] == "https://c.example/flood"
+
+def test_local_first_falls_back_to_the_web(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "key")
+    monkeypatch.setenv("GOOGLE_CX", "cx")
+    monkeypatch.setattr(utils, "SITES_TRUSTED_SOURCE", ["news.example"])
+    page = ("<html><body><article><p>" + "Storm Boris flooded towns across central Europe, officials said." + FILLER * 3
+            + "</p></article></body></html>").encode()
+    http = FakeHttp(status=200, body=page, results_per_query=3)
+    index = _index()
+
+    async def main():
+        context = SearchContext(http=http, evidence_index=index, search_mode="local_first", extraction="stream")
+        context.page_cache = context.search_cache = context.extraction_cache = None
+        local, web = await google_search_async(["missile strike kyiv power plant", "storm boris floods europe"],
+                                               max_results=5, min_results=2, context=context)
+        memo = context.pages.get("https://a.example/missile")
+        await context.close()
+        return local, web, memo
+
+    local, web, memo = asyncio.run(main())
+    # The indexed query needs no request; its articles are in the context's page memo
+    assert [r["url"] for r in local["results"]] == ["https://a.example/missile", "https://b.example/power"]
+    assert memo == ARTICLES["https://a.example/missile"][1]
+    assert [url for url in http.requests if "customsearch" in url] and len(web["results"]) == 3
+    assert all("Storm Boris" in r["raw_content"] for r in web["results"])
+    # Pages fetched from the trusted sites are indexed for the next search
+    assert index.stats() == {"articles": 6}
+    assert index.search("storm boris flooded europe", limit=5)
@@ -0,0 +1,23 @@
+from extract import ArticleTextExtractor
+
+BODY = "The air force said on Friday that no aircraft had been lost during the exercise near the coast."
+
+def _text(html):
+    extractor = ArticleTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+def test_article_header_keeps_the_headline():
+    html = ('<header class="site-header"><a href="/">Home</a> Breaking news and more from the site</header>'
+            '<article><header class="article-header"><h1>No F-35 was shot down</h1></header><p>' + BODY + '</p></article>')
+    text = _text(html)
+    assert text.splitlines() == ["No F-35 was shot down", BODY]
+
+def test_article_header_class_outside_article_is_kept():
+    html = '<div class="article-header"><h1>No F-35 was shot down</h1></div><div class="masthead"><h2>Daily Example</h2></div><p>' + BODY + '</p>'
+    assert _text(html).splitlines() == ["No F-35 was shot down", BODY]
+
+def test_navigation_is_still_skipped():
+    html = '<nav><p>' + BODY.upper() + '</p></nav><main><div class="share-bar"><p>' + BODY.upper() + '</p></div><p>' + BODY + '</p></main>'
+    assert _text(html) == BODY
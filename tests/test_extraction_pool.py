@@ -0,0 +1,47 @@
+import os
+import time
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from extract import ExtractionPool
+
+def _square(x):
+    return x * x
+
+def _die():
+    os._exit(1)
+
+def _hang():
+    time.sleep(60)
+
+def test_pool_recovers_after_a_worker_dies():
+    pool = ExtractionPool(max_workers=1, timeout=10)
+
+    async def main():
+        assert await pool.run(_square, 3) == 9
+        with pytest.raises(BrokenProcessPool):
+            await pool.run(_die)
+        # The slot was released and a new pool is started
+        for x in range(3):
+            assert await asyncio.wait_for(pool.run(_square, x), 10) == x * x
+
+    try:
+        asyncio.run(main())
+    finally:
+        pool.close()
+
+def test_stuck_workers_are_terminated():
+    pool = ExtractionPool(max_workers=1, timeout=0.5)
+
+    async def main():
+        assert await pool.run(_square, 2) == 4
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(_hang)
+        assert await asyncio.wait_for(pool.run(_square, 5), 10) == 25
+
+    try:
+        asyncio.run(main())
+    finally:
+        pool.close()
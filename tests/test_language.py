@@ -0,0 +1,22 @@
+from language import detect_language, split_for_translation
+
+BILINGUAL = """Smile（互Fo💯）
+@Latinacl_01
+May 30
+劲爆消息：中国空军击落了抵近侦查的美国空军F-35战机！💪💪
+Breaking news: The Chinese Air Force shot down the US Air Force F-35 fighter jet during close reconnaissance!💪💪"""
+
+def test_bilingual_post_skips_translation():
+    english, to_translate = split_for_translation(BILINGUAL)
+    assert to_translate is None
+    assert english.startswith("Smile") and "F-35 fighter jet" in english and "劲爆" not in english
+
+def test_line_sharing_one_anchor_is_translated():
+    assert split_for_translation("中国没有击落F-35\nChina shot down an F-35 jet") == ("China shot down an F-35 jet", "中国没有击落F-35")
+
+def test_short_foreign_phrases_are_not_neutral():
+    assert detect_language("Guerra en Ucrania") == "other"
+    assert detect_language("Guerre à Gaza") == "other"
+    assert split_for_translation("Guerra en Ucrania") == ("", "Guerra en Ucrania")
+    assert detect_language("May 30") == "neutral"
+    assert detect_language("@Latinacl_01") == "neutral"
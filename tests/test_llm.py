@@ -0,0 +1,68 @@
+import json
+import asyncio
+
+import pytest
+
+import llm
+from fakes import FakeCompletions
+from llm import REPAIR_NOTE, AsyncModel, MemoryResponseCache
+from utils import EvidenceChain, StructuredOutputError, parse_structured
+
+def test_each_event_loop_gets_its_own_model_client(monkeypatch):
+    monkeypatch.setattr(llm, "_async_client", object)
+    model = llm.PerLoopModel("gemini-test")
+
+    async def clients():
+        return model._model()._async_client, model._model()._async_client
+
+    first, again = asyncio.run(clients())
+    second, _ = asyncio.run(clients())
+    assert first is again
+    assert first is not second
+
+VALID = json.dumps({"stance": "refuted", "confidence": 0.9, "sources": ["https://a.example/1"]})
+INVALID = json.dumps({"stance": "probably not", "confidence": 0.9})
+
+def test_parse_structured_strips_fences():
+    parsed = parse_structured("```json\n" + VALID + "\n```", EvidenceChain)
+    assert parsed.stance == "refuted" and parsed.sources == ["https://a.example/1"]
+
+def test_parse_structured_cuts_json_out_of_prose():
+    parsed = parse_structured("Here is the evidence chain:\n" + VALID + "\nLet me know if you need more.", EvidenceChain)
+    assert parsed.confidence == 0.9
+
+def test_parse_structured_reads_python_literals():
+    assert parse_structured("{'stance': 'Confirmed', 'confidence': 1, 'sources': []}", EvidenceChain).stance == "confirmed"
+
+def test_parse_structured_rejects_wrong_shape():
+    with pytest.raises(StructuredOutputError):
+        parse_structured(INVALID, EvidenceChain)
+
+def _model(answers):
+    model = AsyncModel("gemini-test", cache=MemoryResponseCache())
+    model._complete = FakeCompletions({"evidence": answers})
+    return model
+
+def _generate(model, retries=1):
+    return asyncio.run(model.generate_json("Evidence for {claim}", "evidence", EvidenceChain, retries=retries, claim="c"))
+
+def test_invalid_answer_is_retried_once_with_the_error():
+    model = _model([INVALID, VALID])
+    assert _generate(model).stance == "refuted"
+    prompts = [prompt for _, prompt in model._complete.calls]
+    assert len(prompts) == 2
+    assert prompts[0] == "Evidence for c"
+    assert prompts[1].startswith("Evidence for c" + REPAIR_NOTE.split("{error}")[0])
+    # Only the validated answer is cached, and it is served without another call
+    assert _generate(model).stance == "refuted"
+    assert len(model._complete.calls) == 2
+
+def test_invalid_answers_raise_and_are_not_cached():
+    model = _model([INVALID, INVALID, VALID])
+    with pytest.raises(StructuredOutputError):
+        _generate(model)
+    assert len(model._complete.calls) == 2
+    assert model.cache._entries == {}
+    # The next run asks the model again instead of reading a bad answer from the cache
+    assert _generate(model).stance == "refuted"
+    assert len(model._complete.calls) == 3
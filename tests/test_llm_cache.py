@@ -0,0 +1,24 @@
+from cache import ResponseCache
+from llm import AsyncModel, MemoryResponseCache
+
+def test_cache_key_keeps_the_date_of_the_run():
+    model = AsyncModel("gemini-test")
+    morning = model.cache_key("t", "judge", {"news_content": "x", "current_time": "2026-10-18T08:00:00Z"})
+    evening = model.cache_key("t", "judge", {"news_content": "x", "current_time": "2026-10-18T21:30:00Z"})
+    next_day = model.cache_key("t", "judge", {"news_content": "x", "current_time": "2026-10-19T08:00:00Z"})
+    assert morning == evening
+    assert morning != next_day
+
+def test_response_cache_evicts_the_oldest_answers():
+    cache = ResponseCache(":memory:", max_entries=10)
+    for i in range(11):
+        cache.put(f"k{i}", f"answer {i}", "judge")
+    assert cache.get("k0") is None
+    assert cache.get("k10") == "answer 10"
+    assert cache._execute("SELECT COUNT(*) FROM llm_responses")[0][0] == 9
+
+def test_memory_response_cache_is_bounded():
+    cache = MemoryResponseCache(max_entries=2)
+    for i in range(3):
+        cache.put(f"k{i}", f"answer {i}")
+    assert cache.get("k0") is None and cache.get("k2") == "answer 2"
@@ -0,0 +1,63 @@
+import asyncio
+
+from fakes import FakeHttp
+from utils import SearchContext, fetch_full_contents, prefetch
+
+def _context(http):
+    context = SearchContext(http=http)
+    context.page_cache = context.search_cache = context.extraction_cache = context.evidence_index = None
+    return context
+
+def test_failed_prefetch_is_joined_not_downloaded_again():
+    http = FakeHttp(status=404)
+    result = {"title": "t", "url": "https://a.example/x", "content": "snippet", "raw_content": "snippet"}
+
+    async def main():
+        context = _context(http)
+        await prefetch(result, context)
+        [fetched] = await fetch_full_contents([dict(result)], context)
+        assert context.page_fetches == {}
+        await context.close()
+        return fetched
+
+    fetched = asyncio.run(main())
+    assert fetched["raw_content"] == "[HTTP error: 404]"
+    assert http.requests == {"https://a.example/x": 1}
+
+def test_concurrent_searches_share_one_fetch():
+    http = FakeHttp(status=404, delay=0.05)
+    result = {"title": "t", "url": "https://a.example/y", "content": "snippet", "raw_content": "snippet"}
+
+    async def main():
+        context = _context(http)
+        await asyncio.gather(fetch_full_contents([dict(result)], context), fetch_full_contents([dict(result)], context))
+        await context.close()
+
+    asyncio.run(main())
+    assert http.requests == {"https://a.example/y": 1}
+
+def test_failed_html_extraction_is_not_downloaded_again(monkeypatch):
+    import utils
+    from concurrent.futures.process import BrokenProcessPool
+
+    async def timed_out(*args):
+        raise asyncio.TimeoutError()
+
+    async def broken(*args):
+        raise BrokenProcessPool("worker died")
+
+    for extract, placeholder in ((timed_out, "[HTML content extraction timed out, skipped]"),
+                                 (broken, "[HTML content extraction failed: worker died]")):
+        monkeypatch.setattr(utils, "extract_html", extract)
+        http = FakeHttp(status=200)
+        result = {"title": "t", "url": "https://a.example/heavy", "content": "snippet", "raw_content": "snippet"}
+
+        async def main():
+            context = _context(http)
+            context.extraction = "full"
+            [fetched] = await fetch_full_contents([result], context)
+            await context.close()
+            return fetched
+
+        assert asyncio.run(main())["raw_content"] == placeholder
+        assert http.requests == {"https://a.example/heavy": 1}
@@ -0,0 +1,55 @@
+import asyncio
+from urllib.parse import quote_plus
+
+import utils
+from fakes import FakeHttp
+from query_planner import merge_results, plan_queries
+from utils import SearchContext, google_search_async
+
+SITES = [f"site{i}.example.com" for i in range(40)]
+
+def test_every_site_is_covered_within_the_limits():
+    shards = plan_queries("did the flood hit valencia", SITES, max_words=32, max_chars=1800)
+    assert len(shards) > 1
+    covered = [word.removeprefix("site:") for shard in shards for word in shard.split() if word.startswith("site:")]
+    assert covered == SITES
+    for shard in shards:
+        assert len(shard.split()) <= 32 and len(quote_plus(shard)) <= 1800
+
+def test_no_sites_keeps_the_query():
+    assert plan_queries("flood valencia", []) == ["flood valencia"]
+
+def test_merge_fuses_ranks_and_dedups_urls():
+    a = [{"url": "https://www.x.com/1"}, {"url": "https://y.com/2"}]
+    b = [{"url": "https://x.com/1?utm_source=z"}, {"url": "https://z.com/3"}]
+    merged = merge_results([a, b], limit=3)
+    assert [r["url"] for r in merged] == ["https://www.x.com/1", "https://y.com/2", "https://z.com/3"]
+    assert merged[0]["score"] > merged[1]["score"]
+
+def _search(monkeypatch, sites, max_results=5):
+    monkeypatch.setenv("GOOGLE_API_KEY", "key")
+    monkeypatch.setenv("GOOGLE_CX", "cx")
+    monkeypatch.setattr(utils, "SITES_TRUSTED_SOURCE", sites)
+    http = FakeHttp(status=404)
+
+    async def main():
+        context = SearchContext(http=http, search_mode="web")
+        context.page_cache = context.search_cache = context.extraction_cache = context.evidence_index = None
+        [response] = await google_search_async("did the flood hit valencia", max_results=max_results, context=context)
+        pending = dict(context.page_fetches)
+        await context.close()
+        return response, pending
+
+    response, pending = asyncio.run(main())
+    return response, pending, http.page_requests()
+
+def test_sharded_query_fetches_only_merged_results(monkeypatch):
+    response, pending, pages = _search(monkeypatch, SITES)
+    kept = {r["url"] for r in response["results"]}
+    assert set(pages) == kept and all(n == 1 for n in pages.values())
+    assert pending == {}
+
+def test_unsharded_query_fetches_each_result_once(monkeypatch):
+    response, pending, pages = _search(monkeypatch, SITES[:2])
+    assert set(pages) == {r["url"] for r in response["results"]} and len(pages) == 5
+    assert all(n == 1 for n in pages.values()) and pending == {}
@@ -0,0 +1,76 @@
+import asyncio
+
+import utils
+from fakes import FakeHttp
+from ratelimit import HedgePolicy, Limiter, Limiters, hedged
+from utils import SearchContext, fetch_full_contents
+
+def test_hedged_returns_the_first_answer():
+    calls = []
+
+    async def request():
+        calls.append(len(calls))
+        await asyncio.sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    attrs = {}
+    assert asyncio.run(hedged(request, 0.02, attrs)) == 2
+    assert attrs == {"hedged": 1}
+
+def test_hedged_failed_copy_leaves_the_race_to_the_other():
+    calls = []
+
+    async def request():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            await asyncio.sleep(0.05)
+            raise ConnectionError("reset")
+        await asyncio.sleep(0.1)
+        return "second"
+
+    assert asyncio.run(hedged(request, 0.01)) == "second"
+
+def test_limiter_throttles_and_recovers():
+    limiter = Limiter("test", rate=10, burst=1)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() > 0
+    assert limiter.observe(429, {"Retry-After": "0"})
+    assert limiter.rate == 5
+    assert not limiter.observe(200)
+    assert limiter.rate == 5.5
+
+def _context(http):
+    context = SearchContext(http=http)
+    context.page_cache = context.search_cache = context.extraction_cache = context.evidence_index = None
+    return context
+
+def _fetch(http, url):
+    async def main():
+        context = _context(http)
+        [fetched] = await fetch_full_contents([{"title": "t", "url": url, "content": "s", "raw_content": "s"}], context)
+        await context.close()
+        return fetched
+    return asyncio.run(main())
+
+def test_slow_request_is_hedged_and_loser_closed(monkeypatch):
+    policy = HedgePolicy(default=0.01, min_delay=0.0)
+    monkeypatch.setattr(utils, "FETCH_HEDGE", policy)
+    http = FakeHttp(status=404, delay=0.05)
+    assert _fetch(http, "https://hedge.example/a")["raw_content"] == "[HTTP error: 404]"
+    assert http.requests == {"https://hedge.example/a": 2}
+    assert http.open == 0
+    # Only the time to the response headers is recorded
+    assert len(policy._latencies) >= 1 and max(policy._latencies) < 0.5
+
+def test_pdf_is_never_hedged(monkeypatch):
+    monkeypatch.setattr(utils, "FETCH_HEDGE", HedgePolicy(default=0.01, min_delay=0.0))
+    http = FakeHttp(status=404, delay=0.05)
+    _fetch(http, "https://hedge.example/report.pdf")
+    assert http.requests == {"https://hedge.example/report.pdf": 1}
+
+def test_overridden_limits_are_restored():
+    limiters = Limiters({"host": {"rate": 1, "burst": 1}})
+    limiter = limiters.host("a.example")
+    with limiters.overridden({"host": {"rate": 1e9, "burst": 1e9}}):
+        assert all(limiters.host("a.example").reserve() == 0 for _ in range(100))
+    assert limiters.host("a.example") is limiter
@@ -0,0 +1,90 @@
+import json
+import asyncio
+
+import verynews_news_agent
+from fakes import FakeCompletions, FakeHttp
+from llm import llm
+from run_store import RunStore, diff_sources, source_hashes
+from utils import SearchContext
+from verynews_news_agent import reverify_async
+
+def _responses(**pages):
+    return [{"query": "q", "results": [{"url": url, "raw_content": text} for url, text in pages.items()]}]
+
+def test_diff_sources_by_normalized_url_and_content():
+    old = source_hashes(_responses(**{"https://www.a.example/x?utm_source=t": "one", "https://b.example/y": "two"}))
+    new = source_hashes(_responses(**{"https://a.example/x": "one, updated", "https://c.example/z": "three"}))
+    diff = diff_sources(old, new)
+    assert diff.changed
+    assert diff.info() == {"changed": True, "added": ["https://c.example/z"], "removed": ["https://b.example/y"],
+                           "modified": ["https://a.example/x"]}
+    assert not diff_sources(old, old).changed
+
+def test_run_store_round_trip_and_expiry():
+    store = RunStore(":memory:", max_age=3600)
+    run_id = store.put("claim", {"mode": "standard"}, {"verdict": "false"})
+    run = store.get(run_id)
+    assert (run.news_content, run.config, run.state, run.parent_id) == ("claim", {"mode": "standard"}, {"verdict": "false"}, None)
+    child_id = store.put("claim", {}, {}, parent_id=run_id)
+    assert store.get(child_id).parent_id == run_id
+    store.max_age = -1
+    store.put("other", {}, {})
+    assert store.get(run_id) is None
+
+ARTICLE = "Officials said on Friday that no aircraft was lost near the coast during the exercise. " * 3
+PAGES = {"https://a.example/1": ARTICLE, "https://b.example/2": ARTICLE.upper()}
+ANSWERS = {
+    "evidence": json.dumps({"stance": "refuted", "confidence": 0.9, "contradictions": [], "sources": list(PAGES)}),
+    "expert": json.dumps({"analysis": "a", "controversy": [], "credibility": "High"}),
+    "timeliness": json.dumps({"timeline": [], "latest_updates": []}),
+    "judge": json.dumps({"result": "False", "reason": "new evidence", "sources": [], "timestamp": "t"}),
+}
+
+def _search_responses(pages):
+    return [{"query": "q", "follow_up_questions": None, "answer": None, "images": [],
+             "results": [{"title": "t", "url": url, "content": "s", "score": 1, "raw_content": text} for url, text in pages.items()]}]
+
+def _reverify(monkeypatch, pages):
+    store = RunStore(":memory:")
+    state = {"news_content": "claim", "news_en": "claim", "facts": {"who": "x"}, "queries": ["q"],
+             "search_results": "old results", "sources": source_hashes(_search_responses(PAGES)),
+             "evidence": {}, "expert": {}, "timeline": [], "latest_updates": [],
+             "judge": {"result": "False", "reason": "stored"}}
+    run_id = store.put("claim", {"report": "lazy", "early_exit": False}, state)
+    completions = FakeCompletions(ANSWERS)
+
+    async def search(queries, **kwargs):
+        return _search_responses(pages)
+
+    monkeypatch.setattr(verynews_news_agent, "default_run_store", lambda: store)
+    monkeypatch.setattr(verynews_news_agent, "google_search_async", search)
+    monkeypatch.setattr(llm, "_complete", completions)
+    monkeypatch.setattr(llm, "cache", None)
+
+    async def main():
+        context = SearchContext(http=FakeHttp())
+        result = await reverify_async(run_id, context=context)
+        await context.close()
+        return result
+
+    return store, run_id, asyncio.run(main()), completions
+
+def test_reverify_unchanged_sources_keeps_the_verdict(monkeypatch):
+    store, run_id, result, completions = _reverify(monkeypatch, PAGES)
+    assert completions.calls == []
+    assert result["run_id"] == run_id and result["judge_json"]["reason"] == "stored"
+    assert not result["evidence_diff"]["changed"]
+
+def test_reverify_ignores_a_failed_fetch(monkeypatch):
+    pages = dict(PAGES, **{"https://b.example/2": "[Content fetch timeout, skipped]"})
+    _, run_id, result, completions = _reverify(monkeypatch, pages)
+    assert completions.calls == [] and result["run_id"] == run_id
+    assert result["evidence_diff"] == {"changed": False, "added": [], "removed": [], "modified": []}
+
+def test_reverify_changed_sources_judges_again(monkeypatch):
+    pages = dict(PAGES, **{"https://b.example/2": ARTICLE + " Update: the ministry confirmed the loss."})
+    store, run_id, result, completions = _reverify(monkeypatch, pages)
+    assert result["evidence_diff"]["modified"] == ["https://b.example/2"]
+    assert sorted(completions.stages()) == ["evidence", "expert", "judge", "timeliness"]
+    assert result["judge_json"]["reason"] == "new evidence"
+    assert store.get(result["run_id"]).parent_id == run_id
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from scheduler import Stage, run_stages, critical_path, downstream
+
+def _pipeline(calls):
+    async def double(x):
+        calls.append("double")
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    async def inc(x):
+        calls.append("inc")
+        return x + 1
+
+    def total(a, b):
+        calls.append("total")
+        return a + b
+
+    return [
+        Stage("double", double, ("x",), ("a",)),
+        Stage("inc", inc, ("x",), ("b",)),
+        Stage("total", total, ("a", "b")),
+    ]
+
+def test_runs_stages_in_dependency_order():
+    calls = []
+    values, timings = asyncio.run(run_stages(_pipeline(calls), {"x": 3}))
+    assert values["total"] == 10
+    assert calls[-1] == "total"
+    assert set(timings) == {"double", "inc", "total"}
+
+def test_targets_run_only_needed_stages():
+    calls = []
+    values, _ = asyncio.run(run_stages(_pipeline(calls), {"x": 3}, targets=("b",)))
+    assert values["b"] == 4 and "a" not in values
+    assert calls == ["inc"]
+
+def test_present_outputs_are_not_recomputed():
+    calls = []
+    values, _ = asyncio.run(run_stages(_pipeline(calls), {"x": 3, "a": 100}))
+    assert values["total"] == 104
+    assert "double" not in calls
+
+def test_unknown_input_and_duplicate_producer_are_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(run_stages([Stage("s", lambda y: y, ("y",))], {}))
+    with pytest.raises(ValueError):
+        asyncio.run(run_stages([Stage("s", lambda: 1, (), ("v",)), Stage("t", lambda: 2, (), ("v",))], {}))
+
+def test_failing_stage_cancels_the_rest():
+    started = []
+
+    async def slow():
+        started.append("slow")
+        await asyncio.sleep(10)
+
+    async def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(asyncio.wait_for(run_stages([Stage("slow", slow), Stage("boom", boom)], {}), 5))
+    assert started == ["slow"]
+
+def test_critical_path_and_downstream():
+    calls = []
+    stages = _pipeline(calls)
+    _, timings = asyncio.run(run_stages(stages, {"x": 3}))
+    assert critical_path(stages, timings) == ["double", "total"]
+    assert [s.name for s in downstream(stages, ("inc",))] == ["inc", "total"]
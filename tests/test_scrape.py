@@ -0,0 +1,28 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from fakes import FakeResponse
+from ratelimit import Limiter
+from scrape import scrape_google
+
+def _page(start):
+    return "".join(f'<div class="ezO2md"><a href="/url?q=https://news.example/{start + i}&sa=U">x</a>'
+                   f'<span class="CVA68e">Result {start + i}</span><span class="FrIlee">Snippet {start + i}</span></div>'
+                   for i in range(10)).encode()
+
+class PagedGoogle:
+    """Serves the first result page and refuses every later one."""
+    @asynccontextmanager
+    async def get(self, url, params=None, headers=None, timeout=30, verify_ssl=True):
+        if params["start"] == 0:
+            yield FakeResponse(200, _page(0))
+        else:
+            yield FakeResponse(403)
+
+def test_failed_result_page_keeps_the_other_pages():
+    seen, attrs = [], {}
+    results = asyncio.run(scrape_google("flood valencia", 20, PagedGoogle(), Limiter("test", rate=1000, burst=100),
+                                        attrs, on_result=seen.append))
+    assert [r["url"] for r in results] == [f"https://news.example/{i}" for i in range(10)]
+    assert results == seen
+    assert attrs["failed_pages"] == 1
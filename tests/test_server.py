@@ -0,0 +1,22 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from server import create_app
+
+def _post(path, **kwargs):
+    async def main():
+        async with TestClient(TestServer(create_app())) as client:
+            response = await client.post(path, **kwargs)
+            return response.status, await response.text()
+    return asyncio.run(main())
+
+def test_non_object_bodies_are_bad_requests():
+    for body in (["news"], "news", 3):
+        for path in ("/judge", "/judge/stream", "/reverify"):
+            status, _ = _post(path, json=body)
+            assert status == 400
+
+def test_missing_news_is_a_bad_request():
+    assert _post("/judge", json={"config": {}}) == (400, "Missing 'news'")
+    assert _post("/judge", data="not json")[0] == 400
@@ -1,26 +1,36 @@
 import os
 import asyncio
-import requests
-import random 
-import concurrent
-import aiohttp
-import httpx
 import time
 import json
 import ast
+import threading
+import weakref
+from contextlib import AsyncExitStack
 from typing import Annotated, List, TypedDict, Literal, Optional, Dict, Any, Union
-from urllib.parse import unquote
-import io
-from pdfminer.high_level import extract_text
+from urllib.parse import urlsplit
 import operator
 
-from bs4 import BeautifulSoup
-
-from langchain_core.tools import tool
-
-from langsmith import traceable
-
-from pydantic import BaseModel, Field
+from cache import PageCache, PageMemo, SearchCache, ExtractionCache, default_page_cache, default_search_cache, default_extraction_cache
+from http_client import HttpClient
+from evidence import unique_sources
+from events import SearchResults, emit
+from metrics import span, cache_lookup
+from evidence_index import EvidenceIndex, default_evidence_index, trusted_site
+from query_planner import plan_queries, merge_results
+from ratelimit import LIMITERS, FETCH_HEDGE, RATE_RETRIES, backoff, hedged
+from scrape import get_useragent, scrape_google
+from extract import (
+    EXTRACTION_MODE, ExtractionPool, default_extraction_pool, extract_html_stream, extract_html, extract_pdf
+)
+
+try:
+    from langsmith import traceable
+except ImportError:
+    # LangSmith tracing is optional; metrics.py covers the pipeline offline
+    def traceable(func):
+        return func
+
+from pydantic import BaseModel, Field, RootModel, ValidationError, field_validator
 
 class Section(BaseModel):
     name: str = Field(
@@ -49,6 +59,83 @@ class Queries(BaseModel):
         description="List of search queries.",
     )
 
+class Facts5W1H(BaseModel):
+    who: str = Field("unknown", description="Who is involved (explicit/inferred/defaulted).")
+    what: str = Field("unknown", description="What happened (explicit/inferred/defaulted).")
+    when: str = Field("unknown", description="When it happened (explicit/inferred/defaulted).")
+    where: str = Field("unknown", description="Where it happened (explicit/inferred/defaulted).")
+    why: str = Field("unknown", description="Why it happened (explicit/inferred/defaulted).")
+    how: str = Field("unknown", description="How it happened (explicit/inferred/defaulted).")
+
+class FusedExtraction(BaseModel):
+    news_en: str = Field(
+        description="The news content translated into English.",
+    )
+    facts: Facts5W1H = Field(
+        description="5W1H elements of the news.",
+    )
+    queries: List[SearchQuery] = Field(
+        description="List of search queries.",
+    )
+
+class FactCheckQuery(BaseModel):
+    query: str = Field(description="Google search query.")
+    title: Optional[str] = Field(None, description="Title of an expected source.")
+    url: Optional[str] = Field(None, description="URL of an expected source.")
+    snippet: Optional[str] = Field(None, description="Evidence summary.")
+
+class FactCheckQueries(RootModel[List[FactCheckQuery]]):
+    pass
+
+class EvidenceChain(BaseModel):
+    key_evidence: List[Union[str, Dict[str, Any]]] = Field([], description="Key evidence found in the sources.")
+    contradictions: List[Union[str, Dict[str, Any]]] = Field([], description="Contradictions between sources or with the news.")
+    summary: str = Field("", description="Summary of the evidence chain.")
+    stance: Literal["confirmed", "refuted", "mixed", "insufficient"] = Field("insufficient", description="What the evidence says about the news.")
+    confidence: float = Field(0.0, ge=0.0, le=1.0, description="Confidence in the stance.")
+    sources: List[str] = Field([], description="URLs of the sources that directly support the stance.")
+
+    @field_validator("stance", mode="before")
+    @classmethod
+    def normalize_stance(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def normalize_confidence(cls, value):
+        # Percentages ("85", 85) -> 0.85
+        if isinstance(value, str):
+            value = value.strip().rstrip("%")
+        value = float(value)
+        return value / 100 if 1 < value <= 100 else value
+
+class ExpertAnalysis(BaseModel):
+    analysis: str = Field("", description="Expert analysis of the news.")
+    controversy: List[Union[str, Dict[str, Any]]] = Field([], description="Controversial or misleading points.")
+    credibility: str = Field("", description="High/Medium/Low")
+
+class TimelineEvent(BaseModel):
+    date: str = Field("", description="Date of the event (YYYY-MM-DD).")
+    event: str = Field(description="What happened.")
+
+class Timeliness(BaseModel):
+    timeline: List[TimelineEvent] = Field([], description="Events in date order.")
+    latest_updates: List[str] = Field([], description="Latest developments.")
+
+class Judgement(BaseModel):
+    result: Literal["True", "False", "Partially True"] = Field(description="Authenticity conclusion.")
+    reason: str = Field("", description="Reasoning behind the conclusion.")
+    sources: List[str] = Field([], description="References supporting the conclusion.")
+    timestamp: str = Field("", description="Research time of the judgement.")
+
+    @field_validator("result", mode="before")
+    @classmethod
+    def normalize_result(cls, value):
+        # "true", "FALSE", "partially true" -> canonical labels
+        if isinstance(value, str):
+            return {"true": "True", "false": "False", "partially true": "Partially True"}.get(value.strip().lower(), value)
+        return value
+
 class Feedback(BaseModel):
     grade: Literal["pass","fail"] = Field(
         description="Evaluation result indicating whether the response meets requirements ('pass') or needs revision ('fail')."
@@ -92,6 +179,47 @@ if site_env:
     except Exception as e:
         print(f"Failed to parse SITES_TRUSTED_SOURCE from .env: {e}")
 
+def strip_json_fences(text: str) -> str:
+    """Remove the ```json ... ``` fence models often wrap around structured answers."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+class StructuredOutputError(ValueError):
+    """A model answer that could not be parsed into the expected pydantic model."""
+
+def _json_span(text: str) -> str:
+    # The outermost {...} or [...] in text that has prose around the JSON
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    return text[start:end + 1] if end > start else text
+
+def parse_structured(text: str, schema):
+    """Parse a model answer into the pydantic model `schema`. Cheap local repairs are tried in order:
+    stripping ```json fences, cutting the JSON out of surrounding prose, and reading Python-literal
+    dicts (single quotes, True/None) with ast.literal_eval. Raises StructuredOutputError."""
+    candidate = strip_json_fences(text)
+    errors = []
+    for source in dict.fromkeys((candidate, _json_span(candidate))):
+        for name, loads in (("json", json.loads), ("literal", ast.literal_eval)):
+            try:
+                data = loads(source)
+            except (ValueError, SyntaxError, MemoryError, RecursionError) as e:
+                errors.append(f"{name}: {e}")
+                continue
+            try:
+                return schema.model_validate(data)
+            except ValidationError as e:
+                # Parsed but wrong shape: another parser will not fix it
+                raise StructuredOutputError(str(e)) from e
+    raise StructuredOutputError("; ".join(errors))
+
 def get_config_value(value):
     if isinstance(value, str):
         return value
@@ -104,6 +232,29 @@ def get_config_value(value):
     else:
         return value.value
     
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def run_sync(coro):
+    """Run a coroutine on a shared long-lived event loop and block until it finishes.
+    Clients bound to that loop (the Gemini async transport, HTTP sessions) are reused across calls,
+    and it also works when the caller already runs an event loop (e.g. Jupyter)."""
+    global _background_loop
+    if _background_loop is not None and _running_loop() is _background_loop:
+        coro.close()
+        raise RuntimeError("run_sync() cannot block the shared event loop it runs on; await the coroutine instead")
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="verynews-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result()
+
 def get_search_params(search_api: str, search_api_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     SEARCH_API_PARAMS = {
         "googlesearch": ["max_results"],
@@ -118,19 +269,15 @@ def get_search_params(search_api: str, search_api_config: Optional[Dict[str, Any
     return {k: v for k, v in search_api_config.items() if k in accepted_params}
 
 def deduplicate_and_format_sources(search_response, max_tokens_per_source=5000, include_raw_content=True):
-    sources_list = []
-    for response in search_response:
-        sources_list.extend(response['results'])
-    
-    unique_sources = {source['url']: source for source in sources_list}
-
-    formatted_text = "Content from sources:\n"
-    for i, source in enumerate(unique_sources.values(), 1):
-        formatted_text += f"{'='*80}\n"
-        formatted_text += f"Source: {source['title']}\n"
-        formatted_text += f"{'-'*80}\n"
-        formatted_text += f"URL: {source['url']}\n===\n"
-        formatted_text += f"Most relevant content from source: {source['content']}\n===\n"
+    parts = ["Content from sources:"]
+    for i, source in enumerate(unique_sources(search_response), 1):
+        parts.append('='*80)
+        parts.append(f"Source: {source['title']}")
+        parts.append('-'*80)
+        parts.append(f"URL: {source['url']}\n===")
+        if source.get('mirrors'):
+            parts.append(f"Also published at: {', '.join(source['mirrors'])}\n===")
+        parts.append(f"Most relevant content from source: {source['content']}\n===")
         if include_raw_content:
             char_limit = max_tokens_per_source * 4
             raw_content = source.get('raw_content', '')
@@ -139,10 +286,10 @@ def deduplicate_and_format_sources(search_response, max_tokens_per_source=5000,
                 print(f"Warning: No raw_content found for source {source['url']}")
             if len(raw_content) > char_limit:
                 raw_content = raw_content[:char_limit] + "... [truncated]"
-            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
-        formatted_text += f"{'='*80}\n\n"
+            parts.append(f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n")
+        parts.append(f"{'='*80}\n")
                 
-    return formatted_text.strip()
+    return "\n".join(parts).strip()
 
 def format_sections(sections: list[Section]) -> str:
     formatted_str = ""
@@ -162,8 +309,70 @@ Content:
 """
     return formatted_str
 
+# "web" searches Google for every query; "local_first" answers queries from the local evidence index
+# (evidence_index.py) when it holds enough matching articles
+SEARCH_MODE = os.environ.get("VERYNEWS_SEARCH_MODE", "web")
+
+class SearchContext:
+    """State shared by every search made on one event loop: the pooled HTTP client, the process pool
+    for PDF/heavy HTML extraction, a bounded memo of recently fetched page content (cache.PageMemo)
+    and the page fetches still in flight, the persistent caches and the evidence index. `extraction` selects
+    the HTML extraction mode ("stream" or "full"), `search_mode` the search mode ("web" or "local_first").
+    With `refresh`, cached search results are not used and cached pages are revalidated, however fresh."""
+    def __init__(self, http: Optional[HttpClient] = None, page_cache: Optional[PageCache] = None, search_cache: Optional[SearchCache] = None,
+                 extraction: str = EXTRACTION_MODE, extraction_pool: Optional[ExtractionPool] = None,
+                 extraction_cache: Optional[ExtractionCache] = None,
+                 evidence_index: Optional[EvidenceIndex] = None, search_mode: str = SEARCH_MODE, refresh: bool = False):
+        self.http = http or HttpClient()
+        self.extraction = extraction
+        self.search_mode = search_mode
+        self.refresh = refresh
+        self.evidence_index = evidence_index if evidence_index is not None else default_evidence_index()
+        self.extraction_pool = extraction_pool or default_extraction_pool()
+        self.extraction_cache = extraction_cache if extraction_cache is not None else default_extraction_cache()
+        self.pages = PageMemo()
+        self.page_fetches = {}
+        self.page_cache = page_cache if page_cache is not None else default_page_cache()
+        self.search_cache = search_cache if search_cache is not None else default_search_cache()
+
+    def refreshing(self) -> "SearchContext":
+        """A refreshing web-search context sharing this context's client, pools, caches and index, for
+        re-checks of developing stories. Close this context, not the returned one."""
+        context = SearchContext(http=self.http, page_cache=self.page_cache, search_cache=self.search_cache, extraction=self.extraction,
+                                extraction_pool=self.extraction_pool, extraction_cache=self.extraction_cache,
+                                evidence_index=self.evidence_index, search_mode="web", refresh=True)
+        # None means "no cache" here, not "the default cache"
+        context.page_cache, context.search_cache = self.page_cache, self.search_cache
+        context.extraction_cache, context.evidence_index = self.extraction_cache, self.evidence_index
+        return context
+
+    async def close(self):
+        # Prefetches no search has joined (yet)
+        for task in list(self.page_fetches.values()):
+            task.cancel()
+        await asyncio.gather(*self.page_fetches.values(), return_exceptions=True)
+        await self.http.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+_search_contexts = weakref.WeakKeyDictionary()
+
+def default_search_context() -> SearchContext:
+    """The long-lived search context of the running event loop, reused by every search and
+    verynews_news_judge call on that loop so connections to news sites stay warm."""
+    loop = asyncio.get_running_loop()
+    context = _search_contexts.get(loop)
+    if context is None:
+        context = _search_contexts[loop] = SearchContext()
+    return context
+
 @traceable
-async def google_search_async(search_queries: Union[str, List[str]], max_results: int = 5, include_raw_content: bool = True, min_results: int = 3):
+async def google_search_async(search_queries: Union[str, List[str]], max_results: int = 5, include_raw_content: bool = True, min_results: int = 3, context: Optional[SearchContext] = None,
+                              max_content_chars: int = 20_000):
     api_key = os.environ.get("GOOGLE_API_KEY")
     cx = os.environ.get("GOOGLE_CX")
     use_api = bool(api_key and cx)
@@ -172,236 +381,322 @@ async def google_search_async(search_queries: Union[str, List[str]], max_results
     else:
         print("Using web scraping...")
 
-    def build_site_filter(sites):
-        return " OR ".join([f"site:{site}" for site in sites]) if sites else ""
-
     if isinstance(search_queries, str):
         search_queries = [search_queries]
 
-    site_filter = build_site_filter(SITES_TRUSTED_SOURCE)
-    high_queries = [f"{q} {site_filter}" if site_filter else q for q in search_queries]
-    high_results = await _google_search_async_inner(high_queries, max_results, include_raw_content, use_api, api_key, cx)
+    context = context or default_search_context()
+    local_results = {}
+    if context.search_mode == "local_first" and context.evidence_index:
+        for query in search_queries:
+            response = await search_local(query, max_results, min_results, context, max_content_chars)
+            if response is not None:
+                local_results[query] = response
+        print(f"Answered {len(local_results)}/{len(search_queries)} queries from the evidence index")
+    web_queries = [q for q in search_queries if q not in local_results]
+    if not web_queries:
+        return [local_results[q] for q in search_queries]
+
+    # Each query is split into sub-queries over shards of the trusted-site list (see query_planner.py);
+    # all sub-queries run concurrently. The merge of several shards drops results, so pages are only
+    # prefetched as links arrive (see prefetch) for unsharded queries, and otherwise after the merge
+    plans = {query: plan_queries(query, SITES_TRUSTED_SOURCE) for query in web_queries}
+    shard_queries = list(dict.fromkeys(shard for query in web_queries for shard in plans[query]))
+    unsharded = {plans[query][0] for query in web_queries if len(plans[query]) == 1}
+    shard_results = dict(zip(shard_queries, await _google_search_async_inner(
+        shard_queries, max_results, include_raw_content, use_api, api_key, cx, context, max_content_chars, unsharded)))
+    web_results = {}
+    for query in web_queries:
+        shards = [shard_results[shard]["results"] for shard in plans[query]]
+        # Every shard's best result can make the cut, so coverage grows with the trusted-site list
+        results = merge_results(shards, max(max_results, len(shards)))
+        emit(SearchResults(query, [{"title": r["title"], "url": r["url"], "content": r["content"]} for r in results]))
+        web_results[query] = {
+            "query": query,
+            "follow_up_questions": None,
+            "answer": None,
+            "images": [],
+            "results": results
+        }
+    if include_raw_content:
+        await asyncio.gather(*(fetch_full_contents(response["results"], context, max_content_chars)
+                               for response in web_results.values() if response["results"]))
+
+    return [local_results.get(q) or web_results[q] for q in search_queries]
+
+async def search_local(query: str, max_results: int, min_results: int, context: SearchContext, max_content_chars: int = 20_000) -> Optional[dict]:
+    """Answer a query from the evidence index; None when fewer than `min_results` indexed articles match it."""
+    with span("search", "local") as attrs:
+        results = await asyncio.to_thread(context.evidence_index.search, query, max_results, max_chars=max_content_chars)
+        attrs["results"] = len(results)
+    cache_lookup("evidence_index", len(results) >= min_results)
+    if len(results) < min_results:
+        return None
+    for result in results:
+        context.pages.put(result["url"], result["raw_content"])
+    emit(SearchResults(query, [{"title": r["title"], "url": r["url"], "content": r["content"]} for r in results]))
+    return {
+        "query": query,
+        "follow_up_questions": None,
+        "answer": None,
+        "images": [],
+        "results": results
+    }
 
-    return high_results
+async def _google_search_async_inner(search_queries, max_results, include_raw_content, use_api, api_key, cx, context, max_content_chars,
+                                     prefetch_queries=None):
+    # With include_raw_content, the pages of the results of `prefetch_queries` (all queries if None)
+    # start downloading as soon as each result arrives
+    cse_limiter = LIMITERS.get("cse")
+    scrape_limiter = LIMITERS.get("scrape")
+
+    async def cse_request(params, search_attrs):
+        """One Custom Search API call, retried with backoff on 429/5xx and timeouts. None when it keeps failing."""
+        for attempt in range(RATE_RETRIES + 1):
+            await cse_limiter.acquire()
+            search_attrs["requests"] = search_attrs.get("requests", 0) + 1
+            try:
+                async with context.http.get('https://www.googleapis.com/customsearch/v1', params=params) as response:
+                    retry = cse_limiter.observe(response.status, response.headers)
+                    if response.status == 200:
+                        return await response.json()
+                    error = f"{response.status}, {(await response.text())[:500]}"
+                    search_attrs["status"] = str(response.status)
+            except asyncio.TimeoutError:
+                retry, error = True, "timeout"
+            print(f"API error: {error}")
+            if not retry or attempt == RATE_RETRIES:
+                return None
+            search_attrs["retries"] = attempt + 1
+            await asyncio.sleep(backoff(attempt))
 
-async def _google_search_async_inner(search_queries, max_results, include_raw_content, use_api, api_key, cx):
-    def get_useragent():
-        lynx_version = f"Lynx/{random.randint(2, 3)}.{random.randint(8, 9)}.{random.randint(0, 2)}"
-        libwww_version = f"libwww-FM/{random.randint(2, 3)}.{random.randint(13, 15)}"
-        ssl_mm_version = f"SSL-MM/{random.randint(1, 2)}.{random.randint(3, 5)}"
-        openssl_version = f"OpenSSL/{random.randint(1, 3)}.{random.randint(0, 4)}.{random.randint(0, 9)}"
-        return f"{lynx_version} {libwww_version} {ssl_mm_version} {openssl_version}"
-    
-    executor = None if use_api else concurrent.futures.ThreadPoolExecutor(max_workers=5)
-    
-    semaphore = asyncio.Semaphore(5 if use_api else 2)
-    
     async def search_single_query(query):
-        async with semaphore:
-            try:
-                results = []
-                
-                if use_api:
-                    for start_index in range(1, max_results + 1, 10):
-                        num = min(10, max_results - (start_index - 1))
-                        
-                        params = {
-                            'q': query,
-                            'key': api_key,
-                            'cx': cx,
-                            'start': start_index,
-                            'num': num
-                        }
-                        print(f"Requesting {num} results for '{query}' from Google API...")
-
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get('https://www.googleapis.com/customsearch/v1', params=params) as response:
-                                if response.status != 200:
-                                    error_text = await response.text()
-                                    print(f"API error: {response.status}, {error_text}")
-                                    break
-                                    
-                                data = await response.json()
-                                
-                                for item in data.get('items', []):
-                                    result = {
-                                        "title": item.get('title', ''),
-                                        "url": item.get('link', ''),
-                                        "content": item.get('snippet', ''),
-                                        "score": None,
-                                        "raw_content": item.get('snippet', '')
-                                    }
-                                    results.append(result)
-                        
-                        await asyncio.sleep(0.2)
-                        
-                        if not data.get('items') or len(data.get('items', [])) < num:
-                            break
-                
-                else:
-                    await asyncio.sleep(0.5 + random.random() * 1.5)
-                    print(f"Scraping Google for '{query}'...")
-
-                    def google_search(query, max_results):
-                        try:
-                            lang = "en"
-                            safe = "active"
-                            start = 0
-                            fetched_results = 0
-                            fetched_links = set()
-                            search_results = []
-                            
-                            while fetched_results < max_results:
-                                resp = requests.get(
-                                    url="https://www.google.com/search",
-                                    headers={
-                                        "User-Agent": get_useragent(),
-                                        "Accept": "*/*"
-                                    },
-                                    params={
-                                        "q": query,
-                                        "num": max_results + 2,
-                                        "hl": lang,
-                                        "start": start,
-                                        "safe": safe,
-                                    },
-                                    cookies = {
-                                        'CONSENT': 'PENDING+987',
-                                        'SOCS': 'CAESHAgBEhIaAB',
-                                    }
-                                )
-                                resp.raise_for_status()
-                                
-                                soup = BeautifulSoup(resp.text, "html.parser")
-                                result_block = soup.find_all("div", class_="ezO2md")
-                                new_results = 0
-                                
-                                for result in result_block:
-                                    link_tag = result.find("a", href=True)
-                                    title_tag = link_tag.find("span", class_="CVA68e") if link_tag else None
-                                    description_tag = result.find("span", class_="FrIlee")
-                                    
-                                    if link_tag and title_tag and description_tag:
-                                        link = unquote(link_tag["href"].split("&")[0].replace("/url?q=", ""))
-                                        
-                                        if link in fetched_links:
-                                            continue
-                                        
-                                        fetched_links.add(link)
-                                        title = title_tag.text
-                                        description = description_tag.text
-                                        
-                                        search_results.append({
-                                            "title": title,
-                                            "url": link,
-                                            "content": description,
-                                            "score": None,
-                                            "raw_content": description
-                                        })
-                                        
-                                        fetched_results += 1
-                                        new_results += 1
-                                        
-                                        if fetched_results >= max_results:
-                                            break
-                                
-                                if new_results == 0:
-                                    break
-                                    
-                                start += 10
-                                time.sleep(1)
-                            
-                            return search_results
-                                
-                        except Exception as e:
-                            print(f"Error in Google search for '{query}': {str(e)}")
-                            return []
-                    
-                    loop = asyncio.get_running_loop()
-                    search_results = await loop.run_in_executor(
-                        executor, 
-                        lambda: google_search(query, max_results)
-                    )
+        def prefetch_content(result):
+            if include_raw_content and (prefetch_queries is None or query in prefetch_queries):
+                prefetch(result, context, max_content_chars)
+
+        try:
+            results = []
+            backend = "api" if use_api else "scrape"
+            cached_results = None
+            if context.search_cache and not context.refresh:
+                cached_results = await asyncio.to_thread(context.search_cache.get, query, backend, max_results)
+                cache_lookup("search", cached_results is not None)
+            
+            if cached_results is not None:
+                results = cached_results
+            else:
+                with span("search", backend) as search_attrs:
+                    if use_api:
+                        for start_index in range(1, max_results + 1, 10):
+                            num = min(10, max_results - (start_index - 1))
                     
-                    results = search_results
-                
-                if include_raw_content and results:
-                    content_semaphore = asyncio.Semaphore(3)
-                    connector = aiohttp.TCPConnector(limit=20, limit_per_host=5)
-                    async with aiohttp.ClientSession(connector=connector) as session:
-                        fetch_tasks = []
-                        
-                        async def fetch_full_content(result, max_pdf_pages=5, max_html_chars=100_000, max_retries=2):
-                            url = result['url']
-                            headers = {
-                                'User-Agent': get_useragent(),
-                                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
+                            params = {
+                                'q': query,
+                                'key': api_key,
+                                'cx': cx,
+                                'start': start_index,
+                                'num': num
                             }
-                            for attempt in range(max_retries + 1):
-                                try:
-                                    await asyncio.sleep(0.2 + random.random() * 0.6)
-                                    async with session.get(url, headers=headers, timeout=30, ssl=False) as response:
-                                        if response.status == 200:
-                                            content_type = response.headers.get('Content-Type', '').lower()
-                                            if 'application/pdf' in content_type or url.lower().endswith('.pdf'):
-                                                try:
-                                                    pdf_bytes = await response.content.read(10 * 1024 * 1024)
-                                                    text = extract_text(io.BytesIO(pdf_bytes), maxpages=max_pdf_pages)
-                                                    result['raw_content'] = text
-                                                except Exception as e:
-                                                    result['raw_content'] = f"[PDF content extraction failed: {str(e)}]"
-                                            elif 'text/html' in content_type:
-                                                try:
-                                                    html = await response.text(errors='replace')
-                                                    soup = BeautifulSoup(html, 'html.parser')
-                                                    text = soup.get_text()
-                                                    result['raw_content'] = text
-                                                except UnicodeDecodeError as ude:
-                                                    result['raw_content'] = f"[Could not decode content: {str(ude)}]"
-                                            else:
-                                                result['raw_content'] = f"[Unsupported content type: {content_type}]"
-                                        else:
-                                            result['raw_content'] = f"[HTTP error: {response.status}]"
-                                    break
-                                except asyncio.TimeoutError:
-                                    if attempt == max_retries:
-                                        result['raw_content'] = "[Content fetch timeout, skipped]"
-                                except Exception as e:
-                                    if attempt == max_retries:
-                                        print(f"Warning: Failed to fetch content for {url}: {str(e)}")
-                                        result['raw_content'] = f"[Content fetch failed: {str(e)}]"
-                            return result
-                        
-                        for result in results:
-                            fetch_tasks.append(fetch_full_content(result))
+                            print(f"Requesting {num} results for '{query}' from Google API...")
+                            data = await cse_request(params, search_attrs)
+                            if data is None:
+                                break
                         
-                        updated_results = await asyncio.gather(*fetch_tasks)
-                        results = updated_results
-                        print(f"Fetched full content for {len(results)} results")
-                
-                return {
-                    "query": query,
-                    "follow_up_questions": None,
-                    "answer": None,
-                    "images": [],
-                    "results": results
-                }
-            except Exception as e:
-                print(f"Error in Google search for query '{query}': {str(e)}")
-                return {
-                    "query": query,
-                    "follow_up_questions": None,
-                    "answer": None,
-                    "images": [],
-                    "results": []
-                }
+                            for item in data.get('items', []):
+                                result = {
+                                    "title": item.get('title', ''),
+                                    "url": item.get('link', ''),
+                                    "content": item.get('snippet', ''),
+                                    "score": None,
+                                    "raw_content": item.get('snippet', '')
+                                }
+                                results.append(result)
+                                prefetch_content(result)
+                    
+                            if not data.get('items') or len(data.get('items', [])) < num:
+                                break
+            
+                    else:
+                        print(f"Scraping Google for '{query}'...")
+                        results = await scrape_google(query, max_results, context.http, scrape_limiter, search_attrs,
+                                                      on_result=prefetch_content)
+                    search_attrs["results"] = len(results)
+            
+            # A partial scrape (some result pages refused) is not cached
+            if cached_results is None and results and context.search_cache and not search_attrs.get("failed_pages"):
+                await asyncio.to_thread(context.search_cache.put, query, backend, max_results, results)
+            
+            # Fresh results are already being fetched; this starts the cached ones
+            for result in results:
+                prefetch_content(result)
+
+            return {
+                "query": query,
+                "follow_up_questions": None,
+                "answer": None,
+                "images": [],
+                "results": results
+            }
+        except Exception as e:
+            print(f"Error in Google search for query '{query}': {str(e)}")
+            return {
+                "query": query,
+                "follow_up_questions": None,
+                "answer": None,
+                "images": [],
+                "results": []
+            }
     
-    try:
-        search_tasks = [search_single_query(query) for query in search_queries]
-        
-        search_results = await asyncio.gather(*search_tasks)
-        
-        return search_results
-    finally:
-        if executor:
-            executor.shutdown(wait=False)
\ No newline at end of file
+    search_tasks = [search_single_query(query) for query in search_queries]
+    
+    search_results = await asyncio.gather(*search_tasks)
+    if context.search_cache:
+        print(f"Search cache: {context.search_cache.stats()}")
+    
+    return search_results
+
+def prefetch(result: dict, context: SearchContext, max_content_chars: int = 20_000) -> asyncio.Future:
+    """Start fetching the full text of a search result without waiting for it. There is one fetch per
+    URL per context, which fetch_full_contents joins instead of downloading the page again. The fetch
+    stays registered after it finishes, failed or not, until fetch_full_contents has taken its text."""
+    url = result['url']
+    task = context.page_fetches.get(url)
+    if task is None:
+        task = context.page_fetches[url] = asyncio.ensure_future(_fetch_full_content(dict(result), context, max_content_chars))
+    return task
+
+async def fetch_full_contents(results: List[dict], context: SearchContext, max_content_chars: int = 20_000) -> List[dict]:
+    """Fetch the full text of every search result into its `raw_content`: from the page memo, the page
+    cache (revalidated when stale) or the network, with per-host rate limits, retries and hedging."""
+    async def fetch_full_content(result):
+        task = prefetch(result, context, max_content_chars)
+        # A cancelled search must not cancel a fetch other searches are waiting for
+        result['raw_content'] = await asyncio.shield(task)
+        if context.page_fetches.get(result['url']) is task:
+            del context.page_fetches[result['url']]
+        return result
+
+    results = await asyncio.gather(*(fetch_full_content(result) for result in results))
+    print(f"Fetched full content for {len(results)} results")
+    return results
+
+async def _store_content(result, text, response, context):
+    url = result['url']
+    context.pages.put(url, text)
+    if context.page_cache:
+        await asyncio.to_thread(
+            context.page_cache.put, url, text,
+            response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    site = trusted_site(url, SITES_TRUSTED_SOURCE)
+    if context.evidence_index and site:
+        await asyncio.to_thread(context.evidence_index.add, url, text, result.get('title', ''), result.get('content', ''), site)
+
+async def _fetch_full_content(result, context, max_content_chars, max_html_bytes=2 * 1024 * 1024, max_retries=2) -> str:
+    with span("fetch", "page") as attrs:
+        return (await _fetch_page(result, context, attrs, max_content_chars, max_html_bytes, max_retries))['raw_content']
+
+async def _fetch_page(result, context, attrs, max_content_chars, max_html_bytes, max_retries):
+    url = result['url']
+    memo = context.pages.get(url)
+    if memo is not None:
+        result['raw_content'] = memo
+        attrs["source"] = "memo"
+        return result
+    cached = await asyncio.to_thread(context.page_cache.get, url) if context.page_cache else None
+    if context.page_cache:
+        cache_lookup("page", bool(cached and cached.fresh and not context.refresh))
+    if cached and cached.fresh and not context.refresh:
+        result['raw_content'] = cached.text
+        context.pages.put(url, cached.text, cached.fetched_at)
+        attrs["source"] = "cache"
+        return result
+    attrs["source"] = "network"
+    headers = {
+        'User-Agent': get_useragent(),
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
+    }
+    # Stale entries are revalidated instead of downloaded and parsed again
+    if cached and cached.etag:
+        headers['If-None-Match'] = cached.etag
+    if cached and cached.last_modified:
+        headers['If-Modified-Since'] = cached.last_modified
+    host_limiter = LIMITERS.host(urlsplit(url).hostname)
+
+    async def request():
+        """Send the GET and wait for the response headers; the response stays open for the caller."""
+        await host_limiter.acquire()
+        started = time.perf_counter()
+        stack = AsyncExitStack()
+        response = await stack.enter_async_context(context.http.get(url, headers=headers, timeout=30, verify_ssl=False))
+        FETCH_HEDGE.record(time.perf_counter() - started)
+        return stack, response
+
+    async def download():
+        """One GET of the page; returns its status, the extracted text and where it came from. Only the
+        request up to its headers is hedged: the body is read and extracted once, from the winner."""
+        # PDFs are large and slow to download, so a second copy would only double the transfer
+        delay = None if url.lower().endswith('.pdf') else FETCH_HEDGE.delay()
+        stack, response = await hedged(request, delay, attrs, discard=lambda opened: opened[0].aclose())
+        async with stack:
+            page = {"status": response.status, "source": "network"}
+            if response.status == 304 and cached:
+                page["text"] = cached.text
+                context.pages.put(url, cached.text)
+                page["source"] = "revalidated"
+                await asyncio.to_thread(context.page_cache.touch, url)
+            elif response.status == 200:
+                content_type = response.headers.get('Content-Type', '').lower()
+                if 'application/pdf' in content_type or url.lower().endswith('.pdf'):
+                    try:
+                        text = await extract_pdf(response, context.extraction_pool, context.extraction_cache)
+                        page["text"] = text
+                        await _store_content(result, text, response, context)
+                    except asyncio.TimeoutError:
+                        page["text"] = "[PDF content extraction timed out, skipped]"
+                    except Exception as e:
+                        page["text"] = f"[PDF content extraction failed: {str(e)}]"
+                elif 'text/html' in content_type:
+                    try:
+                        if context.extraction == "stream":
+                            text = await extract_html_stream(response, max_content_chars, max_html_bytes)
+                        else:
+                            text = await extract_html(response, context.extraction_pool, context.extraction_cache)
+                        page["text"] = text
+                        await _store_content(result, text, response, context)
+                    except UnicodeDecodeError as ude:
+                        page["text"] = f"[Could not decode content: {str(ude)}]"
+                    # A page that timed out or broke the extraction pool is not downloaded and parsed again
+                    except asyncio.TimeoutError:
+                        page["text"] = "[HTML content extraction timed out, skipped]"
+                    except Exception as e:
+                        page["text"] = f"[HTML content extraction failed: {str(e)}]"
+                else:
+                    page["text"] = f"[Unsupported content type: {content_type}]"
+            else:
+                page["text"] = f"[HTTP error: {response.status}]"
+            page["retry"] = host_limiter.observe(response.status, response.headers)
+            page["bytes"] = response.bytes_read
+        return page
+
+    for attempt in range(max_retries + 1):
+        attrs["retries"] = attempt
+        try:
+            # A request slower than most gets a second copy; the first response wins
+            page = await download()
+        except asyncio.TimeoutError:
+            if attempt == max_retries:
+                result['raw_content'] = "[Content fetch timeout, skipped]"
+                break
+        except Exception as e:
+            if attempt == max_retries:
+                print(f"Warning: Failed to fetch content for {url}: {str(e)}")
+                result['raw_content'] = f"[Content fetch failed: {str(e)}]"
+                break
+        else:
+            result['raw_content'] = page["text"]
+            attrs.update(status=str(page["status"]), source=page["source"], bytes=page["bytes"])
+            if not page["retry"] or attempt == max_retries:
+                break
+        await asyncio.sleep(backoff(attempt))
+    return result
+
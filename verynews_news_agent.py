@@ -1,4 +1,3 @@
-import sys
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -6,131 +5,469 @@ load_dotenv()
 verynews_news_agent.py
 Multi-agent news authenticity detection main process, supporting 5W1H fact extraction, trusted site search, research report generation, authenticity judgment, and final report output.
 """
-import uuid
 import time
 from datetime import datetime
-from typing import Dict, Any, Tuple, List
-from utils import get_config_value, google_search_async, deduplicate_and_format_sources
+from typing import Tuple, List, Iterable, AsyncIterable, AsyncIterator, Union, Optional
+from utils import (
+    google_search_async, run_sync, SearchContext, default_search_context,
+    StructuredOutputError, Facts5W1H, FactCheckQueries, FusedExtraction, EvidenceChain, ExpertAnalysis, Timeliness, Judgement
+)
+from evidence import pack_evidence
+from events import Event, ReportChunk, RunCompleted, RunFailed, emit, listen
+from language import split_for_translation
+from scheduler import Stage, run_stages, critical_path, downstream
 from prompts import (
     PROMPT_TRANSLATE_TO_EN, PROMPT_5W1H, PROMPT_FACT_CHECK, PROMPT_EVIDENCE_AGGREGATION, PROMPT_EXPERT_ANALYSIS,
-    PROMPT_TIMELINESS, PROMPT_JUDGEMENT, PROMPT_VISUALIZATION, PROMPT_REPORT_EXPERT
+    PROMPT_TIMELINESS, PROMPT_JUDGEMENT, PROMPT_VISUALIZATION, PROMPT_REPORT_EXPERT, PROMPT_FUSED_EXTRACTION
 )
 import asyncio
-import google.generativeai as genai
-
-# Read Gemini API key
-GEMINI_API_KEY = os.environ.get("GOOGLE_API_KEY")
-MODEL = os.environ.get("MODEL")
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel(MODEL)
+from llm import llm
+from claim_dedup import CLAIM_DEDUP, claims, fingerprint, stored_state
+from run_store import default_run_store, source_hashes, diff_sources
+import metrics
 
 # 1. News translation to English Agent
-def news_translate_to_en(news_content: str) -> str:
-    prompt = PROMPT_TRANSLATE_TO_EN.format(news_content=news_content)
-    response = model.generate_content(prompt)
-    return response.text.strip()
+async def news_translate_to_en(news_content: str) -> str:
+    # English lines are kept as they are; only the non-English remainder goes to the model
+    english, untranslated = split_for_translation(news_content)
+    if not untranslated:
+        return english
+    response = await llm.generate(PROMPT_TRANSLATE_TO_EN, "translate", news_content=untranslated)
+    return f"{english}\n{response.strip()}".strip()
 
 # 2. 5W1H Extraction Agent
-def agent_5w1h(news_content: str, current_time: str) -> dict:
-    prompt = PROMPT_5W1H.format(news_content=news_content, current_time=current_time)
-    response = model.generate_content(prompt)
+async def agent_5w1h(news_content: str, current_time: str) -> dict:
     try:
-        facts = eval(response.text)
-        if isinstance(facts, dict):
-            return facts
-    except Exception:
-        pass
-    return {}
-
-# 3. Fact-checking Agent
-async def agent_fact_check(news_content: str, facts: dict, current_time: str) -> list:
-    prompt = PROMPT_FACT_CHECK.format(news_content=news_content, facts=facts, current_time=current_time)
-    response = model.generate_content(prompt)
+        facts = await llm.generate_json(PROMPT_5W1H, "facts", Facts5W1H, news_content=news_content, current_time=current_time)
+        return facts.model_dump()
+    except StructuredOutputError as e:
+        print(f"5W1H extraction failed: {e}")
+        return {}
+
+# 3. Fact-checking Agent: query generation, then trusted-site search
+async def agent_search_queries(news_content: str, facts: dict, current_time: str) -> list:
     try:
-        search_queries = [item['query'] for item in eval(response.text) if 'query' in item]
-    except Exception:
-        search_queries = [news_content]
-    search_results = await google_search_async(search_queries, max_results=5, include_raw_content=True)
-    formatted = deduplicate_and_format_sources(search_results)
+        items = await llm.generate_json(PROMPT_FACT_CHECK, "queries", FactCheckQueries, news_content=news_content, facts=facts, current_time=current_time)
+        search_queries = [item.query for item in items.root if item.query.strip()]
+    except StructuredOutputError as e:
+        print(f"Query generation failed, searching for the news text: {e}")
+        search_queries = []
+    return search_queries or [news_content]
+
+async def agent_search(news_content: str, facts: dict, search_queries: list, context: Optional[SearchContext] = None) -> Tuple[str, dict]:
+    search_results = await google_search_async(search_queries, max_results=5, include_raw_content=True, context=context)
+    formatted = pack_evidence(search_results, facts, news_content)
+    # Content hashes of the sources, kept with the run so a re-check can tell whether the evidence changed
+    return formatted, source_hashes(search_results)
+
+async def agent_fact_check(news_content: str, facts: dict, current_time: str, context: Optional[SearchContext] = None) -> str:
+    search_queries = await agent_search_queries(news_content, facts, current_time)
+    formatted, _ = await agent_search(news_content, facts, search_queries, context)
     return formatted
 
+# 1-3. Fused extraction Agent: translation, 5W1H and search queries in one structured call
+async def agent_fused_extraction(news_content: str, current_time: str) -> Tuple[str, dict, list]:
+    try:
+        extraction = await llm.generate_json(PROMPT_FUSED_EXTRACTION, "fused", FusedExtraction, news_content=news_content, current_time=current_time)
+        search_queries = [q.search_query for q in extraction.queries if q.search_query]
+        return extraction.news_en.strip(), extraction.facts.model_dump(), search_queries or [extraction.news_en]
+    except StructuredOutputError as e:
+        # Fall back to the three separate agents rather than searching with an unvalidated answer
+        print(f"Fused extraction failed validation, falling back to separate agents: {e}")
+        news_en = await news_translate_to_en(news_content)
+        facts = await agent_5w1h(news_en, current_time)
+        return news_en, facts, await agent_search_queries(news_en, facts, current_time)
+
 # 4. Evidence Aggregation Agent
-def agent_evidence_aggregation(search_results: str, current_time: str) -> dict:
-    prompt = PROMPT_EVIDENCE_AGGREGATION.format(search_results=search_results, current_time=current_time)
-    response = model.generate_content(prompt)
+async def agent_evidence_aggregation(news_content: str, search_results: str, current_time: str) -> dict:
     try:
-        evidence = eval(response.text)
-        if isinstance(evidence, dict):
-            return evidence
-    except Exception:
-        pass
-    return {"key_evidence": [], "contradictions": [], "summary": ""}
+        evidence = await llm.generate_json(PROMPT_EVIDENCE_AGGREGATION, "evidence", EvidenceChain, news_content=news_content, search_results=search_results, current_time=current_time)
+    except StructuredOutputError as e:
+        print(f"Evidence aggregation failed: {e}")
+        evidence = EvidenceChain()
+    return evidence.model_dump()
 
 # 5. Expert Analysis Agent
-def agent_expert_analysis(news_content: str, facts: dict, evidence: dict, current_time: str) -> dict:
-    prompt = PROMPT_EXPERT_ANALYSIS.format(news_content=news_content, facts=facts, evidence=evidence, current_time=current_time)
-    response = model.generate_content(prompt)
+async def agent_expert_analysis(news_content: str, facts: dict, evidence: dict, current_time: str) -> dict:
     try:
-        analysis = eval(response.text)
-        if isinstance(analysis, dict):
-            return analysis
-    except Exception:
-        pass
-    return {"analysis": "", "controversy": [], "credibility": ""}
+        analysis = await llm.generate_json(
+            PROMPT_EXPERT_ANALYSIS, "expert", ExpertAnalysis, news_content=news_content, facts=facts, evidence=evidence, current_time=current_time)
+    except StructuredOutputError as e:
+        print(f"Expert analysis failed: {e}")
+        analysis = ExpertAnalysis()
+    return analysis.model_dump()
 
 # 6. Timeliness Tracking Agent
-def agent_timeliness(news_content: str, facts: dict, evidence: dict, current_time: str) -> Tuple[List, List]:
-    prompt = PROMPT_TIMELINESS.format(news_content=news_content, facts=facts, evidence=evidence, current_time=current_time)
-    response = model.generate_content(prompt)
+async def agent_timeliness(news_content: str, facts: dict, evidence: dict, current_time: str) -> Tuple[List, List]:
     try:
-        result = eval(response.text)
-        timeline = result.get("timeline", [])
-        latest_updates = result.get("latest_updates", [])
-        return timeline, latest_updates
-    except Exception:
+        result = await llm.generate_json(
+            PROMPT_TIMELINESS, "timeliness", Timeliness, news_content=news_content, facts=facts, evidence=evidence, current_time=current_time)
+    except StructuredOutputError as e:
+        print(f"Timeliness tracking failed: {e}")
         return [], []
+    return [event.model_dump() for event in result.timeline], result.latest_updates
 
 # 7. Judgement Agent
-def agent_judgement(news_content: str, facts: dict, evidence: dict, analysis: dict, latest_updates: list, current_time: str) -> dict:
-    prompt = PROMPT_JUDGEMENT.format(
+async def agent_judgement(news_content: str, facts: dict, evidence: dict, analysis: dict, latest_updates: list, current_time: str) -> dict:
+    # No default verdict: a judgement that still fails validation after the retry raises
+    # StructuredOutputError instead of silently reporting "Partially True"
+    judge_json = await llm.generate_json(
+        PROMPT_JUDGEMENT, "judge", Judgement,
         news_content=news_content, facts=facts, evidence=evidence, analysis=analysis, latest_updates=latest_updates, current_time=current_time)
-    response = model.generate_content(prompt)
-    try:
-        judge_json = eval(response.text)
-        if isinstance(judge_json, dict):
-            return judge_json
-    except Exception:
-        pass
-    return {"result": "Partially True", "reason": "", "sources": [], "timestamp": current_time}
+    return judge_json.model_dump(exclude_none=True) | {"timestamp": judge_json.timestamp or current_time}
 
 # 8. Visualization Summary Agent
-def agent_visualization(news_content: str, facts: dict, evidence: dict, analysis: dict, timeline: list, current_time: str) -> str:
-    prompt = PROMPT_VISUALIZATION.format(
+async def agent_visualization(news_content: str, facts: dict, evidence: dict, analysis: dict, timeline: list, current_time: str) -> str:
+    return await llm.generate(
+        PROMPT_VISUALIZATION, "visualization",
         news_content=news_content, facts=facts, evidence=evidence, analysis=analysis, timeline=timeline, current_time=current_time)
-    response = model.generate_content(prompt)
-    return response.text
 
 # 9. Report Expert Agent
-def agent_report_expert(news_content: str, facts: dict, evidence: dict, analysis: dict, judge_json: dict, timeline: list, latest_updates: list, visualization: str, current_time: str) -> str:
-    prompt = PROMPT_REPORT_EXPERT.format(
+async def agent_report_expert(news_content: str, facts: dict, evidence: dict, analysis: dict, judge_json: dict, timeline: list, latest_updates: list, visualization: str, current_time: str) -> str:
+    return await llm.generate(
+        PROMPT_REPORT_EXPERT, "report",
+        news_content=news_content, facts=facts, evidence=evidence, analysis=analysis, judge_json=judge_json,
+        timeline=timeline, latest_updates=latest_updates, visualization=visualization, current_time=current_time)
+
+def agent_report_expert_stream(news_content: str, facts: dict, evidence: dict, analysis: dict, judge_json: dict, timeline: list, latest_updates: list, visualization: str, current_time: str) -> AsyncIterator[str]:
+    return llm.stream(
+        PROMPT_REPORT_EXPERT, "report",
         news_content=news_content, facts=facts, evidence=evidence, analysis=analysis, judge_json=judge_json,
         timeline=timeline, latest_updates=latest_updates, visualization=visualization, current_time=current_time)
-    response = model.generate_content(prompt)
-    return response.text
+
+# Pipeline graph: each stage declares the values it reads and produces, so
+# expert analysis, timeliness and visualization run as soon as their inputs exist.
+# All agents are coroutines sharing the `llm` client, so they never block the loop.
+PIPELINE = [
+    Stage("translate", news_translate_to_en, ("news_content",), ("news_en",)),
+    Stage("facts", agent_5w1h, ("news_en", "current_time")),
+    Stage("queries", agent_search_queries, ("news_en", "facts", "current_time")),
+    Stage("search", agent_search, ("news_en", "facts", "queries", "search_context"), ("search_results", "sources")),
+    Stage("evidence", agent_evidence_aggregation, ("news_en", "search_results", "current_time")),
+    Stage("expert", agent_expert_analysis, ("news_en", "facts", "evidence", "current_time")),
+    Stage("timeliness", agent_timeliness, ("news_en", "facts", "evidence", "current_time"), ("timeline", "latest_updates")),
+    Stage("judge", agent_judgement, ("news_en", "facts", "evidence", "expert", "latest_updates", "current_time")),
+    Stage("visualization", agent_visualization, ("news_en", "facts", "evidence", "expert", "timeline", "current_time")),
+    Stage("report", agent_report_expert,
+          ("news_en", "facts", "evidence", "expert", "judge", "timeline", "latest_updates", "visualization", "current_time"),
+          ("markdown_report",)),
+]
+
+# Fused mode: one structured call replaces the translate -> facts -> queries chain
+FUSED_PIPELINE = [
+    Stage("fused", agent_fused_extraction, ("news_content", "current_time"), ("news_en", "facts", "queries")),
+] + [stage for stage in PIPELINE if stage.name not in ("translate", "facts", "queries")]
+
+PIPELINE_MODE = os.environ.get("VERYNEWS_PIPELINE_MODE", "standard")
+
+# Early exit: when the aggregated evidence is decisive, judge straight away and defer expert analysis,
+# timeliness and the report until the report is requested (see render_report)
+EARLY_EXIT = os.environ.get("VERYNEWS_EARLY_EXIT", "0") == "1"
+EARLY_EXIT_CONFIDENCE = float(os.environ.get("VERYNEWS_EARLY_EXIT_CONFIDENCE", "0.85"))
+EARLY_EXIT_MIN_SOURCES = int(os.environ.get("VERYNEWS_EARLY_EXIT_MIN_SOURCES", "2"))
+
+async def agent_early_judgement(news_content: str, facts: dict, evidence: dict, current_time: str) -> dict:
+    return await agent_judgement(news_content, facts, evidence, {}, [], current_time)
+
+EARLY_JUDGEMENT = Stage("judge", agent_early_judgement, ("news_en", "facts", "evidence", "current_time"))
+
+def pipeline_for(config: dict = None) -> list:
+    """Stage graph for `config["mode"]`: "standard" (separate agents) or "fused"."""
+    mode = (config or {}).get("mode", PIPELINE_MODE)
+    return FUSED_PIPELINE if mode == "fused" else PIPELINE
+
+def evidence_is_decisive(evidence: dict, config: dict = None) -> bool:
+    """Early-exit check: the evidence confirms or refutes the news without contradictions, with at least
+    `early_exit_confidence` confidence and `early_exit_min_sources` supporting sources."""
+    config = config or {}
+    return (evidence.get("stance") in ("confirmed", "refuted")
+            and not evidence.get("contradictions")
+            and evidence.get("confidence", 0.0) >= config.get("early_exit_confidence", EARLY_EXIT_CONFIDENCE)
+            and len(set(evidence.get("sources", []))) >= config.get("early_exit_min_sources", EARLY_EXIT_MIN_SOURCES))
+
+# "eager" generates the report with the verdict; "lazy" returns once the judgement is done
+REPORT_MODE = os.environ.get("VERYNEWS_REPORT", "eager")
+
+class VerdictResult(dict):
+    """Result of one claim. `markdown_report` stays None until it is needed: reading
+    result['markdown_report'] (or .get) generates it from the intermediate values kept in `state`,
+    running only the stages that have not run yet. Inside an event loop use
+    `await result.render_report()`, or `result.stream_report()` to receive it chunk by chunk."""
+    def __init__(self, *args, config: dict = None, run_trace: Optional[metrics.Trace] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config = config or {}
+        # Stages run later for the report are added to the same trace
+        self.run_trace = run_trace or metrics.Trace()
+
+    @classmethod
+    def from_state(cls, state: dict, config: dict = None) -> "VerdictResult":
+        """Rebuild a result from a stored `state` (plain JSON values), e.g. to render its report later."""
+        return cls(judge_json=state["judge"], markdown_report=state.get("markdown_report"), state=dict(state), config=config)
+
+    def __getitem__(self, key):
+        if key == "markdown_report" and dict.get(self, key) is None:
+            return run_sync(self.render_report())
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def _report_inputs(self) -> Tuple[str, ...]:
+        return next(stage.inputs for stage in pipeline_for(self.config) if stage.name == "report")
+
+    async def _resume(self, targets: Tuple[str, ...]):
+        with metrics.trace(self.run_trace):
+            values, _ = await run_stages(pipeline_for(self.config), self["state"], targets=targets)
+        self["state"] = values
+        self["trace"] = self.run_trace.to_dict()
+
+    async def render_report(self) -> str:
+        if dict.get(self, "markdown_report") is None:
+            await self._resume(("markdown_report",))
+            self["markdown_report"] = self["state"]["markdown_report"]
+        return dict.get(self, "markdown_report")
+
+    async def stream_report(self) -> AsyncIterator[str]:
+        """Yield the report as the report agent writes it; an already generated report is yielded whole."""
+        report = dict.get(self, "markdown_report")
+        if report is not None:
+            yield report
+            return
+        inputs = self._report_inputs()
+        await self._resume(inputs)
+        chunks = []
+        with metrics.trace(self.run_trace):
+            async for chunk in agent_report_expert_stream(*(self["state"][name] for name in inputs)):
+                chunks.append(chunk)
+                yield chunk
+        self["state"]["markdown_report"] = self["markdown_report"] = "".join(chunks)
+        self["trace"] = self.run_trace.to_dict()
+
+async def _judge(pipeline: list, values: dict, config: dict, origin: float) -> Tuple[dict, list, dict, bool]:
+    """Run the stages missing from `values` up to the verdict, and the report unless it is lazy.
+    Returns (values, stages run, timings, early_exit)."""
+    timings = {}
+    early_exit = False
+    if config.get("early_exit", EARLY_EXIT):
+        values, timings = await run_stages(pipeline, values, targets=("evidence",), origin=origin)
+        early_exit = evidence_is_decisive(values["evidence"], config)
+    stages = pipeline
+    if early_exit:
+        stages = [stage for stage in pipeline if stage.name != "judge"] + [EARLY_JUDGEMENT]
+        values, rest = await run_stages([EARLY_JUDGEMENT], values, origin=origin)
+    else:
+        targets = ("judge",) if config.get("report", REPORT_MODE) == "lazy" else None
+        values, rest = await run_stages(pipeline, values, targets=targets, origin=origin)
+    timings.update(rest)
+    return values, stages, timings, early_exit
+
+async def _store_run(news_content: str, config: dict, state: dict, early_exit: bool, parent_id: Optional[str] = None) -> Optional[str]:
+    store = default_run_store() if config.get("run_store", True) else None
+    if store is None:
+        return None
+    return await asyncio.to_thread(store.put, news_content, config, stored_state(state), early_exit, parent_id)
+
+async def verynews_news_judge_async(news_content: str, config: dict = None, context: Optional[SearchContext] = None) -> VerdictResult:
+    """Judge one claim. With `config["report"] == "lazy"` the result is returned as soon as the judgement
+    is done and the report is generated on first access (see VerdictResult). With `config["early_exit"]`,
+    decisive evidence (see evidence_is_decisive) goes straight to the judgement, deferring expert
+    analysis and timeliness as well; such results have `early_exit` set. With `config["dedup"]` (off by
+    default), a near-duplicate of a claim judged recently or still being judged reuses that verdict after
+    the 5W1H stage; such results have `duplicate_of` set (see claim_dedup.py). Unless `config["run_store"]`
+    is False, the run is stored and its `run_id` can be passed to reverify (see run_store.py)."""
+    config = config or {}
+    current_time = datetime.utcnow().isoformat() + "Z"
+    pipeline = pipeline_for(config)
+    values = {"news_content": news_content, "current_time": current_time, "search_context": context}
+    origin = time.perf_counter()
+    timings = {}
+    running = None
+    with metrics.trace() as run_trace:
+        if config.get("dedup", CLAIM_DEDUP):
+            values, timings = await run_stages(pipeline, values, targets=("facts",), origin=origin)
+            claim_fingerprint = fingerprint(values["news_en"], values["facts"])
+            duplicate = claims.running(claim_fingerprint)
+            if duplicate is None:
+                running = claims.begin(claim_fingerprint)
+                duplicate = await claims.find(claim_fingerprint)
+                if duplicate is not None:
+                    await claims.finish(running, duplicate.state, store=False)
+                    running = None
+            if duplicate is not None:
+                # shield: a cancelled duplicate must not cancel the claim it is waiting for
+                state = duplicate.state if duplicate.running is None else await asyncio.shield(duplicate.running)
+                if state is not None:
+                    claims.hit(duplicate)
+                    return VerdictResult(
+                        judge_json=state["judge"],
+                        markdown_report=state.get("markdown_report"),
+                        early_exit=False,
+                        state=dict(state),
+                        timings=timings,
+                        critical_path=critical_path(pipeline, timings),
+                        trace=run_trace.to_dict(),
+                        duplicate_of=duplicate.info(),
+                        run_id=await _store_run(news_content, config, state, False),
+                        config=config,
+                        run_trace=run_trace,
+                    )
+                # The claim this one duplicates failed, so judge it here
+                running = running or claims.begin(claim_fingerprint)
+        try:
+            values, stages, rest, early_exit = await _judge(pipeline, values, config, origin)
+        except BaseException:
+            if running is not None:
+                await claims.finish(running, None)
+            raise
+        if running is not None:
+            await claims.finish(running, stored_state(values))
+        run_id = await _store_run(news_content, config, values, early_exit)
+    timings.update(rest)
+    return VerdictResult(
+        judge_json=values["judge"],
+        markdown_report=values.get("markdown_report"),
+        early_exit=early_exit,
+        state={k: v for k, v in values.items() if k != "search_context"},
+        timings=timings,
+        critical_path=critical_path(stages, timings),
+        trace=run_trace.to_dict(),
+        run_id=run_id,
+        config=config,
+        run_trace=run_trace,
+    )
+
+async def reverify_async(run_id: str, config: dict = None, context: Optional[SearchContext] = None) -> VerdictResult:
+    """Re-check a stored run: search again with its stored queries and compare the sources by content hash.
+    If they are unchanged the stored verdict is returned without any model call; otherwise the evidence
+    aggregation and every later stage rerun, and the result is stored as a new run (`run_id`, with the
+    old run as its parent). `config` overrides the stored config. Without `context`, cached search results
+    are skipped and cached pages revalidated (SearchContext.refreshing). The result has `evidence_diff` set."""
+    store = default_run_store()
+    run = await asyncio.to_thread(store.get, run_id) if store else None
+    if run is None:
+        raise KeyError(f"Unknown run '{run_id}'")
+    config = {**run.config, **(config or {})}
+    pipeline = pipeline_for(config)
+    # Everything from the search on is recomputed; translation, facts and queries are reused
+    stale = {name for stage in downstream(pipeline, ("search",)) for name in stage.outputs}
+    values = {k: v for k, v in run.state.items() if k not in stale}
+    values.update(current_time=datetime.utcnow().isoformat() + "Z",
+                  search_context=context or default_search_context().refreshing())
+    origin = time.perf_counter()
+    with metrics.trace() as run_trace:
+        values, timings = await run_stages(pipeline, values, targets=("sources",), origin=origin)
+        diff = diff_sources(run.state.get("sources", {}), values["sources"])
+        if diff.changed:
+            print(f"Evidence of run {run_id} changed ({len(diff.added)} new, {len(diff.removed)} gone, {len(diff.modified)} updated sources), judging again")
+            values, stages, rest, early_exit = await _judge(pipeline, values, config, origin)
+            timings.update(rest)
+            run_id = await _store_run(run.news_content, config, values, early_exit, parent_id=run.id)
+        else:
+            print(f"Evidence of run {run_id} unchanged, keeping its verdict")
+            await asyncio.to_thread(store.checked, run.id)
+            values, stages, early_exit = run.state, pipeline, run.early_exit
+    return VerdictResult(
+        judge_json=values["judge"],
+        markdown_report=values.get("markdown_report"),
+        early_exit=early_exit,
+        state={k: v for k, v in values.items() if k != "search_context"},
+        timings=timings,
+        critical_path=critical_path(stages, timings),
+        trace=run_trace.to_dict(),
+        run_id=run_id,
+        evidence_diff=diff.info(),
+        config=config,
+        run_trace=run_trace,
+    )
+
+async def render_report_async(result: VerdictResult) -> str:
+    return await result.render_report()
+
+def render_report(result: VerdictResult) -> str:
+    return run_sync(result.render_report())
 
 # Main process
 def verynews_news_judge(news_content: str, config: dict = None) -> dict:
-    current_time = datetime.utcnow().isoformat() + "Z"
-    news_en = news_translate_to_en(news_content)
-    facts = agent_5w1h(news_en, current_time)
-    search_results = asyncio.run(agent_fact_check(news_en, facts, current_time))
-    evidence = agent_evidence_aggregation(search_results, current_time)
-    expert = agent_expert_analysis(news_en, facts, evidence, current_time)
-    timeline, latest_updates = agent_timeliness(news_en, facts, evidence, current_time)
-    judge = agent_judgement(news_en, facts, evidence, expert, latest_updates, current_time)
-    visualization = agent_visualization(news_en, facts, evidence, expert, timeline, current_time)
-    markdown_report = agent_report_expert(news_en, facts, evidence, expert, judge, timeline, latest_updates, visualization, current_time)
-    return {
-        "judge_json": judge,
-        "markdown_report": markdown_report
-    } 
\ No newline at end of file
+    return run_sync(verynews_news_judge_async(news_content, config))
+
+# Re-check of a stored run
+def reverify(run_id: str, config: dict = None) -> dict:
+    return run_sync(reverify_async(run_id, config))
+
+# Streaming process
+async def verynews_news_judge_events(news_content: str, config: dict = None, context: Optional[SearchContext] = None,
+                                     report: bool = True) -> AsyncIterator[Event]:
+    """Judge one claim and yield typed progress events (events.py) as they happen: a StageCompleted per
+    stage (translation, facts, evidence, analysis, verdict, ...), SearchResults per search query,
+    ReportChunk while the report is written (unless `report` is False), then RunCompleted or RunFailed.
+    Closing the iterator early cancels the run."""
+    queue = asyncio.Queue()
+
+    async def run():
+        listen(queue)
+        try:
+            result = await verynews_news_judge_async(news_content, {**(config or {}), "report": "lazy"}, context)
+            if report:
+                async for chunk in result.stream_report():
+                    emit(ReportChunk(chunk))
+            emit(RunCompleted(result["judge_json"], result["early_exit"], result["timings"]))
+        except Exception as e:
+            emit(RunFailed(str(e)))
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            event = await queue.get()
+            yield event
+            if isinstance(event, (RunCompleted, RunFailed)):
+                break
+    finally:
+        task.cancel()
+
+async def _aiter_claims(claims: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if hasattr(claims, "__aiter__"):
+        async for claim in claims:
+            yield claim
+    else:
+        for claim in claims:
+            yield claim
+
+async def _judge_claim(index: int, news_content: str, config: dict, context: SearchContext) -> dict:
+    try:
+        result = await verynews_news_judge_async(news_content, config, context)
+        result.update(index=index, news_content=news_content)
+        return result
+    except Exception as e:
+        print(f"Error judging claim {index}: {str(e)}")
+        return {"index": index, "news_content": news_content, "error": str(e)}
+
+# Batch process
+async def verynews_news_judge_many(claims: Union[Iterable[str], AsyncIterable[str]], concurrency: int = 8, config: dict = None,
+                                   context: Optional[SearchContext] = None) -> AsyncIterator[dict]:
+    """Judge many claims on the running event loop and yield each result as soon as its claim finishes.
+    Claims are pulled lazily, at most `concurrency` at a time, and share one search context (the loop's
+    default one unless `context` is given) and model client.
+    A claim that fails yields {"index", "news_content", "error"} instead of stopping the batch."""
+    claims = _aiter_claims(claims)
+    pending = set()
+    exhausted = False
+    index = 0
+    context = context or default_search_context()
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    news_content = await claims.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.create_task(_judge_claim(index, news_content, config, context)))
+                index += 1
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()